@@ -0,0 +1,257 @@
+"""
+資料庫壓力測試
+
+在暫存檔案中建立真實規模的資料 (預設 10 萬用戶、1 萬伺服器、1000 萬筆使用記錄)，
+並行執行 record_conversion 與統計查詢，回報每種設定的吞吐量、p50/p99 延遲與鎖定錯誤。
+量測前先驗證統計快取的並行查詢共用 (失敗時結束並回傳非零值)。
+
+用法:
+    python benchmarks/db_benchmark.py
+    python benchmarks/db_benchmark.py --users 10000 --guilds 1000 --logs 200000 --duration 10
+    python benchmarks/db_benchmark.py --configs 1x0 8x0 8x4 32x8 --read-pool 1 4
+    python benchmarks/db_benchmark.py --check-only
+"""
+import argparse
+import asyncio
+import datetime
+import logging
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import settings
+from utils.cache import TTLCache
+from utils.database import Base, Database
+from sqlalchemy import create_engine
+
+
+class LockErrorCounter(logging.Handler):
+    """計算資料庫回報的 "database is locked" 錯誤次數"""
+
+    def __init__(self):
+        super().__init__(level=logging.ERROR)
+        self.locked = 0
+        self.errors = 0
+
+    def emit(self, record):
+        self.errors += 1
+        if "database is locked" in record.getMessage():
+            self.locked += 1
+
+
+def seed_database(path: str, users: int, guilds: int, logs: int, batch: int = 100_000):
+    """使用 sqlite3 executemany 快速建立測試資料"""
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    engine.dispose()
+
+    rng = random.Random(42)
+    now = datetime.datetime.utcnow()
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+
+    def ts(seconds_ago: int) -> str:
+        return (now - datetime.timedelta(seconds=seconds_ago)).strftime("%Y-%m-%d %H:%M:%S.%f")
+
+    conn.executemany(
+        "INSERT INTO guilds (guild_id, guild_name, member_count, installed_at, last_seen) VALUES (?, ?, ?, ?, ?)",
+        ((g, f"guild-{g}", rng.randint(2, 50_000), ts(rng.randint(0, 30_000_000)), ts(rng.randint(0, 1_000_000)))
+         for g in range(1, guilds + 1))
+    )
+
+    # 使用記錄分配給用戶時偏向少數重度用戶 (近似真實分佈)
+    totals = [0] * (users + 1)
+    remaining = logs
+    while remaining > 0:
+        size = min(batch, remaining)
+        rows = []
+        for _ in range(size):
+            user_id = min(users, int(rng.paretovariate(1.2)) if rng.random() < 0.3 else rng.randint(1, users))
+            totals[user_id] += 1
+            guild_id = rng.randint(1, guilds) if rng.random() < 0.8 else None
+            rows.append((user_id, guild_id, rng.randint(10_000, 8_000_000), "image_to_gif", ts(rng.randint(0, 15_000_000))))
+        conn.executemany(
+            "INSERT INTO usage_logs (user_id, guild_id, file_size, conversion_type, timestamp) VALUES (?, ?, ?, ?, ?)",
+            rows
+        )
+        remaining -= size
+        print(f"\r  使用記錄 {logs - remaining:,}/{logs:,}", end="", flush=True)
+    print()
+
+    conn.executemany(
+        "INSERT INTO users (user_id, username, display_name, created_at, last_seen, total_conversions) VALUES (?, ?, ?, ?, ?, ?)",
+        ((u, f"user-{u}", None, ts(rng.randint(0, 30_000_000)), ts(rng.randint(0, 1_000_000)), totals[u])
+         for u in range(1, users + 1))
+    )
+    conn.commit()
+    conn.close()
+
+
+def percentile(samples: list, pct: float) -> float:
+    """回傳百分位數 (毫秒)"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(len(ordered) * pct / 100))
+    return ordered[index] * 1000
+
+
+async def run_config(path: str, args, writers: int, readers: int, read_pool: int) -> dict:
+    """以指定的並行寫入/讀取數量執行一輪壓力測試"""
+    settings.DB_READ_POOL_SIZE = read_pool
+    settings.USE_EVENT_JOURNAL = not args.no_journal
+    settings.JOURNAL_DIR = os.path.join(os.path.dirname(path), "journal")
+    shutil.rmtree(settings.JOURNAL_DIR, ignore_errors=True)
+    database = Database(path)
+    counter = LockErrorCounter()
+    logging.getLogger().addHandler(counter)
+
+    write_latencies, read_latencies = [], []
+    failed_writes = 0
+    deadline = time.perf_counter() + args.duration
+    rng = random.Random()
+
+    async def writer():
+        nonlocal failed_writes
+        while time.perf_counter() < deadline:
+            user_id = rng.randint(1, args.users)
+            guild_id = rng.randint(1, args.guilds)
+            user = SimpleNamespace(id=user_id, name=f"user-{user_id}", display_name=None, global_name=None)
+            guild = SimpleNamespace(id=guild_id, name=f"guild-{guild_id}", member_count=100) if rng.random() < 0.8 else None
+            start = time.perf_counter()
+            result = await database.record_conversion(user, guild, file_size=rng.randint(10_000, 8_000_000))
+            write_latencies.append(time.perf_counter() - start)
+            if result is None:
+                failed_writes += 1
+
+    async def reader():
+        queries = [
+            lambda: database.get_top_users(5),
+            lambda: database.get_recent_usage(10),
+            lambda: database.get_database_stats(),
+            lambda: database.get_guild_stats(rng.randint(1, args.guilds)),
+            lambda: database.get_user_stats(rng.randint(1, args.users)),
+        ]
+        while time.perf_counter() < deadline:
+            if args.no_cache:
+                database.stats_cache.invalidate()
+            start = time.perf_counter()
+            await rng.choice(queries)()
+            read_latencies.append(time.perf_counter() - start)
+
+    await database.initialize()
+    started = time.perf_counter()
+    await asyncio.gather(*[writer() for _ in range(writers)], *[reader() for _ in range(readers)])
+    elapsed = time.perf_counter() - started
+    await database.close()
+    logging.getLogger().removeHandler(counter)
+
+    return {
+        "config": f"{writers}w/{readers}r pool={read_pool}",
+        "writes_per_sec": len(write_latencies) / elapsed,
+        "write_p50": percentile(write_latencies, 50),
+        "write_p99": percentile(write_latencies, 99),
+        "reads_per_sec": len(read_latencies) / elapsed,
+        "read_p50": percentile(read_latencies, 50),
+        "read_p99": percentile(read_latencies, 99),
+        "failed_writes": failed_writes,
+        "lock_errors": counter.locked,
+        "errors": counter.errors,
+    }
+
+
+async def check_cache():
+    """驗證快取：第一個呼叫者被取消時，共用同一次查詢的其他呼叫者仍取得結果，且結果會寫入快取"""
+    cache = TTLCache(ttl=60)
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return "value"
+
+    callers = [asyncio.create_task(cache.get_or_load(("check",), loader)) for _ in range(5)]
+    await asyncio.sleep(0)
+    callers[0].cancel()
+    results = await asyncio.gather(*callers, return_exceptions=True)
+    cached = await cache.get_or_load(("check",), loader)
+    ok = (isinstance(results[0], asyncio.CancelledError) and results[1:] == ["value"] * 4
+          and cached == "value" and calls == 1)
+    print(f"{'OK  ' if ok else 'FAIL'} 取消第一個呼叫者: 其他呼叫者取得 {results[1:]}，查詢 {calls} 次")
+    if not ok:
+        sys.exit("快取驗證失敗")
+
+
+def print_report(results: list):
+    """輸出結果表格"""
+    header = f"{'設定':<22}{'寫入/秒':>10}{'寫 p50':>10}{'寫 p99':>10}{'讀取/秒':>10}{'讀 p50':>10}{'讀 p99':>10}{'失敗':>7}{'鎖定':>7}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r['config']:<22}{r['writes_per_sec']:>10.1f}{r['write_p50']:>9.1f}ms{r['write_p99']:>8.1f}ms"
+            f"{r['reads_per_sec']:>10.1f}{r['read_p50']:>9.1f}ms{r['read_p99']:>8.1f}ms"
+            f"{r['failed_writes']:>7}{r['lock_errors']:>7}"
+        )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="2GifBot 資料庫壓力測試")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--guilds", type=int, default=10_000)
+    parser.add_argument("--logs", type=int, default=10_000_000)
+    parser.add_argument("--duration", type=float, default=20.0, help="每種設定的執行秒數")
+    parser.add_argument("--configs", nargs="+", default=["1x0", "8x0", "8x2", "32x8"],
+                        help="並行寫入x讀取數量，例如 8x2")
+    parser.add_argument("--read-pool", type=int, nargs="+", default=[settings.DB_READ_POOL_SIZE],
+                        help="要測試的唯讀連線池大小")
+    parser.add_argument("--no-cache", action="store_true", help="每次讀取前清除統計快取")
+    parser.add_argument("--no-journal", action="store_true", help="直接寫入資料庫，不經過事件日誌")
+    parser.add_argument("--keep", action="store_true", help="保留暫存資料庫檔案")
+    parser.add_argument("--check-only", action="store_true", help="只驗證快取，不量測效能")
+    args = parser.parse_args()
+
+    await check_cache()
+    if args.check_only:
+        return
+
+    logging.basicConfig(level=logging.WARNING)
+    workdir = tempfile.mkdtemp(prefix="gifbot-bench-")
+    seed_path = os.path.join(workdir, "seed.db")
+    print(f"建立測試資料於 {seed_path} ...")
+    started = time.perf_counter()
+    seed_database(seed_path, args.users, args.guilds, args.logs)
+    print(f"完成，耗時 {time.perf_counter() - started:.1f} 秒\n")
+
+    results = []
+    try:
+        for config in args.configs:
+            writers, readers = (int(n) for n in config.lower().split("x"))
+            for read_pool in args.read_pool:
+                # 每種設定都從相同的初始資料開始
+                path = os.path.join(workdir, "run.db")
+                for suffix in ("", "-wal", "-shm"):
+                    if os.path.exists(path + suffix):
+                        os.remove(path + suffix)
+                shutil.copyfile(seed_path, path)
+                print(f"執行 {config} (唯讀連線池 {read_pool}) ...")
+                results.append(await run_config(path, args, writers, readers, read_pool))
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print()
+    print_report(results)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
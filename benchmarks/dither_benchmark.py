@@ -0,0 +1,110 @@
+"""
+量化與抖色效能測試
+
+比較 GIF 編碼時的量化方式：
+- pillow:     目前的 save(optimize=True, quality=...) (Pillow 逐格量化)
+- pillow_fs:  Pillow quantize + Floyd–Steinberg 抖色後儲存
+- lut:        NumPy 查找表對應共用調色盤 (不抖色)
+- bayer:      NumPy 查找表 + Bayer 有序抖色 (bayer_gif 編碼器)
+
+回報每種方式的耗時、輸出大小與 PSNR。預設使用 utils.encoders 的校準樣本放大到較大的尺寸，
+也可以用 --image 指定本機圖片 (動態圖片會取前 --frames 格)。需要安裝 numpy。
+
+用法:
+    python benchmarks/dither_benchmark.py
+    python benchmarks/dither_benchmark.py --image photo.jpg --image anim.webp --frames 30
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DISCORD_BOT_TOKEN", "benchmark")
+
+import numpy as np
+from PIL import Image, ImageSequence
+
+from utils import dither, encoders
+
+
+def encode_pillow(frames, durations, quality):
+    return encoders._save_animation(frames, durations, "GIF", optimize=True, quality=quality)
+
+
+def encode_pillow_fs(frames, durations, quality):
+    quantized = [f.convert("RGB").quantize(256, dither=Image.Dither.FLOYDSTEINBERG) for f in frames]
+    return encoders._save_animation(quantized, durations, "GIF", optimize=False)
+
+
+def _palette(frames, quality):
+    palette_image = encoders.shared_palette(frames, encoders._palette_colors(quality))
+    used = sorted(index for _, index in palette_image.getcolors(256))
+    return np.array(palette_image.getpalette(), dtype=np.uint8).reshape(-1, 3)[used]
+
+
+def encode_lut(frames, durations, quality):
+    quantized = dither.quantize_frames(frames, _palette(frames, quality), strength=0)
+    return encoders._save_animation(quantized, durations, "GIF", optimize=False)
+
+
+def encode_bayer(frames, durations, quality):
+    quantized = dither.quantize_frames(frames, _palette(frames, quality))
+    return encoders._save_animation(quantized, durations, "GIF", optimize=False)
+
+
+MODES = {
+    "pillow": encode_pillow,
+    "pillow_fs": encode_pillow_fs,
+    "lut": encode_lut,
+    "bayer": encode_bayer,
+}
+
+
+def builtin_inputs():
+    """放大的校準樣本：1080p 靜態圖片、1024px 靜態圖片與 30 格 512px 動畫"""
+    static = encoders.sample_frames("static")[0]
+    long = encoders.sample_frames("long")
+    return [
+        ("static 1920x1080", [static.resize((1920, 1080))]),
+        ("static 1024x768", [static]),
+        ("anim 30x512x288", [frame.resize((512, 288)) for frame in long]),
+    ]
+
+
+def load_image(path: str, max_frames: int):
+    with Image.open(path) as img:
+        frames = [frame.convert("RGB") for _, frame in zip(range(max_frames), ImageSequence.Iterator(img))]
+    return os.path.basename(path), frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description="2GifBot 量化與抖色效能測試")
+    parser.add_argument("--image", action="append", default=[], help="本機圖片 (可重複指定)")
+    parser.add_argument("--frames", type=int, default=30, help="動態圖片最多取用的畫格數")
+    parser.add_argument("--quality", type=int, default=80)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    inputs = [load_image(path, args.frames) for path in args.image] or builtin_inputs()
+    print(f"{'輸入':<20}{'方式':<11}{'耗時':>10}{'大小':>12}{'PSNR':>9}{'加速':>8}")
+    for label, frames in inputs:
+        durations = [100] * len(frames)
+        baseline = None
+        for mode, encode in MODES.items():
+            timings = []
+            for _ in range(args.repeats):
+                started = time.perf_counter()
+                data = encode(frames, durations, args.quality)
+                timings.append(time.perf_counter() - started)
+            seconds = statistics.median(timings)
+            baseline = baseline or seconds
+            print(
+                f"{label:<20}{mode:<11}{seconds * 1000:>8.1f}ms{len(data) / 1024:>10.1f}KB"
+                f"{encoders.psnr(frames, data):>7.1f}dB{baseline / seconds:>7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
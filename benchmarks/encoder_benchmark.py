@@ -0,0 +1,51 @@
+"""
+輸出編碼器校準
+
+以 utils.encoders 內建的校準樣本 (靜態圖片、短動畫、長動畫) 量測每個已註冊的編碼器，
+回報耗時、輸出大小與 PSNR，並標示各格式與輸入類別選出的編碼器
+(符合 ENCODER_MIN_PSNR 與 ENCODER_MAX_SIZE_RATIO 目標中最快的)。
+
+機器人啟動時若沒有可用的校準結果會自動執行相同的校準；
+加上 --save 可將結果寫入 ENCODER_CALIBRATION_PATH (預設 data/encoder_calibration.json)。
+
+用法:
+    python benchmarks/encoder_benchmark.py
+    python benchmarks/encoder_benchmark.py --quality 60 --repeats 5 --save
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DISCORD_BOT_TOKEN", "benchmark")
+
+import settings
+from utils import encoders
+
+
+def main():
+    parser = argparse.ArgumentParser(description="2GifBot 輸出編碼器校準")
+    parser.add_argument("--quality", type=int, default=80)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--save", action="store_true", help="寫入校準結果檔案")
+    args = parser.parse_args()
+
+    calibration = encoders.calibrate(args.quality, args.repeats)
+    print(f"{'格式':<6}{'類別':<8}{'編碼器':<14}{'耗時':>10}{'大小':>12}{'PSNR':>9}")
+    for output_format, classes in calibration["results"].items():
+        for input_class, measured in classes.items():
+            selected = calibration["selected"][output_format][input_class]
+            for name, r in measured.items():
+                mark = " *" if name == selected else ""
+                print(
+                    f"{output_format:<6}{input_class:<8}{name:<14}{r['seconds'] * 1000:>8.1f}ms"
+                    f"{r['bytes'] / 1024:>10.1f}KB{r['psnr']:>7.1f}dB{mark}"
+                )
+    print("* 為選出的編碼器")
+    if args.save:
+        encoders.save_calibration(calibration)
+        print(f"已寫入 {settings.ENCODER_CALIBRATION_PATH}")
+
+
+if __name__ == "__main__":
+    main()
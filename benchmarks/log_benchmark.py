@@ -0,0 +1,132 @@
+"""
+日誌效能測試
+
+比較 utils.log.log() 在呼叫端的成本：
+- before: 舊版實作 (traceback.extract_stack() 建立整個堆疊，Rich 與檔案 handler 在呼叫端同步寫入)
+- after:  目前的實作 (sys._getframe 取得呼叫者，記錄放入佇列後由背景執行緒格式化與寫入)
+
+控制台輸出導向 /dev/null，檔案輸出寫到暫存目錄，不會影響 logs/。
+
+用法:
+    python benchmarks/log_benchmark.py
+    python benchmarks/log_benchmark.py --calls 20000 --depth 30
+"""
+import argparse
+import logging
+import logging.handlers
+import os
+import queue
+import statistics
+import sys
+import tempfile
+import time
+import traceback
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DISCORD_BOT_TOKEN", "benchmark")
+
+from rich.console import Console
+from rich.logging import RichHandler
+
+from utils import log as log_module
+
+
+def legacy_log(to_log=None, *args, **kwargs):
+    """舊版 log() 的取得呼叫者方式"""
+    args_list = list(args)
+    if isinstance(to_log, str):
+        args_list.append(to_log)
+    caller = traceback.extract_stack()[-2]
+    short_filename = os.path.basename(caller.filename)
+    end_msg = f"函式: {caller.name} 檔案: {short_filename} 第 {caller.lineno} 行呼叫"
+    if args_list:
+        end_msg += f"\n 詳細資訊: {args_list}"
+    logging.info(end_msg)
+
+
+def make_handlers(directory: str, fmt: str):
+    devnull = open(os.devnull, "w", encoding="utf-8")
+    rich_handler = RichHandler(console=Console(file=devnull, force_terminal=True, width=120), rich_tracebacks=True)
+    rich_handler.setLevel(logging.INFO)
+    file_handler = logging.FileHandler(os.path.join(directory, f"bench-{fmt}.log"), encoding="utf-8")
+    file_handler.setLevel(logging.DEBUG)
+    if fmt == "json":
+        file_handler.setFormatter(log_module.JsonFormatter())
+    else:
+        file_handler.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+    return [rich_handler, file_handler]
+
+
+def nested(depth: int, func):
+    """模擬呼叫深度 (discord.py 的事件分派會有很深的堆疊)"""
+    if depth <= 0:
+        return func()
+    return nested(depth - 1, func)
+
+
+def run(name: str, log_func, handlers, use_queue: bool, calls: int, depth: int) -> dict:
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    listener = None
+    if use_queue:
+        log_queue = queue.SimpleQueue()
+        root.addHandler(log_module.LogQueueHandler(log_queue))
+        listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        listener.start()
+    else:
+        for handler in handlers:
+            root.addHandler(handler)
+
+    samples = []
+
+    def body():
+        for i in range(calls):
+            start = time.perf_counter()
+            log_func("benchmark", i, user="bench")
+            samples.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    nested(depth, body)
+    caller_time = time.perf_counter() - started
+    if listener is not None:
+        listener.stop()
+    drained = time.perf_counter() - started
+    for handler in handlers:
+        handler.close()
+    samples.sort()
+    return {
+        "name": name,
+        "mean_us": statistics.fmean(samples) * 1e6,
+        "p50_us": samples[len(samples) // 2] * 1e6,
+        "p99_us": samples[int(len(samples) * 0.99)] * 1e6,
+        "caller_s": caller_time,
+        "drained_s": drained,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="2GifBot 日誌效能測試")
+    parser.add_argument("--calls", type=int, default=5000)
+    parser.add_argument("--depth", type=int, default=20, help="呼叫 log() 時的堆疊深度")
+    args = parser.parse_args()
+
+    # 停止 utils.log 在匯入時啟動的 listener，避免寫入 logs/
+    log_module.stop_logging()
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        results.append(run("before (同步)", legacy_log, make_handlers(directory, "text"), False, args.calls, args.depth))
+        results.append(run("after (佇列)", log_module.log, make_handlers(directory, "text"), True, args.calls, args.depth))
+        results.append(run("after (佇列 + json)", log_module.log, make_handlers(directory, "json"), True, args.calls, args.depth))
+
+    print(f"{'模式':<22}{'平均':>10}{'p50':>10}{'p99':>10}{'呼叫端總計':>14}{'寫完總計':>12}")
+    for r in results:
+        print(
+            f"{r['name']:<22}{r['mean_us']:>8.1f}µs{r['p50_us']:>8.1f}µs{r['p99_us']:>8.1f}µs"
+            f"{r['caller_s']:>13.2f}s{r['drained_s']:>11.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
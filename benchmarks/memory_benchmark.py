@@ -0,0 +1,140 @@
+"""
+快取記憶體測試
+
+以模擬的 GUILD_CREATE 資料填入 discord.py 的快取，比較完整模式 (Intents.all()、成員快取)
+與精簡模式 (LEAN_CACHE) 每 1000 個伺服器的常駐記憶體 (RSS)。
+
+每種模式在獨立的子程序中執行，避免互相影響。Discord 在沒有 members/presences
+intent 時不會傳送成員與上線狀態，模擬資料也依此調整。
+
+用法:
+    python benchmarks/memory_benchmark.py
+    python benchmarks/memory_benchmark.py --guilds 5000 --members 500
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _snowflake(rng: random.Random) -> str:
+    return str(rng.getrandbits(60))
+
+
+def guild_payload(rng: random.Random, members: int, intents) -> dict:
+    """依照 intents 產生 Discord 會送出的 GUILD_CREATE 資料"""
+    guild_id = _snowflake(rng)
+    data = {
+        "id": guild_id,
+        "name": f"guild-{guild_id[-6:]}",
+        "icon": None,
+        "features": [],
+        "member_count": members,
+        "owner_id": _snowflake(rng),
+        "roles": [
+            {"id": guild_id, "name": "@everyone", "permissions": "0", "position": 0, "color": 0,
+             "hoist": False, "managed": False, "mentionable": False, "flags": 0}
+        ] + [
+            {"id": _snowflake(rng), "name": f"role-{i}", "permissions": "0", "position": i + 1, "color": 0,
+             "hoist": False, "managed": False, "mentionable": False, "flags": 0}
+            for i in range(10)
+        ],
+        "channels": [
+            {"id": _snowflake(rng), "type": 0, "name": f"channel-{i}", "position": i, "permission_overwrites": []}
+            for i in range(20)
+        ],
+        "emojis": [],
+        "stickers": [],
+    }
+    if intents.members:
+        # 啟用成員 intent 時，分塊請求後會取得全部成員
+        member_list = []
+        presences = []
+        for i in range(members):
+            user_id = _snowflake(rng)
+            member_list.append({
+                "user": {"id": user_id, "username": f"user{i}", "discriminator": "0",
+                         "avatar": None, "global_name": f"User {i}"},
+                "roles": [],
+                "joined_at": "2024-01-01T00:00:00+00:00",
+                "deaf": False,
+                "mute": False,
+                "flags": 0,
+            })
+            if intents.presences and rng.random() < 0.3:
+                presences.append({
+                    "user": {"id": user_id},
+                    "status": "online",
+                    "activities": [{"name": "Some Game", "type": 0}],
+                    "client_status": {"desktop": "online"},
+                })
+        data["members"] = member_list
+        data["presences"] = presences
+    return data
+
+
+def measure(mode: str, guilds: int, members: int) -> dict:
+    """在本程序中填入快取並回傳 RSS 變化"""
+    os.environ.setdefault("DISCORD_BOT_TOKEN", "benchmark")
+    import settings
+    settings.LEAN_CACHE = mode == "lean"
+    from discord.ext import commands
+    from bot import bot_options
+    from utils.cluster import _rss_bytes
+
+    bot = commands.Bot(command_prefix=settings.PREFIX, **bot_options())
+    state = bot._connection
+    rng = random.Random(0)
+
+    gc.collect()
+    before = _rss_bytes()
+    for _ in range(guilds):
+        state._add_guild_from_data(guild_payload(rng, members, state._intents))
+    gc.collect()
+    after = _rss_bytes()
+
+    return {
+        "mode": mode,
+        "guilds": guilds,
+        "cached_members": sum(len(g._members) for g in state._guilds.values()),
+        "cached_users": len(state._users),
+        "rss_delta": after - before,
+        "rss_per_1k_guilds": (after - before) / guilds * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="2GifBot 快取記憶體測試")
+    parser.add_argument("--guilds", type=int, default=2000)
+    parser.add_argument("--members", type=int, default=200, help="每個伺服器的成員數")
+    parser.add_argument("--mode", choices=["full", "lean"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        # 子程序：只量測單一模式
+        print(json.dumps(measure(args.mode, args.guilds, args.members)))
+        return
+
+    results = []
+    for mode in ("full", "lean"):
+        output = subprocess.run(
+            [sys.executable, __file__, "--mode", mode, "--guilds", str(args.guilds), "--members", str(args.members)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"{'模式':<8}{'伺服器':>8}{'快取成員':>12}{'快取用戶':>12}{'RSS 增加':>14}{'每 1k 伺服器':>16}")
+    for r in results:
+        print(
+            f"{r['mode']:<8}{r['guilds']:>8}{r['cached_members']:>12,}{r['cached_users']:>12,}"
+            f"{r['rss_delta'] / 1024 / 1024:>12.1f}MB{r['rss_per_1k_guilds'] / 1024 / 1024:>14.1f}MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
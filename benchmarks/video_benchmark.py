@@ -0,0 +1,165 @@
+"""
+影片轉 GIF 效能測試
+
+以 PyAV 在本機產生測試影片 (H.264 MP4 與 VP8 WebM)，比較兩種取出畫格的方式：
+- full:   解碼所有畫格並以原始解析度保留，之後才取樣與縮放
+- stream: utils.video.decode_frames (跳轉到取樣時間點、解碼時縮放、只保留取樣畫格)
+
+每種方式在獨立的子程序中執行，量測耗時、畫格數與最大常駐記憶體 (ru_maxrss)。
+量測前先以不同幀率的短片驗證 decode_frames 的畫格數與總時長 (失敗時結束並回傳非零值)。
+需要安裝 PyAV 與 numpy。
+
+用法:
+    python benchmarks/video_benchmark.py
+    python benchmarks/video_benchmark.py --seconds 30 --width 1920 --height 1080
+    python benchmarks/video_benchmark.py --check-only
+"""
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DISCORD_BOT_TOKEN", "benchmark")
+
+FORMATS = (("mp4", "libx264"), ("webm", "libvpx"))
+
+
+def make_clip(fmt: str, codec: str, seconds: int, fps: int, width: int, height: int) -> bytes:
+    """產生一段移動色塊的測試影片 (每 2 秒一個關鍵畫格)"""
+    import av
+    import numpy as np
+
+    output = io.BytesIO()
+    with av.open(output, mode="w", format=fmt) as container:
+        stream = container.add_stream(codec, rate=fps)
+        stream.width = width
+        stream.height = height
+        stream.pix_fmt = "yuv420p"
+        stream.codec_context.gop_size = fps * 2
+        for index in range(seconds * fps):
+            frame = np.zeros((height, width, 3), np.uint8)
+            x = (index * 8) % width
+            frame[:, x:x + 64] = (255, 128, 0)
+            frame[(index * 4) % height:(index * 4) % height + 32, :] = (0, 128, 255)
+            for packet in stream.encode(av.VideoFrame.from_ndarray(frame, format="rgb24")):
+                container.mux(packet)
+        for packet in stream.encode():
+            container.mux(packet)
+    return output.getvalue()
+
+
+def decode_full(data: bytes, fps: float, max_frames: int, max_size: int, max_duration: float):
+    """舊的做法：解碼全部畫格後再取樣與縮放"""
+    import av
+    from PIL import Image
+
+    with av.open(io.BytesIO(data)) as container:
+        stream = container.streams.video[0]
+        rate = float(stream.average_rate)
+        frames = []
+        for frame in container.decode(stream):
+            if frame.time is not None and frame.time >= max_duration:
+                break
+            frames.append(frame.to_image())
+    count = max(1, min(max_frames, int(min(len(frames) / rate, max_duration) * fps)))
+    sampled = [frames[int(index * len(frames) / count)] for index in range(count)]
+    for frame in sampled:
+        frame.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+    return sampled
+
+
+def check(sample_fps: float = 10, seconds: int = 3):
+    """驗證取樣結果：畫格數為 min(來源幀率, 取樣率) x 秒數，總時長等於影片長度"""
+    from utils import video
+
+    failures = 0
+    for source_fps in (5, 10, 24, 30):
+        for fmt, codec in FORMATS:
+            data = make_clip(fmt, codec, seconds, source_fps, 320, 240)
+            frames, durations = video.decode_frames(data, sample_fps, 100, 160, 10)
+            expected_frames = int(min(source_fps, sample_fps) * seconds)
+            total = sum(durations)
+            ok = len(frames) == len(durations) == expected_frames and abs(total - seconds * 1000) <= 1000 / sample_fps
+            failures += not ok
+            print(
+                f"{'OK  ' if ok else 'FAIL'} {fmt:<5}{source_fps:>3} fps: {len(frames)} 格 (預期 {expected_frames})，"
+                f"總時長 {total} ms (預期 {seconds * 1000} ms)"
+            )
+    if failures:
+        sys.exit(f"{failures} 項驗證失敗")
+
+
+def measure(mode: str, path: str, fps: float, max_frames: int, max_size: int, max_duration: float) -> dict:
+    from utils import video
+
+    with open(path, "rb") as f:
+        data = f.read()
+    started = time.perf_counter()
+    if mode == "full":
+        frames = decode_full(data, fps, max_frames, max_size, max_duration)
+    else:
+        frames, _ = video.decode_frames(data, fps, max_frames, max_size, max_duration)
+    elapsed = time.perf_counter() - started
+    return {
+        "mode": mode,
+        "frames": len(frames),
+        "size": list(frames[0].size) if frames else None,
+        "seconds": elapsed,
+        "max_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="2GifBot 影片轉 GIF 效能測試")
+    parser.add_argument("--seconds", type=int, default=10, help="測試影片長度")
+    parser.add_argument("--fps", type=int, default=30, help="測試影片的每秒畫格數")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--sample-fps", type=float, default=10)
+    parser.add_argument("--max-frames", type=int, default=50)
+    parser.add_argument("--max-size", type=int, default=480)
+    parser.add_argument("--max-duration", type=float, default=10)
+    parser.add_argument("--check-only", action="store_true", help="只驗證取樣結果，不量測效能")
+    parser.add_argument("--mode", choices=["full", "stream"], help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    limits = ["--sample-fps", str(args.sample_fps), "--max-frames", str(args.max_frames),
+              "--max-size", str(args.max_size), "--max-duration", str(args.max_duration)]
+    if args.mode:
+        # 子程序：只量測單一方式
+        print(json.dumps(measure(args.mode, args.path, args.sample_fps, args.max_frames,
+                                 args.max_size, args.max_duration)))
+        return
+
+    check(args.sample_fps)
+    if args.check_only:
+        return
+    print()
+    print(f"{'格式':<6}{'方式':<8}{'畫格':>6}{'尺寸':>12}{'耗時':>10}{'最大 RSS':>12}")
+    with tempfile.TemporaryDirectory() as directory:
+        for fmt, codec in FORMATS:
+            path = os.path.join(directory, f"clip.{fmt}")
+            with open(path, "wb") as f:
+                f.write(make_clip(fmt, codec, args.seconds, args.fps, args.width, args.height))
+            for mode in ("full", "stream"):
+                output = subprocess.run(
+                    [sys.executable, __file__, "--mode", mode, "--path", path, *limits],
+                    check=True, capture_output=True, text=True
+                ).stdout
+                r = json.loads(output.strip().splitlines()[-1])
+                size = "x".join(map(str, r["size"])) if r["size"] else "-"
+                print(
+                    f"{fmt:<6}{r['mode']:<8}{r['frames']:>6}{size:>12}{r['seconds']:>9.2f}s"
+                    f"{r['max_rss'] / 1024 / 1024:>10.1f}MB"
+                )
+
+
+if __name__ == "__main__":
+    main()
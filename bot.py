@@ -1,55 +1,162 @@
-from rich.traceback import install
-# 安裝Rich traceback
-install(show_locals=True)
+from utils.startup import timer
 
-import sys
+import time
+import importlib
 import discord
 from discord.ext import commands
 import os
+import signal
+import sys
 import settings
 import logging
 import asyncio
-from rich import print
-from discord import Embed
+
+from rich.traceback import install
+# 安裝Rich traceback (rich.logging 已匯入此模組，安裝本身幾乎沒有成本)
+install(show_locals=settings.RICH_TRACEBACK_SHOW_LOCALS)
 
 from utils import log
-from utils.database import db
+from utils.command_sync import sync_if_changed
+from utils import cluster
+from utils import metrics
+from utils.loop_monitor import start_monitor
+from utils import lifecycle
 
-intents = discord.Intents.all()
+timer.add('匯入模組', time.perf_counter() - timer.started)
 
-bot = commands.Bot(command_prefix=settings.PREFIX, intents=intents)
 
-@bot.event
-async def on_ready():
-    logging.info(f'已登入為 {bot.user.name}')
-    activity = discord.CustomActivity(
-        name="🪄 正在將圖片轉換為 GIF",
-    )
-    await bot.change_presence(status=discord.Status.online, activity=activity)
-    try:
-        synced = await bot.tree.sync()
-        logging.info(f'已同步 {len(synced)} 個全域指令')
-    except Exception as e:
-        logging.error(f'同步指令失敗: {e}')
-    
+connect_started = time.perf_counter()
+
+
+def build_intents(lean: bool) -> discord.Intents:
+    """取得要請求的 Gateway Intents"""
+    if not lean:
+        return discord.Intents.all()
+    # 精簡模式：右鍵選單的互動不需要任何 intent，
+    # 只保留伺服器資訊 (名稱、成員數) 與開發者前綴指令所需的訊息 intent
+    intents = discord.Intents.none()
+    intents.guilds = True
+    intents.guild_messages = True
+    intents.dm_messages = True
+    intents.message_content = True
+    return intents
+
 
+def bot_options(lean: bool | None = None) -> dict:
+    """建立機器人時的快取相關參數"""
+    if lean is None:
+        lean = settings.LEAN_CACHE
+    options = {'intents': build_intents(lean)}
+    if settings.MAX_RATELIMIT_TIMEOUT > 0:
+        # 等待過久的請求拋出 RateLimited (例如統計頻道改名每 10 分鐘 2 次)，不阻塞呼叫端
+        options['max_ratelimit_timeout'] = max(30.0, settings.MAX_RATELIMIT_TIMEOUT)
+    if lean:
+        # 不快取成員、不在啟動時分塊請求成員、不快取訊息
+        options.update(
+            member_cache_flags=discord.MemberCacheFlags.none(),
+            chunk_guilds_at_startup=False,
+            max_messages=None,
+        )
+    return options
 
-# 異步函數來載入模組
-async def load_extensions_all():
+
+def create_bot(shard_ids: list[int] | None = None, shard_count: int | None = None) -> commands.Bot:
+    """建立機器人實例；指定 shard_ids 時使用 AutoShardedBot 只處理這些分片"""
+    if shard_ids is not None:
+        bot = commands.AutoShardedBot(
+            command_prefix=settings.PREFIX,
+            shard_ids=shard_ids,
+            shard_count=shard_count,
+            **bot_options(),
+        )
+    else:
+        bot = commands.Bot(command_prefix=settings.PREFIX, **bot_options())
+
+    @bot.event
+    async def on_ready():
+        logging.info(f'已登入為 {bot.user.name}')
+        if not timer.reported:
+            timer.add('連線至就緒', time.perf_counter() - connect_started)
+            timer.report()
+        activity = discord.CustomActivity(
+            name="🪄 正在將圖片轉換為 GIF",
+        )
+        await bot.change_presence(status=discord.Status.online, activity=activity)
+        # 指令是全域的，叢集模式下只由叢集 0 同步
+        if not cluster.is_primary():
+            return
+        try:
+            # on_ready 在每次重新連線時都會觸發，只有指令變更時才需要同步
+            await sync_if_changed(bot)
+        except Exception as e:
+            logging.error(f'同步指令失敗: {e}')
+
+    return bot
+
+
+# 異步函數來載入模組 (並行載入所有 Cog)
+async def load_extensions_all(bot: commands.Bot):
     logging.info('正在載入模組...')
-    for filename in os.listdir('./cogs'):
-        if filename.endswith('.py'):
-            await bot.load_extension(f'cogs.{filename[:-3]}')
-            # logging.info(f'已載入模組: {filename[:-3]}')
+    extensions = [f'cogs.{filename[:-3]}' for filename in os.listdir('./cogs') if filename.endswith('.py')]
+    results = await asyncio.gather(
+        *(bot.load_extension(extension) for extension in extensions),
+        return_exceptions=True
+    )
+    for extension, result in zip(extensions, results):
+        if isinstance(result, BaseException):
+            logging.error(f'載入模組 {extension} 失敗: {result}')
+
+def install_signal_handlers(bot: commands.Bot):
+    """收到 SIGTERM 時排空後關閉，而不是直接結束程序"""
+    loop = asyncio.get_running_loop()
+    try:
+        loop.add_signal_handler(signal.SIGTERM, lifecycle.request_shutdown, bot)
+    except NotImplementedError:
+        # Windows 的事件迴圈不支援 add_signal_handler
+        signal.signal(signal.SIGTERM, lambda *_: loop.call_soon_threadsafe(lifecycle.request_shutdown, bot))
+
+async def main(shard_ids: list[int] | None = None, shard_count: int | None = None):
+    global connect_started
+    bot = create_bot(shard_ids, shard_count)
+    # 盡早啟動，連啟動過程中阻塞事件迴圈的呼叫也能被記錄
+    loop_monitor = start_monitor(settings.LOOP_LAG_INTERVAL, settings.LOOP_LAG_THRESHOLD)
+    metrics_server = None
+    try:
+        async with bot:
+            # Cog 載入時可能啟動需要資料表的任務，資料庫初始化完成後才載入模組；登入與兩者同時進行。
+            # SQLAlchemy 的匯入需要數百毫秒，在執行緒中匯入資料庫模組，不阻塞登入
+            async def prepare():
+                database = await timer.measure(
+                    '匯入資料庫模組', asyncio.to_thread(importlib.import_module, 'utils.database')
+                )
+                await timer.measure('資料庫初始化', database.db.initialize())
+                await timer.measure('載入模組', load_extensions_all(bot))
 
-async def main():
-    async with bot:
-        await load_extensions_all()
-        await bot.start(settings.DISCORD_BOT_TOKEN)
+            await asyncio.gather(
+                prepare(),
+                timer.measure('登入', bot.login(settings.DISCORD_BOT_TOKEN)),
+            )
+            metrics_server = await metrics.start_server()
+            install_signal_handlers(bot)
+            connect_started = time.perf_counter()
+            await bot.connect()
+    finally:
+        database = sys.modules.get('utils.database')
+        if database is not None:
+            await database.db.close()
+        if metrics_server is not None:
+            await metrics_server.stop()
+        if loop_monitor is not None:
+            await loop_monitor.stop()
 
 if __name__ == '__main__':
     logging.info('啟動機器人中...')
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
-        logging.info('機器人已停止 (KeyboardInterrupt)')
\ No newline at end of file
+        logging.info('機器人已停止 (KeyboardInterrupt)')
+    if lifecycle.restart_requested:
+        # 排空並關閉所有連線後才重新執行，確保日誌與資料庫都已寫入
+        log.stop_logging()
+        python = sys.executable
+        os.execl(python, python, *sys.argv)
@@ -0,0 +1,155 @@
+"""
+叢集啟動器
+
+啟動 N 個機器人程序，每個程序以 AutoShardedBot 處理一段連續的分片。
+各程序只把轉換事件與用戶/伺服器資料附加到自己的日誌，由啟動器程序作為唯一的資料庫寫入者批次匯入；
+統計頻道只由叢集 0 發佈；
+各叢集定期寫入狀態檔，AdminCog 讀取後彙總為跨程序統計；
+叢集以 .dev restart 排空後結束時，啟動器重新啟動該叢集。
+
+用法:
+    python cluster.py --clusters 4                 # 自動取得 Discord 建議的分片數
+    python cluster.py --clusters 4 --shards 16
+    python cluster.py --clusters 3 --fake-gateway --duration 20   # 本機測試，不連線至 Discord
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+
+import aiohttp
+
+import settings
+from utils import log
+from utils.cluster import RESTART_EXIT_CODE, aggregate_statuses, clear_statuses, read_statuses, shard_ranges
+
+
+def cluster_journal_dir(cluster_id: int) -> str:
+    return os.path.join(settings.JOURNAL_DIR, f"cluster-{cluster_id}")
+
+
+def run_cluster(cluster_id: int, shard_ids: list[int], shard_count: int, fake_gateway: bool, duration: float | None):
+    """叢集子程序進入點"""
+    # 必須在匯入資料庫模組前設定，讓全域資料庫實例使用本叢集的事件日誌
+    settings.CLUSTER_ID = cluster_id
+    settings.JOURNAL_DIR = cluster_journal_dir(cluster_id)
+    settings.JOURNAL_INGEST = False
+    # 每個叢集寫入各自的日誌檔案，輪替時不會影響其他程序
+    log.file_handler.set_tag(f"cluster-{cluster_id}")
+    # 子程序由啟動器處理 Ctrl+C
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    import bot as bot_module
+    from utils import lifecycle
+    from utils.cluster import FakeGateway
+
+    logging.info(f"叢集 {cluster_id} 啟動，負責分片 {shard_ids[0]}-{shard_ids[-1]} (共 {shard_count})")
+
+    async def start():
+        if fake_gateway:
+            from utils.database import db
+
+            gateway = FakeGateway(cluster_id, shard_ids, shard_count, seed=cluster_id)
+            try:
+                await db.initialize()
+                await gateway.run(duration)
+            finally:
+                await db.close()
+            logging.info(f"叢集 {cluster_id} 假 Gateway 結束，共產生 {gateway.conversions} 筆轉換")
+            return
+        await bot_module.main(shard_ids, shard_count)
+
+    asyncio.run(start())
+    if lifecycle.restart_requested:
+        # 子程序結束時不會執行 atexit，先寫出剩餘的日誌；由啟動器重新啟動本叢集
+        log.stop_logging()
+        sys.exit(RESTART_EXIT_CODE)
+
+
+async def fetch_recommended_shards() -> int:
+    """向 Discord 查詢建議的分片數"""
+    async with aiohttp.ClientSession() as session:
+        async with session.get(
+            "https://discord.com/api/v10/gateway/bot",
+            headers={"Authorization": f"Bot {settings.DISCORD_BOT_TOKEN}"},
+        ) as resp:
+            resp.raise_for_status()
+            data = await resp.json()
+            return int(data["shards"])
+
+
+async def run_writer(processes: list, journal_dirs: list[str], respawn):
+    """啟動器程序：唯一的資料庫寫入者，持續匯入所有叢集的事件日誌，並重新啟動要求重啟的叢集"""
+    from utils.database import db
+    from utils.journal import EventJournal
+
+    journals = [EventJournal(path, settings.JOURNAL_MAX_FILE_SIZE) for path in journal_dirs]
+    await db.initialize()
+    try:
+        while True:
+            await asyncio.sleep(settings.JOURNAL_FLUSH_INTERVAL)
+            for journal in journals:
+                await db.ingest_journal(journal)
+            for cluster_id, process in enumerate(processes):
+                if process.exitcode == RESTART_EXIT_CODE:
+                    logging.info(f"叢集 {cluster_id} 要求重新啟動")
+                    processes[cluster_id] = respawn(cluster_id)
+            if not any(process.is_alive() for process in processes):
+                break
+    finally:
+        # 所有叢集結束後再做最後一次匯入
+        for journal in journals:
+            await db.ingest_journal(journal)
+        await db.close()
+
+    summary = aggregate_statuses(read_statuses(max_age=float("inf")))
+    logging.info(
+        f"叢集全部結束: {summary['clusters']} 個叢集、{summary['shards']} 個分片、"
+        f"{summary['guilds']} 個伺服器、{summary['conversions']} 筆轉換"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="2GifBot 多程序叢集啟動器")
+    parser.add_argument("--clusters", type=int, default=os.cpu_count() or 2, help="程序數量")
+    parser.add_argument("--shards", type=int, default=None, help="分片總數 (預設向 Discord 查詢)")
+    parser.add_argument("--fake-gateway", action="store_true", help="不連線至 Discord，以假事件測試")
+    parser.add_argument("--duration", type=float, default=None, help="假 Gateway 執行秒數")
+    args = parser.parse_args()
+
+    shard_count = args.shards
+    if shard_count is None:
+        shard_count = args.clusters * 2 if args.fake_gateway else asyncio.run(fetch_recommended_shards())
+    ranges = shard_ranges(shard_count, args.clusters)
+    # 清除上次執行留下的叢集狀態
+    clear_statuses()
+    logging.info(f"以 {len(ranges)} 個叢集啟動 {shard_count} 個分片")
+
+    context = multiprocessing.get_context("spawn")
+
+    def start_cluster(cluster_id: int):
+        process = context.Process(
+            target=run_cluster,
+            args=(cluster_id, ranges[cluster_id], shard_count, args.fake_gateway, args.duration),
+            name=f"cluster-{cluster_id}",
+        )
+        process.start()
+        return process
+
+    processes = [start_cluster(cluster_id) for cluster_id in range(len(ranges))]
+    try:
+        asyncio.run(run_writer(processes, [cluster_journal_dir(i) for i in range(len(ranges))], start_cluster))
+    except KeyboardInterrupt:
+        logging.info("收到中斷訊號，正在停止所有叢集...")
+        for process in processes:
+            process.terminate()
+    finally:
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    main()
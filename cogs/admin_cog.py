@@ -6,11 +6,12 @@ import discord
 from discord.ext import commands,tasks
 from discord import app_commands, Interaction
 import asyncio
-from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
 from utils import ui
 from utils.log import log
 from utils.database import db
+from utils.export import export_usage_logs, EXPORT_FORMATS
+from utils.stats_publisher import StatsPublisher
+from utils import cluster
 from datetime import datetime
 
 import settings
@@ -18,6 +19,17 @@ import settings
 class AdminCog(commands.Cog):
     def __init__(self, bot):
         self.bot:commands.Bot = bot
+        self.publisher = StatsPublisher(
+            bot,
+            channel_ids={
+                'user_count': settings.STATS_USER_COUNT_CHANNEL_ID,
+                'usage_count': settings.STATS_USAGE_COUNT_CHANNEL_ID,
+            },
+            data_channel_id=settings.STATS_DATA_CHANNEL_ID,
+            message_id=settings.STATS_MESSAGE_ID,
+            coalesce_delay=settings.STATS_PUBLISH_COALESCE_DELAY,
+            rename_interval=settings.STATS_CHANNEL_RENAME_INTERVAL,
+        )
 
     @commands.command(name="stats", help="查看機器人統計資訊")
     async def stats(self, ctx: commands.Context, target: str = None):
@@ -83,6 +95,12 @@ class AdminCog(commands.Cog):
             inline=True
         )
         
+        embed.add_field(
+            name="✂️ 略過的寫入",
+            value=f"`{db_stats.get('writes_avoided', 0):,}` 次",
+            inline=True
+        )
+        
         embed.add_field(
             name="💾 資料庫路徑",
             value=f"`{db_stats.get('database_path', 'N/A')}`",
@@ -139,39 +157,135 @@ class AdminCog(commands.Cog):
     
 
 
+    @commands.command(name="export", help="匯出使用記錄 (format=csv|jsonl since=YYYY-MM-DD until=YYYY-MM-DD guild=ID user=ID)")
+    async def export_logs(self, ctx: commands.Context, *options: str):
+        """串流匯出使用記錄為壓縮檔案"""
+        if ctx.author.id not in settings.DEV_ID:
+            await ctx.send(embed=ui.error_embed("❌ 只有開發者可以執行此指令！"))
+            return
+        
+        try:
+            filters = dict(option.split("=", 1) for option in options)
+            fmt = filters.pop("format", "csv").lower()
+            since = datetime.fromisoformat(filters.pop("since")) if "since" in filters else None
+            until = datetime.fromisoformat(filters.pop("until")) if "until" in filters else None
+            guild_id = int(filters.pop("guild")) if "guild" in filters else None
+            user_id = int(filters.pop("user")) if "user" in filters else None
+            if filters or fmt not in EXPORT_FORMATS:
+                raise ValueError
+        except ValueError:
+            await ctx.send(
+                embed=ui.error_embed("❌ 無效的參數！範例: `format=jsonl since=2025-06-01 guild=123`")
+            )
+            return
+        
+        log(ctx, format=fmt, since=since, until=until, guild=guild_id, user=user_id)
+        try:
+            async with ctx.typing():
+                path, count = await export_usage_logs(fmt, since, until, guild_id, user_id)
+            
+            size = os.path.getsize(path)
+            embed = discord.Embed(
+                title="📦 匯出完成",
+                description=f"已匯出 `{count:,}` 筆使用記錄 (`{size / 1024:,.1f}` KB)",
+                color=discord.Color.green()
+            )
+            # 檔案太大時只保留在本機
+            if size <= 8 * 1024 * 1024:
+                await ctx.send(embed=embed, file=discord.File(path))
+            else:
+                embed.add_field(name="💾 檔案位置", value=f"`{os.path.abspath(path)}`", inline=False)
+                await ctx.send(embed=embed)
+        except Exception as e:
+            logging.error(f"匯出使用記錄時發生錯誤: {e}")
+            await ctx.send(embed=ui.error_embed("❌ 匯出使用記錄時發生錯誤！"))
+
     @tasks.loop(seconds=30)
     async def auto_update_stats(self):
+        """產生最新統計並交給發佈器 (內容沒有變化時不會送出編輯)"""
         db_stats = await db.get_database_stats()
-        user_count = await self.bot.fetch_channel("1387694673052827719")
-        await user_count.edit(
-            name=f"用戶數量: {db_stats.get('total_users', 0):,}"
-        )
-        run_times_count = await self.bot.fetch_channel("1387696476712337449")
-        await run_times_count.edit(
-            name=f"使用次數: {db_stats.get('total_usage_logs', 0):,}"
+        embeds = None
+        if settings.STATS_DATA_CHANNEL_ID and settings.STATS_MESSAGE_ID:
+            embeds = [await self._show_database_stats(), await self._show_global_stats()]
+        self.publisher.submit(
+            {
+                'user_count': f"用戶數量: {db_stats.get('total_users', 0):,}",
+                'usage_count': f"使用次數: {db_stats.get('total_usage_logs', 0):,}",
+            },
+            embeds
         )
-        embeds=[]
-        data_channel = await self.bot.fetch_channel("1387699070373724242")
-        database_embed = await data_channel.fetch_message("1387699322337886218")
-        embed = await self._show_database_stats()
-        embeds.append(embed)
-        embed = await self._show_global_stats()
-        embeds.append(embed)
-        await database_embed.edit(embeds=embeds)
 
     @auto_update_stats.before_loop
     async def before_auto_update_stats(self):
         """等待機器人準備完成"""
         await self.bot.wait_until_ready()
 
+    @commands.command(name="cluster", help="查看所有叢集的狀態")
+    async def cluster_stats(self, ctx: commands.Context):
+        """彙總顯示所有叢集程序的狀態"""
+        if ctx.author.id not in settings.DEV_ID:
+            return
+        
+        statuses = cluster.read_statuses()
+        if not statuses:
+            await ctx.send(embed=ui.info_embed("目前不是以叢集模式執行"))
+            return
+        
+        summary = cluster.aggregate_statuses(statuses)
+        embed = discord.Embed(
+            title="🧩 叢集狀態",
+            description=(
+                f"叢集 `{summary['clusters']}` 個 · 分片 `{summary['shards']}` 個 · "
+                f"伺服器 `{summary['guilds']:,}` 個 · 記憶體 `{summary['rss'] / 1024 / 1024:,.0f}` MB"
+            ),
+            color=discord.Color.blue()
+        )
+        for status in statuses:
+            shard_ids = status.get('shard_ids') or [0]
+            latency = status.get('latency')
+            embed.add_field(
+                name=f"叢集 {status['cluster_id']} (分片 {shard_ids[0]}-{shard_ids[-1]})",
+                value=(
+                    f"伺服器: `{status.get('guilds', 0):,}`\n"
+                    f"延遲: `{'N/A' if latency is None else f'{latency * 1000:.0f}ms'}`\n"
+                    f"轉換: `{status.get('conversions', 0):,}`"
+                ),
+                inline=True
+            )
+        embed.timestamp = datetime.now()
+        await ctx.send(embed=embed)
+
+    @tasks.loop(seconds=15)
+    async def report_cluster_status(self):
+        """叢集模式下定期回報本程序狀態，供其他叢集彙總"""
+        cluster.bot_status(self.bot, settings.CLUSTER_ID, db.journal.appended)
+
+    @report_cluster_status.before_loop
+    async def before_report_cluster_status(self):
+        await self.bot.wait_until_ready()
+
+    @tasks.loop(seconds=settings.LEADERBOARD_RECONCILE_INTERVAL)
+    async def reconcile_leaderboard(self):
+        """定期將記憶體內排行榜與資料庫對帳"""
+        await db.reconcile_leaderboard()
+
     async def cog_load(self):
         """當 Cog 載入時啟動定時任務"""
-        self.auto_update_stats.start()
-        logging.info("已啟動自動更新統計任務")
+        # 叢集模式下只由叢集 0 發佈統計，避免多個程序編輯同一批頻道
+        if cluster.is_primary():
+            self.publisher.start()
+            self.auto_update_stats.start()
+            logging.info("已啟動自動更新統計任務")
+        self.reconcile_leaderboard.start()
+        if settings.CLUSTER_ID is not None:
+            self.report_cluster_status.start()
 
     def cog_unload(self):
         """當 Cog 卸載時停止定時任務"""
         self.auto_update_stats.cancel()
+        self.reconcile_leaderboard.cancel()
+        self.report_cluster_status.cancel()
+        self.publisher.stop()
         logging.info("已停止自動更新統計任務")
 
     async def _show_global_stats(self):
@@ -269,6 +383,17 @@ class AdminCog(commands.Cog):
                 embed=ui.error_embed("❌ 無法獲取用戶統計資料！")
             )
 
+    async def _get_member_count(self, guild_id: int, fallback: int) -> int:
+        """取得伺服器成員數 (不依賴成員快取，精簡快取模式下也能使用)"""
+        guild = self.bot.get_guild(guild_id)
+        if guild is not None and guild.member_count is not None:
+            return guild.member_count
+        try:
+            guild = await self.bot.fetch_guild(guild_id, with_counts=True)
+            return guild.approximate_member_count or fallback
+        except discord.HTTPException:
+            return fallback
+
     async def _show_guild_stats(self, ctx, guild_id: int):
         """顯示伺服器統計"""
         try:
@@ -298,7 +423,7 @@ class AdminCog(commands.Cog):
             
             embed.add_field(
                 name="👤 伺服器成員數",
-                value=f"`{guild_stats['member_count']}` 人",
+                value=f"`{await self._get_member_count(guild_id, guild_stats['member_count'])}` 人",
                 inline=True
             )
             
@@ -1,16 +1,16 @@
 import logging
 import os
-import sys
 import time
 import discord
 from discord.ext import commands
 from discord import app_commands, Interaction
 import asyncio
-from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
 from utils import ui
 from utils.log import log
 from utils.database import db
+from utils.command_sync import sync_if_changed
+from utils import handoff
+from utils import lifecycle
 from datetime import datetime
 
 import settings
@@ -22,12 +22,16 @@ async def reload_cogs(cogs: list|str, bot:commands.Bot):
     for cog in cogs:
         try:
             # logging.info(f"正在重新載入 {cog}...")
+            # 支援交接的 Cog 先交出長期資源 (執行緒池、HTTP 連線、進行中的工作)，由新實例接手
+            handoff.export_cogs(bot, f"cogs.{cog}")
             await bot.reload_extension(f"cogs.{cog}")
             # logging.info(f"已成功重新載入 {cog}。")
         
         except Exception as e:
             logging.warning(f"Cogs 重新載入失敗: {e}")
             raise e
+        finally:
+            await handoff.release_unclaimed()
         
 def get_all_cogs():
         cogs =  [filename[:-3] for filename in os.listdir("./cogs") if filename.endswith(".py")]
@@ -213,12 +217,24 @@ class DevCog(commands.Cog):
         log(ctx)
         if ctx.author.id not in settings.DEV_ID:return
         logging.info(f"{ctx.author} > {settings.PREFIX} restart")
-        logging.info(f"{'='*10} 系統重啟 {'='*10}")
-        embed = ui.dev_embed("**機器人正在重啟...**")
-        await self.bot.change_presence(status=discord.Status.offline)
+        embed = ui.dev_embed(f"**機器人正在重啟...**\n等待進行中的轉換完成 (最多 {settings.DRAIN_TIMEOUT:.0f} 秒)")
         await ctx.reply(embed=embed)
-        python = sys.executable
-        os.execl(python, python, *sys.argv)
+        # 排空後由 bot.py 關閉連線並重新執行 (叢集模式下由啟動器重新啟動本叢集)
+        lifecycle.request_shutdown(self.bot, restart=True)
+
+    # 強制同步斜線指令
+    @commands.command()
+    async def sync(self, ctx: commands.Context):
+        """強制同步全域應用程式指令"""
+        log(ctx)
+        if ctx.author.id not in settings.DEV_ID:return
+        try:
+            synced = await sync_if_changed(self.bot, force=True)
+            embed = ui.dev_embed(f"**已同步 {len(synced)} 個全域指令。**")
+        except Exception as e:
+            embed = ui.dev_embed(f"**同步失敗\n```cmd\n{e}```**", color = discord.Color.red())
+        finally:
+            await ctx.reply(embed = embed)
 
     @commands.command()
     async def test(self, ctx: commands.Context):
@@ -229,13 +245,19 @@ class DevCog(commands.Cog):
         await ctx.reply(embed=ui.dev_embed("**測試成功！**"))
 
 
-class CogFileChangeHandler(FileSystemEventHandler):
+class CogFileChangeHandler:
+    """cogs 目錄的檔案變更處理器 (watchdog 只在啟用自動重載時才匯入)"""
     def __init__(self, bot: commands.Bot):
         self.last_modified = None
         self.last_modified_time = 0
         self.lock = False
         self.bot = bot
 
+    def dispatch(self, event):
+        # 與 FileSystemEventHandler.dispatch 相同的介面，只處理修改事件
+        if event.event_type == "modified":
+            self.on_modified(event)
+
     def on_modified(self, event):
         current_time = time.time()
         # 檢查事件是否是短時間內重複發生的
@@ -252,6 +274,8 @@ class CogFileChangeHandler(FileSystemEventHandler):
 
 async def start_file_watcher(bot, dev_cog: DevCog):
     # logging.info("啟動檔案監控器...")
+    from watchdog.observers import Observer
+
     event_handler = CogFileChangeHandler(bot)
     observer = Observer()
     
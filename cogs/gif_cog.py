@@ -2,13 +2,62 @@ import logging
 import io
 import aiohttp
 import discord
-from PIL import Image, ImageSequence
 from discord.ext import commands
 from discord import app_commands, Interaction, File
 from utils.log import log
 from utils import ui
 from utils.database import db
+from utils import metrics
+from utils import tracing
+from utils import handoff
+from utils import lifecycle
+from utils.workers import WorkerPool
+from utils.ratelimit import RateLimiter, estimate_cost
+from utils import video
+from utils import encoders
+from utils import probe
+from utils import presets
+import settings
 import asyncio
+import time
+
+
+# 轉換流程各階段耗時與大小的指標 (子序列預先取得，熱路徑只需一次 observe)
+STAGES = ('validate', 'download', 'decode', 'resize', 'encode', 'upload', 'db', 'total')
+stage_seconds = metrics.registry.histogram(
+    'gif_conversion_stage_seconds', '右鍵選單轉換各階段耗時', ('stage',)
+)
+STAGE = {stage: stage_seconds.labels(stage) for stage in STAGES}
+input_bytes = metrics.registry.histogram(
+    'gif_conversion_input_bytes', '下載的原始圖片大小', buckets=metrics.BYTES_BUCKETS
+)
+output_bytes = metrics.registry.histogram(
+    'gif_conversion_output_bytes', '轉換後的 GIF 大小', buckets=metrics.BYTES_BUCKETS
+)
+conversions_total = metrics.registry.counter(
+    'gif_conversions_total', '完成的轉換次數', ('type',)
+)
+errors_total = metrics.registry.counter(
+    'gif_conversion_errors_total', '轉換失敗次數 (依原因)', ('cause',)
+)
+in_flight = metrics.registry.gauge('gif_conversions_in_flight', '處理中的轉換數')
+
+
+# 支援的圖片副檔名
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp', '.bmp', '.tiff', '.gif')
+
+# 被限制時的提示 (依受限的範圍)
+THROTTLE_MESSAGES = {
+    'user': "⏳ 你的轉換太頻繁了！",
+    'guild': "⏳ 此伺服器的轉換太頻繁了！",
+    'global': "⏳ 機器人目前忙碌中！",
+}
+
+
+def _import_pillow():
+    """延遲匯入 Pillow (匯入後由 Python 模組快取，重複呼叫沒有成本)"""
+    from PIL import Image, ImageSequence
+    return Image, ImageSequence
 
 
 class GifCog(commands.Cog):
@@ -26,39 +75,121 @@ class GifCog(commands.Cog):
         
         self.bot.tree.add_command(self.context_menu)
 
+        # 長期資源 (重新載入時交接給新實例)
+        self.pool: WorkerPool = None
+        self.session: aiohttp.ClientSession = None
+        self.in_flight: set[asyncio.Task] = set()
+        self.limiter: RateLimiter = None
+        self._handed_off = False
+
+    async def cog_load(self):
+        state = handoff.claim(self.qualified_name)
+        if state is not None:
+            # 接手舊實例的執行緒池、HTTP 連線與進行中的轉換
+            self.pool = state['pool']
+            self.session = state['session']
+            self.in_flight = state['in_flight']
+            self.limiter = state['limiter']
+            logging.info(f"已接手 GifCog 的資源 (進行中的轉換: {len(self.in_flight)})")
+            return
+        # Pillow 轉換在執行緒池中進行，不阻塞事件迴圈
+        self.pool = WorkerPool('convert', settings.CONVERSION_WORKERS)
+        self.limiter = RateLimiter(
+            user=(settings.RATE_LIMIT_USER_RATE, settings.RATE_LIMIT_USER_BURST),
+            guild=(settings.RATE_LIMIT_GUILD_RATE, settings.RATE_LIMIT_GUILD_BURST),
+            global_=(settings.RATE_LIMIT_GLOBAL_RATE, settings.RATE_LIMIT_GLOBAL_BURST),
+        )
+        # Pillow 延遲到背景執行緒匯入，不拖慢啟動，也讓第一次轉換不必等待匯入
+        self.pillow_warmup = asyncio.create_task(asyncio.to_thread(_import_pillow))
+        if not encoders.for_format(settings.OUTPUT_FORMAT):
+            logging.error(f"沒有可用的 {settings.OUTPUT_FORMAT} 編碼器，請檢查 OUTPUT_FORMAT 設定")
+        # 載入編碼器校準結果 (沒有結果時在背景校準，完成前使用各格式的預設編碼器)
+        self.calibration = asyncio.create_task(
+            asyncio.to_thread(encoders.ensure_calibrated, settings.ENCODER_AUTO_CALIBRATE)
+        )
+
+    async def cog_unload(self):
+        # 移除右鍵選單，重新載入時新實例才能再次註冊
+        self.bot.tree.remove_command(self.context_menu.name, type=self.context_menu.type)
+        if not self._handed_off:
+            await self.release_state(self.export_state())
+
+    def export_state(self) -> dict:
+        """交出長期資源 (之後卸載時不再關閉)"""
+        self._handed_off = True
+        return {'pool': self.pool, 'session': self.session, 'in_flight': self.in_flight, 'limiter': self.limiter}
+
+    @staticmethod
+    async def release_state(state: dict):
+        """釋放資源 (進行中的轉換會繼續使用舊的執行緒池直到完成)"""
+        if state['pool'] is not None:
+            state['pool'].shutdown()
+        if state['session'] is not None:
+            await state['session'].close()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """共用的 HTTP 連線 (重複使用連線，避免每次轉換都重新建立 TLS 連線)"""
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30))
+        return self.session
+
+    def _find_attachment(self, message: discord.Message):
+        """找到訊息中的第一張圖片附件 (已安裝 PyAV 時也接受影片)"""
+        extensions = IMAGE_EXTENSIONS + video.VIDEO_EXTENSIONS if video.available() else IMAGE_EXTENSIONS
+        for att in message.attachments:
+            if att.filename.lower().endswith(extensions):
+                return att
+        return None
+
     def _get_attachment(self, message: discord.Message):
         """從訊息中獲取第一個有效的圖片附件"""
         
         # 找到第一張圖片
-        attachment = None
-        for att in message.attachments:
-            if any(att.filename.lower().endswith(ext) for ext in ['.png', '.jpg', '.jpeg', '.webp', '.bmp', '.tiff', '.gif']):
-                attachment = att
-                break
+        attachment = self._find_attachment(message)
         
         if not attachment:
             return None
         
         # 檢查檔案大小
-        if attachment.size > 8 * 1024 * 1024:
+        if attachment.filename.lower().endswith(video.VIDEO_EXTENSIONS):
+            if attachment.size > settings.VIDEO_MAX_BYTES:
+                raise ValueError(f"❌ 影片檔案過大！請選擇小於 {settings.VIDEO_MAX_BYTES // (1024 * 1024)}MB 的影片。")
+        elif attachment.size > 8 * 1024 * 1024:
             raise ValueError("❌ 圖片檔案過大！請選擇小於 8MB 的圖片。")
+        # Discord 提供的尺寸可在下載前先檢查像素預算
+        if attachment.width and attachment.height and attachment.width * attachment.height > settings.MAX_IMAGE_PIXELS:
+            raise ValueError("❌ 圖片解析度過大！")
         return attachment
 
     async def _validate_image_url(self, url: str) -> bool:
         """驗證 URL 是否指向圖片（只檢查 Content-Type，不下載檔案）"""
         try:
-            async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=5)) as session:
-                # 只發送 HEAD 請求來檢查 Content-Type，不下載檔案內容
-                async with session.head(url) as resp:
-                    if resp.status == 200:
-                        content_type = resp.headers.get('content-type', '').lower()
-                        return content_type.startswith('image/')
+            session = self._get_session()
+            # 只發送 HEAD 請求來檢查 Content-Type，不下載檔案內容
+            async with session.head(url, timeout=aiohttp.ClientTimeout(total=5)) as resp:
+                if resp.status == 200:
+                    content_type = resp.headers.get('content-type', '').lower()
+                    return content_type.startswith('image/')
         except asyncio.TimeoutError:
             logging.warning(f"驗證圖片 URL 超時: {url}")
         except Exception as e:
             logging.warning(f"驗證圖片 URL 失敗: {url} - {e}")
         return False
 
+    def _estimate_cost(self, message: discord.Message) -> float:
+        """在下載前預估轉換的工作量 (速率限制的成本)"""
+        attachment = self._find_attachment(message)
+        if attachment is None:
+            return estimate_cost(None, None, None, default=settings.RATE_LIMIT_URL_COST)
+        if attachment.filename.lower().endswith('.gif'):
+            # GIF 不需要轉換
+            return 1.0
+        cost = estimate_cost(attachment.size, attachment.width, attachment.height)
+        if attachment.filename.lower().endswith(video.VIDEO_EXTENSIONS):
+            # 影片需要解碼多個畫格
+            cost *= settings.RATE_LIMIT_VIDEO_MULTIPLIER
+        return cost
+
     def _get_url(self, message: discord.Message) -> str:
         """從訊息中獲取任何 HTTP/HTTPS URL"""
         import re
@@ -74,35 +205,76 @@ class GifCog(commands.Cog):
 
     async def convert_message_image_to_gif(self, interaction: Interaction, message: discord.Message):
         """右鍵選單：將訊息中的圖片轉換為 GIF"""
+        if lifecycle.is_draining():
+            # 重新啟動中，不再接受新的轉換
+            await interaction.response.send_message(embed=ui.error_embed("❌ 機器人正在重新啟動，請稍後再試！"), ephemeral=True)
+            return
+        # 下載前依預估工作量套用速率限制；回應互動前不查詢資料庫，
+        # 先以預設值的成本計算，讀取用戶的預設組合後再調整差額
+        workload = self._estimate_cost(message)
+        cost = workload * presets.cost(presets.fallback())
+        retry_after, scope = self.limiter.acquire(interaction.user.id, interaction.guild_id, cost)
+        if scope is not None:
+            retry_at = int(time.time() + retry_after) + 1
+            logging.info(f"用戶 {interaction.user} 的轉換被速率限制 ({scope})，{retry_after:.1f} 秒後可再試")
+            await interaction.response.send_message(
+                embed=ui.error_embed(f"{THROTTLE_MESSAGES[scope]}\n請在 <t:{retry_at}:R> 再試一次。", footer_text="速率限制"),
+                ephemeral=True
+            )
+            return
+        task = asyncio.current_task()
+        self.in_flight.add(task)
+        try:
+            # 依取樣率追蹤本次互動的各階段
+            async with tracing.tracer.trace('convert_message_image_to_gif', interaction_id=interaction.id, message_id=message.id):
+                await self._convert_message(interaction, message, workload, cost)
+        finally:
+            self.in_flight.discard(task)
+
+    async def _convert_message(self, interaction: Interaction, message: discord.Message,
+                               workload: float, charged: float):
         log(f"用戶 {interaction.user} 透過右鍵選單轉換圖片")
-        await interaction.response.defer()
+        with tracing.span('defer'):
+            await interaction.response.defer()
+        # 用戶儲存的預設組合 (沒有時為 balanced)，依其成本調整已扣除的速率限制額度
+        preset = presets.from_row(await db.get_user_preset(interaction.user.id))
+        self.limiter.adjust(interaction.user.id, interaction.guild_id, charged, workload * presets.cost(preset))
+        tracing.annotate(preset=preset.name)
+        started = time.perf_counter()
+        in_flight.inc()
         
         try:
-            attachment = None
-            image_url = None
+            with tracing.span('resolve'):
+                attachment = None
+                image_url = None
             
-            # 首先嘗試獲取附件
-            attachment = self._get_attachment(message)
+                # 首先嘗試獲取附件
+                attachment = self._get_attachment(message)
             
-            if attachment:
-                image_url = attachment.url
-                filename = attachment.filename
-                file_size = attachment.size
-            else:
-                # 如果沒有附件，嘗試從訊息內容中獲取 URL
-                image_url = self._get_url(message)
-                if not image_url:
-                    raise ValueError("❌ 此訊息沒有包含圖片或圖片URL！")
+                if attachment:
+                    image_url = attachment.url
+                    filename = attachment.filename
+                    file_size = attachment.size
+                else:
+                    # 如果沒有附件，嘗試從訊息內容中獲取 URL
+                    image_url = self._get_url(message)
+                    if not image_url:
+                        raise ValueError("❌ 此訊息沒有包含圖片或圖片URL！")
                 
-                # 驗證 URL 是否指向圖片（使用 HEAD 請求，不下載檔案）
-                if not await self._validate_image_url(image_url):
-                    raise ValueError("❌ URL 不是有效的圖片連結！")
+                    # 驗證 URL 是否指向圖片（使用 HEAD 請求，不下載檔案）
+                    stage_started = time.perf_counter()
+                    with tracing.span('validate'):
+                        valid = await self._validate_image_url(image_url)
+                    STAGE['validate'].observe(time.perf_counter() - stage_started)
+                    if not valid:
+                        raise ValueError("❌ URL 不是有效的圖片連結！")
                 
-                # 從 URL 中推測檔案名
-                filename = image_url.split('/')[-1].split('?')[0]
-                if not filename or '.' not in filename:
-                    filename = "image_from_url.png"
-                file_size = None  # URL 無法直接獲取檔案大小
+                    # 從 URL 中推測檔案名
+                    filename = image_url.split('/')[-1].split('?')[0]
+                    if not filename or '.' not in filename:
+                        filename = "image_from_url.png"
+                    file_size = None  # URL 無法直接獲取檔案大小
+                tracing.annotate(source='attachment' if attachment else 'url', file_size=file_size)
 
             embed = discord.Embed(
                 title="轉換圖片為 GIF",
@@ -122,181 +294,332 @@ class GifCog(commands.Cog):
             embed.set_footer(text=f"由 2GIF Bot 提供服務", icon_url=self.bot.user.display_avatar.url)
             
             if not filename.lower().endswith('.gif'):
-                # 下載並轉換圖片 (使用預設設定)
-                gif_data = await self._download_and_convert(image_url, 80, 30)
+                # 下載並轉換圖片 (使用用戶的預設組合)
+                is_video = filename.lower().endswith(video.VIDEO_EXTENSIONS)
+                gif_data = await self._download_and_convert(image_url, preset, is_video=is_video)
             
                 if gif_data is None:
                     await interaction.edit_original_response(embed=ui.error_embed("❌ 圖片轉換失敗！"))
                     return
             
-                # 準備檔案名稱
+                # 準備檔案名稱 (副檔名依輸出格式)
                 original_name = filename.rsplit('.', 1)[0]
-                gif_filename = f"{original_name}_converted.gif"
+                gif_filename = f"{original_name}_converted.{encoders.FORMATS[preset.format][0]}"
                 # 發送轉換後的 GIF
                 file = File(io.BytesIO(gif_data), filename=gif_filename)
                 
                 embed.set_image(url=f"attachment://{gif_filename}")
-                await interaction.edit_original_response(
-                    embed=embed,
-                    attachments=[file]
-                )
-                
-                # 記錄使用記錄到資料庫
+                stage_started = time.perf_counter()
                 try:
-                    await db.record_conversion(
-                        user=interaction.user,
-                        guild=interaction.guild,
-                        file_size=file_size,
-                        conversion_type="image_to_gif"
-                    )
-                except Exception as db_error:
-                    logging.error(f"記錄轉換使用失敗: {db_error}")
+                    with tracing.span('upload', bytes=len(gif_data)):
+                        await interaction.edit_original_response(
+                            embed=embed,
+                            attachments=[file]
+                        )
+                except Exception:
+                    errors_total.labels('upload').inc()
+                    raise
+                STAGE['upload'].observe(time.perf_counter() - stage_started)
+                conversion_type = "video_to_gif" if is_video else "image_to_gif"
                     
             else:
                 logging.info("圖片已經是 GIF 格式，無需轉換。")
                 embed.set_image(url=image_url)
-                await interaction.edit_original_response(
-                    embed=embed,
-                )
-                
+                with tracing.span('upload'):
+                    await interaction.edit_original_response(
+                        embed=embed,
+                    )
                 # 即使是 GIF 也記錄使用記錄
-                try:
+                conversion_type = "gif_passthrough"
+            
+            conversions_total.labels(conversion_type).inc()
+            # 記錄使用記錄到資料庫
+            stage_started = time.perf_counter()
+            try:
+                with tracing.span('db_record'):
                     await db.record_conversion(
                         user=interaction.user,
                         guild=interaction.guild,
                         file_size=file_size,
-                        conversion_type="gif_passthrough"
+                        conversion_type=conversion_type
                     )
-                except Exception as db_error:
-                    logging.error(f"記錄轉換使用失敗: {db_error}")
-
-            
+            except Exception as db_error:
+                errors_total.labels('db').inc()
+                logging.error(f"記錄轉換使用失敗: {db_error}")
+            STAGE['db'].observe(time.perf_counter() - stage_started)
             
+        except asyncio.CancelledError:
+            # 重新啟動時超過排空期限而被取消，回覆用戶後再結束
+            errors_total.labels('cancelled').inc()
+            try:
+                await interaction.edit_original_response(embed=ui.error_embed("❌ 機器人正在重新啟動，請稍後再試！"))
+            except Exception as e:
+                logging.error(f"回覆被取消的轉換失敗: {e}")
+            raise
+        except ValueError as e:
+            # 使用者可修正的錯誤 (沒有圖片、檔案過大、無效的連結)
+            errors_total.labels('invalid_input').inc()
+            logging.error(f"右鍵選單轉換 GIF 時發生錯誤: {e}")
+            await interaction.edit_original_response(embed=ui.error_embed("❌ 轉換過程中發生錯誤！"))
         except Exception as e:
+            errors_total.labels('internal').inc()
             logging.error(f"右鍵選單轉換 GIF 時發生錯誤: {e}")
             await interaction.edit_original_response(embed=ui.error_embed("❌ 轉換過程中發生錯誤！"))
+        finally:
+            in_flight.dec()
+            STAGE['total'].observe(time.perf_counter() - started)
 
-    async def _download_and_convert(self, image_url: str, quality: int, max_frames: int) -> bytes:
-        """下載並轉換圖片"""
+    async def _download_and_convert(self, image_url: str, preset: presets.Preset, is_video: bool = False) -> bytes:
+        """下載並依預設組合轉換圖片 (或影片)"""
         try:
-            # 設定超時和大小限制
-            timeout = aiohttp.ClientTimeout(total=30)
-            async with aiohttp.ClientSession(timeout=timeout) as session:
+            stage_started = time.perf_counter()
+            with tracing.span('download'):
+                # 共用的 HTTP 連線 (預設逾時 30 秒)
+                session = self._get_session()
                 async with session.get(image_url) as resp:
                     if resp.status != 200:
+                        errors_total.labels('download_status').inc()
                         logging.error(f"下載圖片失敗，狀態碼: {resp.status}")
                         return None
-                    
+                
                     # 檢查 Content-Type
                     content_type = resp.headers.get('content-type', '').lower()
-                    if not content_type.startswith('image/'):
+                    if not content_type.startswith('video/' if is_video else 'image/'):
+                        errors_total.labels('not_image').inc()
                         logging.error(f"URL 不是圖片: {content_type}")
                         return None
-                    
+                
                     # 檢查檔案大小
+                    max_size = settings.VIDEO_MAX_BYTES if is_video else 25 * 1024 * 1024  # 25MB
                     content_length = resp.headers.get('content-length')
                     if content_length:
                         file_size = int(content_length)
-                        if file_size > 25 * 1024 * 1024:  # 25MB 限制
+                        if file_size > max_size:
+                            errors_total.labels('too_large').inc()
                             logging.error(f"圖片檔案過大: {file_size} bytes")
                             return None
-                    
+                
                     # 分塊讀取，避免一次性下載過大檔案
-                    image_data = b''
-                    max_size = 25 * 1024 * 1024  # 25MB
-                    async for chunk in resp.content.iter_chunked(8192):  # 8KB 塊
-                        image_data += chunk
-                        if len(image_data) > max_size:
+                    chunks = []
+                    downloaded = 0
+                    probed = is_video
+                    async for chunk in resp.content.iter_chunked(65536):  # 64KB 塊
+                        chunks.append(chunk)
+                        downloaded += len(chunk)
+                        if downloaded > max_size:
+                            errors_total.labels('too_large').inc()
                             logging.error("下載過程中檔案超過大小限制")
                             return None
+                        if not probed and downloaded >= settings.PROBE_HEADER_BYTES:
+                            # 標頭下載完成後先檢查尺寸，超過預算時不必下載完整檔案
+                            probed = True
+                            self._check_header(b''.join(chunks))
+                    image_data = b''.join(chunks)
+                tracing.annotate(bytes=len(image_data))
+            STAGE['download'].observe(time.perf_counter() - stage_started)
+            input_bytes.observe(len(image_data))
             
             # 轉換圖片為 GIF
-            return await self.convert_image_to_gif(image_data, quality, max_frames)
+            if is_video:
+                max_frames, max_size, fps = preset.video_limits()
+                gif_data = await self.convert_video_to_gif(
+                    image_data, preset.quality, max_frames, preset.encoder,
+                    max_size=max_size, fps=fps, output_format=preset.format
+                )
+            else:
+                gif_data = await self.convert_image_to_gif(
+                    image_data, preset.quality, preset.max_frames, preset.encoder,
+                    max_size=preset.max_size, fps=preset.fps, output_format=preset.format
+                )
+            if gif_data is None:
+                errors_total.labels('decode').inc()
+            else:
+                output_bytes.observe(len(gif_data))
+            return gif_data
             
+        except probe.BudgetExceeded as e:
+            errors_total.labels('budget').inc()
+            logging.warning(f"拒絕轉換: {e}")
+            return None
         except asyncio.TimeoutError:
+            errors_total.labels('timeout').inc()
             logging.error("下載圖片超時")
             return None
         except Exception as e:
+            errors_total.labels('download').inc()
             logging.error(f"下載或轉換圖片時發生錯誤: {e}")
             return None
 
-    async def convert_image_to_gif(self, image_data: bytes, quality: int = 80, max_frames: int = 30) -> bytes:
+    def _check_header(self, prefix: bytes):
+        """以已下載的開頭資料檢查圖片尺寸 (標頭不完整或無法辨識時留給完整檢查)"""
+        try:
+            info = probe.probe(prefix, partial=True)
+        except probe.ProbeError:
+            return
+        probe.check_pixels(info)
+
+    async def convert_image_to_gif(self, image_data: bytes, quality: int = 80, max_frames: int = 30,
+                                   encoder: str = None, **options) -> bytes:
         """
-        將圖片資料轉換為 GIF 格式
+        將圖片資料轉換為 GIF 格式 (在轉換執行緒池中執行)
         
         Args:
             image_data: 原始圖片資料
             quality: GIF 品質 (1-100)
             max_frames: 最大幀數 (用於動態圖片)
+            encoder: 指定的編碼器名稱 (例如 bayer_gif 快速模式)，None 表示自動選擇
+            **options: max_size (靜態圖片最長邊)、fps (每秒最多幀數) 與 output_format
         
         Returns:
             轉換後的 GIF 資料，如果失敗則返回 None
         """
-        try:
-            # 打開圖片
-            with Image.open(io.BytesIO(image_data)) as img:
-                # 如果是靜態圖片，直接轉換
-                if getattr(img, 'is_animated', False) == False:
-                    # 轉換為 RGB 模式 (GIF 需要)
+        with tracing.span('convert', quality=quality, max_frames=max_frames):
+            return await self.pool.run(convert_image_to_gif, image_data, quality, max_frames, encoder, **options)
+
+    async def convert_video_to_gif(self, video_data: bytes, quality: int = 80, max_frames: int = 50,
+                                   encoder: str = None, **options) -> bytes:
+        """將影片資料轉換為 GIF 格式 (在轉換執行緒池中執行)"""
+        with tracing.span('convert', kind='video', quality=quality, max_frames=max_frames):
+            return await self.pool.run(convert_video_to_gif, video_data, quality, max_frames, encoder, **options)
+
+
+def convert_image_to_gif(image_data: bytes, quality: int = 80, max_frames: int = 30, encoder: str = None,
+                         max_size: int = 1024, fps: float = 0, output_format: str = None) -> bytes:
+    """將圖片資料轉換為 GIF 格式 (同步版本，記錄解碼、縮放與編碼耗時)
+
+    靜態圖片縮放到最長邊 max_size，動態圖片為一半；fps 大於 0 時依動畫總長限制幀數。
+    """
+    Image, ImageSequence = _import_pillow()
+    try:
+        decode = resize = 0.0
+        stage_started = time.perf_counter()
+        # 只讀取標頭，確認尺寸與畫格數在解碼預算內，並規劃縮放與畫格取樣
+        with tracing.span('probe'):
+            info = probe.probe(image_data)
+            animated = (info.frame_count or 1) > 1
+            if animated and fps and info.duration:
+                max_frames = min(max_frames, max(1, int(info.duration / 1000 * fps)))
+            plan = probe.plan(info, max_frames if animated else 1, max_size // 2 if animated else max_size)
+        tracing.annotate(width=info.width, height=info.height, frames=info.frame_count)
+        # 打開圖片
+        with Image.open(io.BytesIO(image_data)) as img:
+            # 如果是靜態圖片，直接轉換
+            if not animated:
+                # JPEG 可在解碼時直接縮小 (1/2、1/4、1/8)，之後再精確縮放
+                img.draft('RGB', plan.size)
+                # 轉換為 RGB 模式 (GIF 需要)
+                with tracing.span('decode', width=img.width, height=img.height):
                     if img.mode not in ['RGB', 'P']:
                         img = img.convert('RGB')
-                    
-                    # 如果圖片太大，進行縮放
-                    if img.width > 1024 or img.height > 1024:
-                        img.thumbnail((1024, 1024), Image.Resampling.LANCZOS)
-                    
-                    # 轉換為 GIF
-                    output = io.BytesIO()
-                    img.save(output, format='GIF', optimize=True, quality=quality)
-                    return output.getvalue()
+                    else:
+                        img.load()
+                now = time.perf_counter()
+                decode += now - stage_started
+                stage_started = now
                 
-                # 如果是動態圖片 (如 GIF 或 WebP)
-                else:
-                    frames = []
-                    durations = []
+                # 如果圖片太大，進行縮放
+                if img.width > max_size or img.height > max_size:
+                    with tracing.span('resize'):
+                        img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+                now = time.perf_counter()
+                resize += now - stage_started
+                stage_started = now
+                
+                # 轉換為 GIF
+                gif_data = encode_frames([img], None, quality, encoder, output_format)
+            
+            # 如果是動態圖片 (如 GIF 或 WebP)
+            else:
+                frames = []
+                durations = []
+                selected = set(plan.indices)
+                
+                for frame_count, frame in enumerate(ImageSequence.Iterator(img)):
+                    if frame_count >= plan.decode_count:
+                        break
                     
-                    frame_count = 0
-                    for frame in ImageSequence.Iterator(img):
-                        if frame_count >= max_frames:
-                            break
-                        
-                        # 轉換每一幀
+                    # 獲取幀間隔
+                    duration = frame.info.get('duration', 100)
+                    if frame_count not in selected:
+                        # 未取樣的幀只累加到前一個保留的幀 (動畫需要依序解碼，保持原本的播放速度)
+                        durations[-1] += duration
+                        continue
+                    
+                    # 轉換每一幀
+                    with tracing.span('decode', frame=frame_count):
                         frame = frame.convert('RGB')
-                        
-                        # 縮放幀
-                        if frame.width > 512 or frame.height > 512:
-                            frame.thumbnail((512, 512), Image.Resampling.LANCZOS)
-                        
-                        frames.append(frame)
-                        
-                        # 獲取幀間隔
-                        duration = frame.info.get('duration', 100)
-                        durations.append(duration)
-                        
-                        frame_count += 1
+                    now = time.perf_counter()
+                    decode += now - stage_started
+                    stage_started = now
                     
-                    if not frames:
-                        return None
+                    # 縮放幀
+                    if frame.width > max_size // 2 or frame.height > max_size // 2:
+                        with tracing.span('resize', frame=frame_count):
+                            frame.thumbnail((max_size // 2, max_size // 2), Image.Resampling.LANCZOS)
+                    now = time.perf_counter()
+                    resize += now - stage_started
+                    stage_started = now
                     
-                    # 保存為 GIF
-                    output = io.BytesIO()
-                    frames[0].save(
-                        output,
-                        format='GIF',
-                        save_all=True,
-                        append_images=frames[1:],
-                        duration=durations,
-                        loop=0,
-                        optimize=True,
-                        quality=quality
-                    )
-                    return output.getvalue()
-                    
-        except Exception as e:
-            logging.error(f"圖片轉換錯誤: {e}")
+                    frames.append(frame)
+                    durations.append(duration)
+                
+                if not frames:
+                    return None
+                
+                # 保存為 GIF
+                gif_data = encode_frames(frames, durations, quality, encoder, output_format)
+        STAGE['decode'].observe(decode)
+        STAGE['resize'].observe(resize)
+        STAGE['encode'].observe(time.perf_counter() - stage_started)
+        return gif_data
+                
+    except probe.BudgetExceeded:
+        raise
+    except Image.DecompressionBombError as e:
+        # Pillow 自身的解壓縮炸彈檢查，與解碼預算一樣拒絕轉換
+        raise probe.BudgetExceeded(str(e))
+    except Exception as e:
+        logging.error(f"圖片轉換錯誤: {e}")
+        return None
+
+
+def encode_frames(frames: list, durations: list, quality: int = 80, name: str = None,
+                  output_format: str = None) -> bytes:
+    """以指定的編碼器，或依輸出格式與輸入類別 (靜態/短動畫/長動畫) 選出的編碼器編碼畫格"""
+    encoder = encoders.resolve(output_format or settings.OUTPUT_FORMAT, len(frames), name)
+    with tracing.span('encode', encoder=encoder.name, frames=len(frames)):
+        return encoder.encode(frames, durations, quality)
+
+
+def convert_video_to_gif(video_data: bytes, quality: int = 80, max_frames: int = 50, encoder: str = None,
+                         max_size: int = None, fps: float = None, output_format: str = None) -> bytes:
+    """將影片資料轉換為 GIF 格式 (同步版本)
+
+    依固定取樣率跳轉到取樣時間點解碼，並在解碼時縮放，只保留縮放後的取樣畫格；
+    影片長度、畫格數與解碼時間都有上限。
+    """
+    try:
+        stage_started = time.perf_counter()
+        with tracing.span('decode', kind='video'):
+            frames, durations = video.decode_frames(
+                video_data,
+                fps=fps or settings.VIDEO_FPS,
+                max_frames=max_frames,
+                max_size=max_size or settings.VIDEO_MAX_SIZE,
+                max_duration=settings.VIDEO_MAX_DURATION,
+                time_budget=settings.VIDEO_DECODE_TIMEOUT,
+            )
+        # 縮放在解碼時完成，包含在解碼時間內
+        STAGE['decode'].observe(time.perf_counter() - stage_started)
+        if not frames:
             return None
+        stage_started = time.perf_counter()
+        gif_data = encode_frames(frames, durations, quality, encoder, output_format)
+        STAGE['encode'].observe(time.perf_counter() - stage_started)
+        return gif_data
+    except Exception as e:
+        logging.error(f"影片轉換錯誤: {e}")
+        return None
 
 async def setup(bot: commands.Bot):
     await bot.add_cog(GifCog(bot))
-    logging.info(f'{__name__} 已載入')
-
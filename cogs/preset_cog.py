@@ -0,0 +1,126 @@
+import logging
+import discord
+from discord.ext import commands
+from discord import app_commands, Interaction
+from utils import ui
+from utils import presets
+from utils.log import log
+from utils.database import db
+
+import settings
+
+PRESET_CHOICES = [
+    app_commands.Choice(name="fast (快速)", value="fast"),
+    app_commands.Choice(name="balanced (平衡)", value="balanced"),
+    app_commands.Choice(name="quality (高品質)", value="quality"),
+]
+
+FORMAT_CHOICES = [
+    app_commands.Choice(name="GIF", value="gif"),
+    app_commands.Choice(name="WebP", value="webp"),
+    app_commands.Choice(name="APNG", value="apng"),
+]
+
+
+def preset_embed(preset: presets.Preset, title: str, color=discord.Color.blue()) -> discord.Embed:
+    """製作預設組合資訊嵌入"""
+    embed = discord.Embed(title=title, color=color)
+    embed.add_field(name="🎚️ 組合", value=f"`{preset.name}` (品質 {preset.quality})", inline=True)
+    embed.add_field(name="📐 最大尺寸", value=f"{preset.max_size}px (動畫 {preset.animated_size}px)", inline=True)
+    embed.add_field(name="🎞️ 最多幀數", value=str(preset.max_frames), inline=True)
+    embed.add_field(name="⏱️ 每秒幀數", value=f"{preset.fps:g}" if preset.fps else "原始幀率", inline=True)
+    embed.add_field(name="🖼️ 輸出格式", value=preset.format.upper(), inline=True)
+    embed.add_field(name="⚙️ 預估成本", value=f"{presets.cost(preset):.2f} / {settings.PRESET_MAX_COST:g}", inline=True)
+    embed.set_footer(text="成本以 balanced 輸出 GIF 為 1，超過上限的組合無法儲存")
+    return embed
+
+
+class PresetCog(commands.Cog):
+    """用戶轉換預設組合"""
+
+    preset = app_commands.Group(
+        name="preset",
+        description="設定右鍵轉換使用的預設組合",
+        allowed_contexts=app_commands.AppCommandContext(guild=True, dm_channel=True, private_channel=True),
+        allowed_installs=app_commands.AppInstallationType(guild=True, user=True),
+    )
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+
+    @preset.command(name="set", description="儲存轉換預設組合 (可自訂尺寸、幀數、幀率與格式)")
+    @app_commands.describe(
+        name="基礎組合",
+        max_size="靜態圖片最長邊 (像素，動態圖片為一半)",
+        max_frames="動態圖片最多幀數",
+        fps="每秒最多幀數 (0 表示原始幀率)",
+        format="輸出格式",
+    )
+    @app_commands.choices(name=PRESET_CHOICES, format=FORMAT_CHOICES)
+    async def preset_set(
+        self,
+        interaction: Interaction,
+        name: app_commands.Choice[str],
+        max_size: app_commands.Range[int, presets.MAX_SIZE_RANGE[0], presets.MAX_SIZE_RANGE[1]] = None,
+        max_frames: app_commands.Range[int, presets.MAX_FRAMES_RANGE[0], presets.MAX_FRAMES_RANGE[1]] = None,
+        fps: app_commands.Range[float, presets.FPS_RANGE[0], presets.FPS_RANGE[1]] = None,
+        format: app_commands.Choice[str] = None,
+    ):
+        """儲存用戶的預設組合 (超過 CPU 成本上限時拒絕)"""
+        output_format = format.value if format else None
+        try:
+            preset = presets.build(name.value, max_size, max_frames, fps, output_format)
+        except ValueError as e:
+            await interaction.response.send_message(embed=ui.error_embed(f"❌ {e}"), ephemeral=True)
+            return
+
+        cost = presets.cost(preset)
+        if not presets.within_budget(preset):
+            await interaction.response.send_message(
+                embed=ui.error_embed(
+                    f"❌ 此組合的預估成本 {cost:.2f} 超過上限 {settings.PRESET_MAX_COST:g}！\n"
+                    "請降低最大尺寸、幀數或改用 GIF 格式。",
+                    footer_text="成本上限",
+                ),
+                ephemeral=True
+            )
+            return
+
+        saved = await db.set_user_preset(
+            interaction.user.id, preset.name, max_size, max_frames, fps, output_format
+        )
+        if not saved:
+            await interaction.response.send_message(embed=ui.error_embed("❌ 無法儲存預設組合！"), ephemeral=True)
+            return
+        log(f"用戶 {interaction.user} 設定預設組合 {preset.name} (成本 {cost:.2f})")
+        await interaction.response.send_message(
+            embed=preset_embed(preset, "✅ 已儲存預設組合", discord.Color.green()), ephemeral=True
+        )
+
+    @preset.command(name="show", description="查看目前的轉換預設組合")
+    async def preset_show(self, interaction: Interaction):
+        """顯示用戶目前的預設組合"""
+        row = await db.get_user_preset(interaction.user.id)
+        preset = presets.from_row(row)
+        title = "🎚️ 目前的預設組合" if row else "🎚️ 目前的預設組合 (預設值)"
+        await interaction.response.send_message(embed=preset_embed(preset, title), ephemeral=True)
+
+    @preset.command(name="reset", description="恢復預設的轉換組合")
+    async def preset_reset(self, interaction: Interaction):
+        """刪除用戶儲存的預設組合"""
+        if not await db.delete_user_preset(interaction.user.id):
+            await interaction.response.send_message(embed=ui.error_embed("❌ 無法重設預設組合！"), ephemeral=True)
+            return
+        log(f"用戶 {interaction.user} 重設預設組合")
+        await interaction.response.send_message(
+            embed=preset_embed(presets.fallback(), "♻️ 已恢復預設組合"), ephemeral=True
+        )
+
+    async def cog_app_command_error(self, interaction: Interaction, error: app_commands.AppCommandError):
+        logging.error(f"預設組合指令發生錯誤: {error}")
+        if not interaction.response.is_done():
+            await interaction.response.send_message(embed=ui.error_embed("❌ 處理預設組合時發生錯誤！"), ephemeral=True)
+
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(PresetCog(bot))
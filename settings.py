@@ -15,6 +15,121 @@ AUTO_RELOAD = True # 是否自動重新載入 Cogs
 # 開發者指令的開發者ID
 DEV_ID = list(map(int, os.getenv("DEV_ID").split(","))) if os.getenv("DEV_ID") else []
 
+# 未捕捉例外時是否顯示區域變數 (可能包含 Token 等敏感資料，且格式化較慢)
+RICH_TRACEBACK_SHOW_LOCALS = os.getenv("RICH_TRACEBACK_SHOW_LOCALS", "false").lower() == "true"
+
+# 精簡快取模式：只請求必要的 intents，不快取成員與訊息
+LEAN_CACHE = os.getenv("LEAN_CACHE", "false").lower() == "true"
+# 遇到速率限制時最多等待的秒數 (discord.py 規定至少 30)，超過時拋出 RateLimited 由呼叫端稍後重試；0 表示一律等待
+MAX_RATELIMIT_TIMEOUT = float(os.getenv("MAX_RATELIMIT_TIMEOUT", "30"))
+
+# 上次同步的指令樹指紋，指令未變更時略過啟動時的同步
+COMMAND_TREE_HASH_PATH = os.getenv("COMMAND_TREE_HASH_PATH", "data/command_tree.json")
+
+# 統計查詢快取的存活時間 (秒)，資料寫入時會提早失效
+STATS_CACHE_TTL = float(os.getenv("STATS_CACHE_TTL", "30"))
+
+# 記憶體內排行榜保留的名次數量，以及與資料庫對帳的間隔 (秒)
+LEADERBOARD_SIZE = int(os.getenv("LEADERBOARD_SIZE", "100"))
+LEADERBOARD_RECONCILE_INTERVAL = float(os.getenv("LEADERBOARD_RECONCILE_INTERVAL", "600"))
+
+# 用戶/伺服器資料沒有變更時，last_seen 最多每隔多少秒寫入一次
+LAST_SEEN_GRANULARITY = float(os.getenv("LAST_SEEN_GRANULARITY", "300"))
+
+# 統計查詢使用的唯讀連線池大小，以及 SQLite 等待鎖的逾時 (毫秒)
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "4"))
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+
+# 轉換事件日誌：record_conversion 先附加到日誌，再由背景任務批次寫入資料庫
+USE_EVENT_JOURNAL = os.getenv("USE_EVENT_JOURNAL", "true").lower() == "true"
+JOURNAL_DIR = os.getenv("JOURNAL_DIR", "data/journal")
+JOURNAL_MAX_FILE_SIZE = int(os.getenv("JOURNAL_MAX_FILE_SIZE", str(4 * 1024 * 1024)))
+JOURNAL_BATCH_SIZE = int(os.getenv("JOURNAL_BATCH_SIZE", "5000"))
+JOURNAL_FLUSH_INTERVAL = float(os.getenv("JOURNAL_FLUSH_INTERVAL", "2"))
+# 是否由本程序匯入事件日誌 (叢集模式下只有啟動器負責寫入)
+JOURNAL_INGEST = os.getenv("JOURNAL_INGEST", "true").lower() == "true"
+
+# 叢集模式下的叢集編號 (由 cluster.py 設定，單一程序執行時為 None)
+CLUSTER_ID = int(os.getenv("CLUSTER_ID")) if os.getenv("CLUSTER_ID") else None
+CLUSTER_STATUS_DIR = os.getenv("CLUSTER_STATUS_DIR", "data/cluster")
+
+# 統計發佈的頻道與訊息 ID (設為 0 表示停用)
+STATS_USER_COUNT_CHANNEL_ID = int(os.getenv("STATS_USER_COUNT_CHANNEL_ID", "1387694673052827719"))
+STATS_USAGE_COUNT_CHANNEL_ID = int(os.getenv("STATS_USAGE_COUNT_CHANNEL_ID", "1387696476712337449"))
+STATS_DATA_CHANNEL_ID = int(os.getenv("STATS_DATA_CHANNEL_ID", "1387699070373724242"))
+STATS_MESSAGE_ID = int(os.getenv("STATS_MESSAGE_ID", "1387699322337886218"))
+# 合併更新的等待秒數，以及同一頻道改名的最短間隔 (Discord 限制每 10 分鐘 2 次)
+STATS_PUBLISH_COALESCE_DELAY = float(os.getenv("STATS_PUBLISH_COALESCE_DELAY", "5"))
+STATS_CHANNEL_RENAME_INTERVAL = float(os.getenv("STATS_CHANNEL_RENAME_INTERVAL", "300"))
+
+# 同時進行的圖片轉換數 (轉換在執行緒池中執行)
+CONVERSION_WORKERS = int(os.getenv("CONVERSION_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# 本機指標端點 (Prometheus 文字格式，/metrics)，埠號設為 0 表示停用；叢集模式下依叢集編號位移
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))
+
+# 事件迴圈延遲監控：探測間隔與擷取呼叫堆疊的門檻 (秒，門檻設為 0 表示停用)
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.25"))
+LOOP_LAG_THRESHOLD = float(os.getenv("LOOP_LAG_THRESHOLD", "0.5"))
+
+# 互動追蹤：取樣率 (0~1，0 表示停用) 與 Chrome trace 檔案的輸出目錄
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))
+TRACE_DIR = os.getenv("TRACE_DIR", "logs")
+
+# 日誌檔案格式："text" 或 "json" (JSON Lines，方便正式環境收集)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+# 日誌輪替：單一檔案大小上限 (位元組，0 表示只依日期輪替)、保留的壓縮封存數量與天數 (0 表示不限；天數也套用於追蹤檔案)
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(20 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "60"))
+LOG_RETENTION_DAYS = float(os.getenv("LOG_RETENTION_DAYS", "30"))
+
+# 轉換速率限制 (令牌桶)：每秒補充的額度與最多可累積的額度，一次轉換約消耗「百萬像素」個額度
+# (只有檔案大小時每 MB 一單位，URL 使用 RATE_LIMIT_URL_COST)；補充速率設為 0 表示停用該層限制
+RATE_LIMIT_USER_RATE = float(os.getenv("RATE_LIMIT_USER_RATE", "0.5"))
+RATE_LIMIT_USER_BURST = float(os.getenv("RATE_LIMIT_USER_BURST", "20"))
+RATE_LIMIT_GUILD_RATE = float(os.getenv("RATE_LIMIT_GUILD_RATE", "2"))
+RATE_LIMIT_GUILD_BURST = float(os.getenv("RATE_LIMIT_GUILD_BURST", "80"))
+RATE_LIMIT_GLOBAL_RATE = float(os.getenv("RATE_LIMIT_GLOBAL_RATE", "10"))
+RATE_LIMIT_GLOBAL_BURST = float(os.getenv("RATE_LIMIT_GLOBAL_BURST", "200"))
+RATE_LIMIT_URL_COST = float(os.getenv("RATE_LIMIT_URL_COST", "2"))
+# 影片轉換需要解碼多個畫格，成本為像素成本乘上此倍數
+RATE_LIMIT_VIDEO_MULTIPLIER = float(os.getenv("RATE_LIMIT_VIDEO_MULTIPLIER", "5"))
+
+# 重啟或收到 SIGTERM 時等待進行中轉換完成的最長秒數
+DRAIN_TIMEOUT = float(os.getenv("DRAIN_TIMEOUT", "30"))
+
+# 影片轉 GIF (需要安裝 PyAV)：檔案大小上限、最多取用的影片秒數、取樣的每秒畫格數、
+# 最多畫格數、輸出最長邊 (像素) 與單次解碼的時間上限 (秒)；畫格數與尺寸為 balanced 預設組合的值，
+# 其他預設組合等比例換算
+VIDEO_MAX_BYTES = int(os.getenv("VIDEO_MAX_BYTES", str(25 * 1024 * 1024)))
+VIDEO_MAX_DURATION = float(os.getenv("VIDEO_MAX_DURATION", "10"))
+VIDEO_FPS = float(os.getenv("VIDEO_FPS", "10"))
+VIDEO_MAX_FRAMES = int(os.getenv("VIDEO_MAX_FRAMES", "50"))
+VIDEO_MAX_SIZE = int(os.getenv("VIDEO_MAX_SIZE", "480"))
+VIDEO_DECODE_TIMEOUT = float(os.getenv("VIDEO_DECODE_TIMEOUT", "20"))
+
+# 輸出格式 (gif / webp / apng) 與編碼器 (auto 表示依校準結果選擇，或指定 utils/encoders.py 中的名稱)
+OUTPUT_FORMAT = os.getenv("OUTPUT_FORMAT", "gif").lower()
+OUTPUT_ENCODER = os.getenv("OUTPUT_ENCODER", "auto")
+# 編碼器校準：畫質目標 (PSNR dB)、輸出大小不超過預設編碼器的倍數、結果檔案與啟動時是否自動校準
+ENCODER_MIN_PSNR = float(os.getenv("ENCODER_MIN_PSNR", "30"))
+ENCODER_MAX_SIZE_RATIO = float(os.getenv("ENCODER_MAX_SIZE_RATIO", "1.25"))
+ENCODER_CALIBRATION_PATH = os.getenv("ENCODER_CALIBRATION_PATH", "data/encoder_calibration.json")
+ENCODER_AUTO_CALIBRATE = os.getenv("ENCODER_AUTO_CALIBRATE", "true").lower() == "true"
+
+# 解碼預算：單一畫格最多像素數，以及一次轉換最多解碼的像素數 (像素 x 畫格)
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", str(50_000_000)))
+MAX_TOTAL_PIXELS = int(os.getenv("MAX_TOTAL_PIXELS", str(300_000_000)))
+# 下載 URL 圖片時，取得此位元組數後先以標頭檢查尺寸
+PROBE_HEADER_BYTES = int(os.getenv("PROBE_HEADER_BYTES", str(64 * 1024)))
+
+# 用戶預設組合的 CPU 成本上限 (balanced 輸出 GIF 為 1)，超過時無法儲存
+PRESET_MAX_COST = float(os.getenv("PRESET_MAX_COST", "6"))
+# 用戶預設組合的快取存活時間 (秒)，/preset set 與 reset 會立即更新本程序的快取；
+# 叢集模式下其他叢集要等快取到期才會讀到新組合，因此預設較短
+PRESET_CACHE_TTL = float(os.getenv("PRESET_CACHE_TTL", "300" if CLUSTER_ID is None else "15"))
+
 # 檢查 Token 是否存在
 if DISCORD_BOT_TOKEN is None:
     print("錯誤: 找不到 DISCORD_BOT_TOKEN 環境變數")
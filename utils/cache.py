@@ -0,0 +1,130 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """具有存活時間 (TTL) 的異步讀取快取
+
+    - 過期的項目會在下次讀取時重新查詢
+    - 同一個 key 的並行請求會共用同一次查詢 (避免快取擊穿)
+    - 寫入操作可透過 `invalidate` 依 key 前綴、或 `discard` 依單一 key 使快取失效，
+      或以 `set` 直接寫入新值
+    - 指定 maxsize 時最多保留 maxsize 筆，超過時淘汰最早寫入的項目
+    """
+
+    def __init__(self, ttl: float = 30.0, maxsize: Optional[int] = None):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._entries: Dict[Hashable, Tuple[float, Any]] = {}
+        self._pending: Dict[Hashable, asyncio.Future] = {}
+        # 失效世代，用來丟棄在失效前就已開始的查詢結果
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """取得快取值，若不存在或已過期則呼叫 loader 載入"""
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[1]
+
+        # 已有相同查詢正在進行時，直接等待其結果
+        pending = self._pending.get(key)
+        if pending is not None:
+            self.hits += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        # 查詢在獨立的任務中執行，所有呼叫者 (包含第一個) 都透過 shield 等待，
+        # 任一呼叫者被取消時查詢仍會完成，其他等待者不會跟著被取消
+        task = asyncio.ensure_future(self._load(key, loader, self._generation))
+        self._pending[key] = task
+        task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]], generation: int) -> Any:
+        value = await loader()
+        # 查詢期間若快取已失效，結果仍回傳給等待者但不寫入快取
+        if generation == self._generation:
+            self._store(key, value)
+        return value
+
+    def _store(self, key: Hashable, value: Any):
+        self._entries.pop(key, None)
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        if self.maxsize is not None and len(self._entries) > self.maxsize:
+            del self._entries[next(iter(self._entries))]
+
+    def _finish(self, key: Hashable, task: asyncio.Future):
+        if self._pending.get(key) is task:
+            del self._pending[key]
+        # 避免所有等待者都已取消時出現 "exception was never retrieved"
+        if not task.cancelled():
+            task.exception()
+
+    def invalidate(self, prefix: Optional[str] = None):
+        """使快取失效；prefix 為 None 時清除全部，否則只清除 key[0] 等於 prefix 的項目"""
+        self._generation += 1
+        # 進行中的查詢可能讀到舊資料，讓之後的請求重新查詢
+        for store in (self._entries, self._pending):
+            if prefix is None:
+                store.clear()
+                continue
+            for key in [k for k in store if isinstance(k, tuple) and k and k[0] == prefix]:
+                del store[key]
+
+    def set(self, key: Hashable, value: Any):
+        """直接寫入快取值 (資料尚未寫入資料庫時使用，進行中的舊查詢結果不會覆寫)"""
+        self._generation += 1
+        self._pending.pop(key, None)
+        self._store(key, value)
+
+    def discard(self, key: Hashable):
+        """使單一 key 失效 (進行中的查詢結果不會寫入快取)"""
+        self._generation += 1
+        self._entries.pop(key, None)
+        self._pending.pop(key, None)
+
+    def stats(self) -> dict:
+        """回傳快取命中統計"""
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+class WriteSnapshot:
+    """記錄最後一次寫入資料庫的欄位值，用來略過沒有變更的寫入 (dirty checking)
+
+    只有在欄位值改變、或距離上次寫入已超過 granularity 秒 (用於更新 last_seen)
+    時才需要寫入。最多保留 maxsize 筆，超過時淘汰最久未使用的項目。
+    """
+
+    def __init__(self, granularity: float = 300.0, maxsize: int = 50000):
+        self.granularity = granularity
+        self.maxsize = maxsize
+        self._rows: "OrderedDict[Hashable, Tuple[float, tuple]]" = OrderedDict()
+        self.writes_avoided = 0
+
+    def is_dirty(self, key: Hashable, fields: tuple) -> bool:
+        """檢查是否需要寫入；不需要時累計略過次數"""
+        entry = self._rows.get(key)
+        if entry is None:
+            return True
+        written_at, written_fields = entry
+        if written_fields != fields or time.monotonic() - written_at >= self.granularity:
+            return True
+        self._rows.move_to_end(key)
+        self.writes_avoided += 1
+        return False
+
+    def mark_written(self, key: Hashable, fields: tuple):
+        """記錄已成功寫入的欄位值"""
+        self._rows[key] = (time.monotonic(), fields)
+        self._rows.move_to_end(key)
+        while len(self._rows) > self.maxsize:
+            self._rows.popitem(last=False)
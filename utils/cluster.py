@@ -0,0 +1,173 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import resource
+import time
+from types import SimpleNamespace
+from typing import List, Optional
+
+import settings
+
+
+# 叢集子程序要求重新啟動 (.dev restart) 時的結束碼，啟動器收到後重新啟動該叢集
+RESTART_EXIT_CODE = 75
+
+
+def shard_ranges(shard_count: int, clusters: int) -> List[List[int]]:
+    """將分片平均分配給各叢集"""
+    clusters = max(1, min(clusters, shard_count))
+    base, extra = divmod(shard_count, clusters)
+    ranges = []
+    start = 0
+    for index in range(clusters):
+        size = base + (1 if index < extra else 0)
+        ranges.append(list(range(start, start + size)))
+        start += size
+    return ranges
+
+
+def is_primary() -> bool:
+    """是否為負責全域工作 (例如發佈統計頻道) 的程序：單一程序執行或叢集 0"""
+    return settings.CLUSTER_ID in (None, 0)
+
+
+def shard_for_guild(guild_id: int, shard_count: int) -> int:
+    """Discord 的分片路由規則"""
+    return (guild_id >> 22) % shard_count
+
+
+def _rss_bytes() -> int:
+    """目前程序的常駐記憶體 (RSS)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # 非 Linux 平台退而使用最大 RSS
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def write_status(cluster_id: int, **data):
+    """寫入本叢集的狀態檔 (以取代方式寫入，讀取端不會讀到一半的內容)"""
+    os.makedirs(settings.CLUSTER_STATUS_DIR, exist_ok=True)
+    path = os.path.join(settings.CLUSTER_STATUS_DIR, f"cluster-{cluster_id}.json")
+    status = {
+        "cluster_id": cluster_id,
+        "pid": os.getpid(),
+        "rss": _rss_bytes(),
+        "updated": time.time(),
+        **data,
+    }
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(status, f)
+    os.replace(path + ".tmp", path)
+
+
+def read_statuses(max_age: float = 120.0) -> List[dict]:
+    """讀取所有叢集最近回報的狀態"""
+    if not os.path.isdir(settings.CLUSTER_STATUS_DIR):
+        return []
+    statuses = []
+    now = time.time()
+    for filename in sorted(os.listdir(settings.CLUSTER_STATUS_DIR)):
+        if not filename.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(settings.CLUSTER_STATUS_DIR, filename), encoding="utf-8") as f:
+                status = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if now - status.get("updated", 0) <= max_age:
+            statuses.append(status)
+    return statuses
+
+
+def clear_statuses():
+    """刪除所有叢集狀態檔"""
+    if not os.path.isdir(settings.CLUSTER_STATUS_DIR):
+        return
+    for filename in os.listdir(settings.CLUSTER_STATUS_DIR):
+        if filename.endswith(".json"):
+            os.remove(os.path.join(settings.CLUSTER_STATUS_DIR, filename))
+
+
+def aggregate_statuses(statuses: List[dict]) -> dict:
+    """彙總所有叢集的狀態"""
+    latencies = [s["latency"] for s in statuses if s.get("latency") is not None]
+    return {
+        "clusters": len(statuses),
+        "shards": sum(len(s.get("shard_ids", [])) for s in statuses),
+        "guilds": sum(s.get("guilds", 0) for s in statuses),
+        "conversions": sum(s.get("conversions", 0) for s in statuses),
+        "rss": sum(s.get("rss", 0) for s in statuses),
+        "max_latency": max(latencies) if latencies else None,
+    }
+
+
+def bot_status(bot, cluster_id: int, conversions: int):
+    """回報真實機器人的叢集狀態"""
+    write_status(
+        cluster_id,
+        shard_ids=list(bot.shard_ids or []),
+        shard_count=bot.shard_count,
+        guilds=len(bot.guilds),
+        latency=bot.latency if bot.is_ready() else None,
+        conversions=conversions,
+    )
+
+
+class FakeGateway:
+    """本機測試用的假 Gateway
+
+    不連線至 Discord，而是依分片路由規則產生本叢集負責的假伺服器，
+    並以固定速率透過 record_conversion 產生轉換事件，用來驗證叢集啟動器、
+    事件日誌的單一寫入程序與跨程序統計彙總。
+    """
+
+    def __init__(self, cluster_id: int, shard_ids: List[int], shard_count: int,
+                 guilds: int = 1000, rate: float = 50.0, seed: Optional[int] = None):
+        self.cluster_id = cluster_id
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.rate = rate
+        rng = random.Random(seed)
+        # 產生隨機伺服器 ID，只保留路由到本叢集分片的伺服器
+        candidates = (rng.getrandbits(63) for _ in range(guilds))
+        self.guilds = [
+            SimpleNamespace(id=guild_id, name=f"fake-guild-{guild_id % 100000}", member_count=rng.randint(2, 5000))
+            for guild_id in candidates
+            if shard_for_guild(guild_id, shard_count) in shard_ids
+        ]
+        self.rng = rng
+        self.conversions = 0
+
+    async def run(self, duration: Optional[float] = None):
+        """產生轉換事件直到 duration 秒後 (None 表示持續執行)"""
+        from utils.database import db
+
+        deadline = None if duration is None else time.monotonic() + duration
+        last_status = 0.0
+        while deadline is None or time.monotonic() < deadline:
+            user_id = self.rng.randint(1, 50_000)
+            user = SimpleNamespace(id=user_id, name=f"fake-user-{user_id}", display_name=None, global_name=None)
+            guild = self.rng.choice(self.guilds) if self.guilds and self.rng.random() < 0.8 else None
+            await db.record_conversion(user, guild, file_size=self.rng.randint(10_000, 8_000_000))
+            self.conversions += 1
+            if time.monotonic() - last_status >= 1:
+                self.write_status()
+                last_status = time.monotonic()
+            await asyncio.sleep(1 / self.rate)
+        self.write_status()
+
+    def write_status(self):
+        write_status(
+            self.cluster_id,
+            shard_ids=self.shard_ids,
+            shard_count=self.shard_count,
+            guilds=len(self.guilds),
+            latency=0.0,
+            conversions=self.conversions,
+            fake=True,
+        )
+        logging.debug(f"叢集 {self.cluster_id} 狀態已更新")
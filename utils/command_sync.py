@@ -0,0 +1,55 @@
+import hashlib
+import json
+import logging
+import os
+from typing import Optional
+
+from discord import app_commands
+from discord.ext import commands
+
+import settings
+
+
+def tree_fingerprint(tree: app_commands.CommandTree) -> str:
+    """以全域指令的序列化內容計算指紋"""
+    payload = sorted(
+        (command.to_dict(tree) for command in tree.get_commands()),
+        key=lambda data: (data.get('type', 1), data['name'])
+    )
+    serialized = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+
+def _read_fingerprints() -> dict:
+    try:
+        with open(settings.COMMAND_TREE_HASH_PATH, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_fingerprint(application_id: int, fingerprint: str):
+    fingerprints = _read_fingerprints()
+    fingerprints[str(application_id)] = fingerprint
+    directory = os.path.dirname(settings.COMMAND_TREE_HASH_PATH)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # 以取代方式寫入，其他程序不會讀到一半的內容
+    path = f"{settings.COMMAND_TREE_HASH_PATH}.{os.getpid()}.tmp"
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(fingerprints, f, indent=2)
+    os.replace(path, settings.COMMAND_TREE_HASH_PATH)
+
+
+async def sync_if_changed(bot: commands.Bot, force: bool = False) -> Optional[list]:
+    """只有在指令樹與上次同步時不同 (或強制) 時才同步，回傳同步的指令 (略過時為 None)"""
+    fingerprint = tree_fingerprint(bot.tree)
+    application_id = bot.application_id
+    if not force and _read_fingerprints().get(str(application_id)) == fingerprint:
+        logging.info('指令樹未變更，略過同步')
+        return None
+
+    synced = await bot.tree.sync()
+    _write_fingerprint(application_id, fingerprint)
+    logging.info(f'已同步 {len(synced)} 個全域指令')
+    return synced
@@ -1,12 +1,26 @@
+import asyncio
+import datetime
 import logging
 import os
-from typing import Optional, List
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, ForeignKey, Index
+import time
+from typing import AsyncIterator, Callable, Optional, List
+from sqlalchemy import create_engine, Column, Integer, Float, String, DateTime, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.sql import func
-from sqlalchemy import select, update, delete, desc
+from sqlalchemy import select, update, delete, desc, event, insert, bindparam
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+import settings
+from utils.cache import TTLCache, WriteSnapshot
+from utils.journal import EventJournal, ProfileJournal
+from utils.leaderboard import Leaderboard
+from utils import metrics
+
+# 資料庫寫入耗時 (依操作分類)
+db_write_seconds = metrics.registry.histogram('db_write_seconds', '資料庫寫入耗時', ('op',))
+DB_WRITE = {op: db_write_seconds.labels(op) for op in ('add_guild', 'add_user', 'log_usage', 'journal_append', 'journal_batch', 'set_preset')}
 
 # SQLAlchemy 基礎類別
 Base = declarative_base()
@@ -53,6 +67,26 @@ class UsageLog(Base):
     user = relationship("User", back_populates="usage_logs")
     guild = relationship("Guild", back_populates="usage_logs")
 
+class JournalState(Base):
+    """事件日誌匯入進度資料表模型"""
+    __tablename__ = 'journal_state'
+    
+    journal = Column(String, primary_key=True)
+    generation = Column(Integer, nullable=False, default=0)
+    offset = Column(Integer, nullable=False, default=0)
+
+class UserPreset(Base):
+    """用戶轉換預設組合資料表模型 (自訂欄位為 NULL 時使用預設組合的值)"""
+    __tablename__ = 'user_presets'
+    
+    user_id = Column(Integer, primary_key=True)
+    preset = Column(String, nullable=False, default='balanced')
+    max_size = Column(Integer)
+    max_frames = Column(Integer)
+    fps = Column(Float)
+    output_format = Column(String)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
 # 創建索引
 Index('idx_usage_logs_user_id', UsageLog.user_id)
 Index('idx_usage_logs_guild_id', UsageLog.guild_id)
@@ -69,19 +103,79 @@ class Database:
         if db_dir and not os.path.exists(db_dir):
             os.makedirs(db_dir)
         
-        # 創建異步引擎
+        # 創建異步引擎 (寫入用)
         self.engine = create_async_engine(f'sqlite+aiosqlite:///{db_path}', echo=False)
+        event.listen(self.engine.sync_engine, "connect", self._on_write_connect)
         self.AsyncSessionLocal = async_sessionmaker(
             bind=self.engine, 
             class_=AsyncSession, 
             expire_on_commit=False
         )
         
+        # 唯讀引擎 (統計查詢用)，使用獨立的連線池，避免與轉換記錄的寫入互相等待
+        self.read_engine = create_async_engine(
+            f'sqlite+aiosqlite:///{db_path}',
+            echo=False,
+            pool_size=settings.DB_READ_POOL_SIZE,
+            max_overflow=0
+        )
+        event.listen(self.read_engine.sync_engine, "connect", self._on_read_connect)
+        self.ReadSessionLocal = async_sessionmaker(
+            bind=self.read_engine,
+            class_=AsyncSession,
+            expire_on_commit=False
+        )
+        
+        # 統計查詢快取 (寫入時失效)
+        self.stats_cache = TTLCache(ttl=settings.STATS_CACHE_TTL)
+        # 用戶預設組合快取 (每次右鍵轉換都需要預設組合，避免每次都查詢資料庫)
+        self.preset_cache = TTLCache(ttl=settings.PRESET_CACHE_TTL, maxsize=50000)
+        
+        # 最後寫入的用戶/伺服器資料，用來略過沒有變更的寫入
+        self.user_snapshot = WriteSnapshot(granularity=settings.LAST_SEEN_GRANULARITY)
+        self.guild_snapshot = WriteSnapshot(granularity=settings.LAST_SEEN_GRANULARITY)
+        
+        # 記憶體內排行榜 (首次使用時載入，定期與資料庫對帳)
+        self.leaderboard = Leaderboard(capacity=settings.LEADERBOARD_SIZE)
+        self._leaderboard_lock = asyncio.Lock()
+        
+        # 轉換事件日誌 (record_conversion 附加，背景批次匯入 usage_logs)
+        self.journal = EventJournal(settings.JOURNAL_DIR, settings.JOURNAL_MAX_FILE_SIZE)
+        # 用戶/伺服器資料日誌 (叢集子程序不直接寫入資料庫時使用)
+        self.profile_journal = ProfileJournal(settings.JOURNAL_DIR, settings.JOURNAL_MAX_FILE_SIZE)
+        self._journal_lock = asyncio.Lock()
+        self._ingest_task: Optional[asyncio.Task] = None
+        
+        # 連線池使用率 (讀取指標時才計算)
+        pool_checked_out = metrics.registry.gauge('db_pool_checked_out', '使用中的資料庫連線數', ('pool',))
+        pool_size = metrics.registry.gauge('db_pool_size', '資料庫連線池大小', ('pool',))
+        pool_checked_out.labels('write').set_function(lambda: self.engine.sync_engine.pool.checkedout())
+        pool_checked_out.labels('read').set_function(lambda: self.read_engine.sync_engine.pool.checkedout())
+        pool_size.labels('write').set_function(lambda: self.engine.sync_engine.pool.size())
+        pool_size.labels('read').set_function(lambda: self.read_engine.sync_engine.pool.size())
+        
         # 標記是否已初始化
         self._initialized = False
     
-    async def _init_database(self):
-        """初始化資料庫表格"""
+    @staticmethod
+    def _on_write_connect(dbapi_connection, connection_record):
+        """寫入連線：啟用 WAL，讓讀取不會阻擋寫入"""
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={settings.DB_BUSY_TIMEOUT_MS}")
+        cursor.close()
+    
+    @staticmethod
+    def _on_read_connect(dbapi_connection, connection_record):
+        """唯讀連線：以 WAL 讀者身分連線並禁止任何寫入"""
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA query_only=ON")
+        cursor.execute(f"PRAGMA busy_timeout={settings.DB_BUSY_TIMEOUT_MS}")
+        cursor.close()
+    
+    async def initialize(self):
+        """初始化資料庫表格並重播未匯入的事件 (啟動時呼叫一次)"""
         if self._initialized:
             return
             
@@ -92,15 +186,31 @@ class Database:
             self._initialized = True
         except Exception as e:
             logging.error(f"資料庫初始化錯誤: {e}")
+            return
+        
+        if not settings.JOURNAL_INGEST:
+            return
+        
+        # 重播上次執行時尚未匯入的事件
+        replayed = await self.ingest_journal()
+        if replayed:
+            logging.info(f"已從事件日誌重播 {replayed} 筆轉換記錄")
     
-    async def _ensure_initialized(self):
-        """確保資料庫已初始化"""
-        if not self._initialized:
-            await self._init_database()
+    @property
+    def journal_profiles(self) -> bool:
+        """是否將用戶/伺服器資料附加到日誌 (叢集子程序只有啟動器程序寫入資料庫)"""
+        return settings.USE_EVENT_JOURNAL and not settings.JOURNAL_INGEST
     
     async def add_guild(self, guild_id: int, guild_name: str, member_count: int = 0):
-        """添加或更新伺服器資訊"""
-        await self._ensure_initialized()
+        """添加或更新伺服器資訊 (資料未變更時略過寫入)"""
+        fields = (guild_name, member_count)
+        if not self.guild_snapshot.is_dirty(guild_id, fields):
+            return guild_id
+        if self.journal_profiles:
+            self.profile_journal.append('guild', guild_id, name=guild_name, member_count=member_count)
+            self.guild_snapshot.mark_written(guild_id, fields)
+            return guild_id
+        started = time.perf_counter()
         try:
             async with self.AsyncSessionLocal() as session:
                 # 查找現有伺服器
@@ -111,26 +221,41 @@ class Database:
                 if guild:
                     # 更新現有伺服器
                     guild.guild_name = guild_name
-                    guild.member_count = member_count
+                    # 未取得成員數 (例如精簡快取模式下的部分伺服器資料) 時保留原值
+                    if member_count is not None:
+                        guild.member_count = member_count
                     guild.last_seen = func.now()
                 else:
                     # 創建新伺服器
                     guild = Guild(
                         guild_id=guild_id,
                         guild_name=guild_name,
-                        member_count=member_count
+                        member_count=member_count or 0
                     )
                     session.add(guild)
                 
                 await session.commit()
+                self.guild_snapshot.mark_written(guild_id, fields)
+                DB_WRITE['add_guild'].observe(time.perf_counter() - started)
+                # 伺服器名稱會出現在最近使用記錄中
+                self.stats_cache.invalidate('recent_usage')
+                self.stats_cache.invalidate('database_stats')
                 return guild.guild_id
         except Exception as e:
             logging.error(f"添加伺服器失敗: {e}")
             return None
     
     async def add_user(self, user_id: int, username: str, display_name: str = None):
-        """添加或更新用戶資訊"""
-        await self._ensure_initialized()
+        """添加或更新用戶資訊 (資料未變更時略過寫入)"""
+        fields = (username, display_name)
+        self.leaderboard.update_user(user_id, username, display_name)
+        if not self.user_snapshot.is_dirty(user_id, fields):
+            return user_id
+        if self.journal_profiles:
+            self.profile_journal.append('user', user_id, username=username, display_name=display_name)
+            self.user_snapshot.mark_written(user_id, fields)
+            return user_id
+        started = time.perf_counter()
         try:
             async with self.AsyncSessionLocal() as session:
                 # 查找現有用戶
@@ -153,6 +278,11 @@ class Database:
                     session.add(user)
                 
                 await session.commit()
+                self.user_snapshot.mark_written(user_id, fields)
+                DB_WRITE['add_user'].observe(time.perf_counter() - started)
+                self.stats_cache.invalidate('top_users')
+                self.stats_cache.invalidate('recent_usage')
+                self.stats_cache.invalidate('database_stats')
                 return user.user_id
         except Exception as e:
             logging.error(f"添加用戶失敗: {e}")
@@ -161,7 +291,7 @@ class Database:
     async def log_usage(self, user_id: int, guild_id: int = None, 
                        file_size: int = None, conversion_type: str = "image_to_gif"):
         """記錄使用記錄"""
-        await self._ensure_initialized()
+        started = time.perf_counter()
         try:
             async with self.AsyncSessionLocal() as session:
                 # 創建使用記錄
@@ -181,6 +311,9 @@ class Database:
                 await session.execute(stmt)
                 
                 await session.commit()
+                DB_WRITE['log_usage'].observe(time.perf_counter() - started)
+                self.stats_cache.invalidate()
+                self.leaderboard.record(user_id)
                 return usage_log.id
         except Exception as e:
             logging.error(f"記錄使用記錄失敗: {e}")
@@ -188,9 +321,8 @@ class Database:
     
     async def get_user_stats(self, user_id: int) -> Optional[dict]:
         """獲取用戶統計資訊"""
-        await self._ensure_initialized()
         try:
-            async with self.AsyncSessionLocal() as session:
+            async with self.ReadSessionLocal() as session:
                 # 獲取用戶基本資訊
                 stmt = select(User).where(User.user_id == user_id)
                 result = await session.execute(stmt)
@@ -219,11 +351,92 @@ class Database:
             logging.error(f"獲取用戶統計失敗: {e}")
             return None
     
+    async def get_user_preset(self, user_id: int) -> Optional[dict]:
+        """獲取用戶儲存的轉換預設組合 (沒有儲存時回傳 None，結果會快取)"""
+        try:
+            return await self.preset_cache.get_or_load(
+                ('preset', user_id), lambda: self._query_user_preset(user_id)
+            )
+        except Exception as e:
+            logging.error(f"獲取用戶預設組合失敗: {e}")
+            return None
+    
+    async def _query_user_preset(self, user_id: int) -> Optional[dict]:
+        """查詢用戶的轉換預設組合 (失敗時拋出例外，快取不會儲存)"""
+        async with self.ReadSessionLocal() as session:
+            stmt = select(UserPreset).where(UserPreset.user_id == user_id)
+            result = await session.execute(stmt)
+            row = result.scalar_one_or_none()
+            if not row:
+                return None
+            return {
+                'preset': row.preset,
+                'max_size': row.max_size,
+                'max_frames': row.max_frames,
+                'fps': row.fps,
+                'output_format': row.output_format,
+            }
+    
+    async def set_user_preset(self, user_id: int, preset: str, max_size: int = None, max_frames: int = None,
+                              fps: float = None, output_format: str = None) -> bool:
+        """儲存用戶的轉換預設組合"""
+        row = {
+            'preset': preset,
+            'max_size': max_size,
+            'max_frames': max_frames,
+            'fps': fps,
+            'output_format': output_format,
+        }
+        if self.journal_profiles:
+            return self._journal_preset(user_id, row)
+        started = time.perf_counter()
+        try:
+            async with self.AsyncSessionLocal() as session:
+                await session.merge(UserPreset(
+                    user_id=user_id,
+                    preset=preset,
+                    max_size=max_size,
+                    max_frames=max_frames,
+                    fps=fps,
+                    output_format=output_format
+                ))
+                await session.commit()
+                self.preset_cache.discard(('preset', user_id))
+                DB_WRITE['set_preset'].observe(time.perf_counter() - started)
+                return True
+        except Exception as e:
+            logging.error(f"儲存用戶預設組合失敗: {e}")
+            return False
+    
+    async def delete_user_preset(self, user_id: int) -> bool:
+        """刪除用戶的轉換預設組合 (恢復預設值)"""
+        if self.journal_profiles:
+            return self._journal_preset(user_id, None)
+        try:
+            async with self.AsyncSessionLocal() as session:
+                await session.execute(delete(UserPreset).where(UserPreset.user_id == user_id))
+                await session.commit()
+                self.preset_cache.discard(('preset', user_id))
+                return True
+        except Exception as e:
+            logging.error(f"刪除用戶預設組合失敗: {e}")
+            return False
+    
+    def _journal_preset(self, user_id: int, row: Optional[dict]) -> bool:
+        """將預設組合的儲存 (row 為 None 時為重設) 附加到日誌，並直接更新本程序的快取"""
+        try:
+            self.profile_journal.append('preset', user_id, **(row or {'preset': None}))
+        except Exception as e:
+            logging.error(f"附加用戶預設組合到日誌失敗: {e}")
+            return False
+        # 資料庫要等寫入程序匯入後才會更新，在此之前本程序直接使用新值
+        self.preset_cache.set(('preset', user_id), row)
+        return True
+    
     async def get_guild_stats(self, guild_id: int) -> Optional[dict]:
         """獲取伺服器統計資訊"""
-        await self._ensure_initialized()
         try:
-            async with self.AsyncSessionLocal() as session:
+            async with self.ReadSessionLocal() as session:
                 # 獲取伺服器基本資訊
                 stmt = select(Guild).where(Guild.guild_id == guild_id)
                 result = await session.execute(stmt)
@@ -257,61 +470,126 @@ class Database:
             return None
     
     async def get_top_users(self, limit: int = 10) -> List[dict]:
-        """獲取使用次數最多的用戶"""
-        await self._ensure_initialized()
+        """獲取使用次數最多的用戶 (優先使用記憶體內排行榜)"""
+        if limit <= self.leaderboard.capacity:
+            if not self.leaderboard.loaded:
+                await self.reconcile_leaderboard(force=False)
+            if self.leaderboard.loaded:
+                return self.leaderboard.top(limit)
         try:
-            async with self.AsyncSessionLocal() as session:
-                stmt = select(User).order_by(desc(User.total_conversions)).limit(limit)
-                result = await session.execute(stmt)
-                users = result.scalars().all()
-                
-                return [
-                    {
-                        'user_id': user.user_id,
-                        'username': user.username,
-                        'display_name': user.display_name,
-                        'total_conversions': user.total_conversions,
-                        'last_seen': user.last_seen.isoformat()
-                    }
-                    for user in users
-                ]
+            return await self.stats_cache.get_or_load(
+                ('top_users', limit), lambda: self._query_top_users(limit)
+            )
         except Exception as e:
             logging.error(f"獲取排行榜失敗: {e}")
             return []
     
+    async def _query_top_users(self, limit: int) -> List[dict]:
+        """查詢使用次數最多的用戶 (失敗時拋出例外，快取不會儲存)"""
+        async with self.ReadSessionLocal() as session:
+            stmt = select(User).order_by(desc(User.total_conversions)).limit(limit)
+            result = await session.execute(stmt)
+            users = result.scalars().all()
+            
+            return [
+                {
+                    'user_id': user.user_id,
+                    'username': user.username,
+                    'display_name': user.display_name,
+                    'total_conversions': user.total_conversions,
+                    'last_seen': user.last_seen.isoformat()
+                }
+                for user in users
+            ]
+    
+    async def reconcile_leaderboard(self, force: bool = True) -> Optional[int]:
+        """從資料庫重新載入排行榜 (前 2K 名)，回傳修正的用戶數 (失敗時為 None)
+
+        快照之後記錄的轉換會在載入後重新套用；匯入與查詢期間持有事件日誌的鎖，
+        背景匯入不會在兩者之間寫入資料庫。
+        """
+        async with self._leaderboard_lock, self._journal_lock:
+            if not force and self.leaderboard.loaded:
+                return 0
+            # 先匯入事件日誌，避免把尚未寫入的轉換當成誤差
+            if settings.JOURNAL_INGEST:
+                await self._ingest_journal_locked(on_caught_up=self.leaderboard.begin_load)
+            self.leaderboard.begin_load()
+            try:
+                top_rows = await self._query_top_users(self.leaderboard.load_size)
+            except Exception as e:
+                self.leaderboard.cancel_load()
+                logging.error(f"載入排行榜失敗: {e}")
+                return None
+            drift = self.leaderboard.load(top_rows)
+            if drift:
+                logging.warning(f"排行榜對帳修正了 {drift} 位用戶的轉換次數")
+            return drift
+    
     async def get_recent_usage(self, limit: int = 50) -> List[dict]:
-        """獲取最近的使用記錄"""
-        await self._ensure_initialized()
+        """獲取最近的使用記錄 (經過快取)"""
         try:
-            async with self.AsyncSessionLocal() as session:
-                stmt = (
-                    select(UsageLog, User, Guild)
-                    .join(User, UsageLog.user_id == User.user_id)
-                    .outerjoin(Guild, UsageLog.guild_id == Guild.guild_id)
-                    .order_by(desc(UsageLog.timestamp))
-                    .limit(limit)
-                )
-                result = await session.execute(stmt)
-                records = result.all()
-                
-                return [
-                    {
-                        'conversion_type': usage_log.conversion_type,
-                        'timestamp': usage_log.timestamp.isoformat(),
-                        'file_size': usage_log.file_size,
-                        'username': user.username,
-                        'guild_name': guild.guild_name if guild else 'DM',
-                        'guild_id': guild.guild_id if guild else None
-                    }
-                    for usage_log, user, guild in records
-                ]
+            return await self.stats_cache.get_or_load(
+                ('recent_usage', limit), lambda: self._query_recent_usage(limit)
+            )
         except Exception as e:
             logging.error(f"獲取最近使用記錄失敗: {e}")
             return []
     
+    async def _query_recent_usage(self, limit: int) -> List[dict]:
+        """查詢最近的使用記錄 (失敗時拋出例外，快取不會儲存)"""
+        async with self.ReadSessionLocal() as session:
+            stmt = (
+                select(UsageLog, User, Guild)
+                .join(User, UsageLog.user_id == User.user_id)
+                .outerjoin(Guild, UsageLog.guild_id == Guild.guild_id)
+                .order_by(desc(UsageLog.timestamp))
+                .limit(limit)
+            )
+            result = await session.execute(stmt)
+            records = result.all()
+            
+            return [
+                {
+                    'conversion_type': usage_log.conversion_type,
+                    'timestamp': usage_log.timestamp.isoformat(),
+                    'file_size': usage_log.file_size,
+                    'username': user.username,
+                    'guild_name': guild.guild_name if guild else 'DM',
+                    'guild_id': guild.guild_id if guild else None
+                }
+                for usage_log, user, guild in records
+            ]
+    
+    async def stream_usage_logs(self, since: datetime.datetime = None, until: datetime.datetime = None,
+                                guild_id: int = None, user_id: int = None,
+                                chunk_size: int = 5000) -> AsyncIterator[List[dict]]:
+        """以 Core 查詢串流讀取使用記錄，每次產生最多 chunk_size 筆 (不會一次載入全部結果)"""
+        table = UsageLog.__table__
+        stmt = select(
+            table.c.id,
+            table.c.user_id,
+            table.c.guild_id,
+            table.c.file_size,
+            table.c.conversion_type,
+            table.c.timestamp
+        ).order_by(table.c.id)
+        if since is not None:
+            stmt = stmt.where(table.c.timestamp >= since)
+        if until is not None:
+            stmt = stmt.where(table.c.timestamp < until)
+        if guild_id is not None:
+            stmt = stmt.where(table.c.guild_id == guild_id)
+        if user_id is not None:
+            stmt = stmt.where(table.c.user_id == user_id)
+        
+        async with self.read_engine.connect() as conn:
+            result = await conn.stream(stmt.execution_options(yield_per=chunk_size))
+            async for partition in result.mappings().partitions(chunk_size):
+                yield [dict(row) for row in partition]
+    
     async def cleanup_old_logs(self, days: int = 90):
         """清理舊的使用記錄"""
-        await self._ensure_initialized()
         try:
             async with self.AsyncSessionLocal() as session:
                 stmt = delete(UsageLog).where(
@@ -321,6 +599,7 @@ class Database:
                 await session.commit()
                 
                 deleted_count = result.rowcount
+                self.stats_cache.invalidate()
                 logging.info(f"清理了 {deleted_count} 筆 {days} 天前的舊記錄")
                 return deleted_count
         except Exception as e:
@@ -330,44 +609,290 @@ class Database:
 
     
     async def get_database_stats(self) -> dict:
-        """獲取資料庫統計資訊"""
-        await self._ensure_initialized()
+        """獲取資料庫統計資訊 (經過快取)"""
         try:
-            async with self.AsyncSessionLocal() as session:
-                # 獲取各資料表的記錄數量
-                guilds_count_stmt = select(func.count(Guild.guild_id))
-                guilds_result = await session.execute(guilds_count_stmt)
-                guilds_count = guilds_result.scalar()
-                
-                users_count_stmt = select(func.count(User.user_id))
-                users_result = await session.execute(users_count_stmt)
-                users_count = users_result.scalar()
-                
-                logs_count_stmt = select(func.count(UsageLog.id))
-                logs_result = await session.execute(logs_count_stmt)
-                logs_count = logs_result.scalar()
-                
-                return {
-                    'total_guilds': guilds_count,
-                    'total_users': users_count,
-                    'total_usage_logs': logs_count,
-                    'database_path': self.db_path
-                }
+            stats = await self.stats_cache.get_or_load(('database_stats',), self._query_database_stats)
         except Exception as e:
             logging.error(f"獲取資料庫統計失敗: {e}")
             return {}
+        return {
+            **stats,
+            'writes_avoided': self.user_snapshot.writes_avoided + self.guild_snapshot.writes_avoided
+        }
+    
+    async def _query_database_stats(self) -> dict:
+        """查詢資料庫統計資訊 (失敗時拋出例外，快取不會儲存)"""
+        async with self.ReadSessionLocal() as session:
+            # 獲取各資料表的記錄數量
+            guilds_count_stmt = select(func.count(Guild.guild_id))
+            guilds_result = await session.execute(guilds_count_stmt)
+            guilds_count = guilds_result.scalar()
+            
+            users_count_stmt = select(func.count(User.user_id))
+            users_result = await session.execute(users_count_stmt)
+            users_count = users_result.scalar()
+            
+            logs_count_stmt = select(func.count(UsageLog.id))
+            logs_result = await session.execute(logs_count_stmt)
+            logs_count = logs_result.scalar()
+            
+            return {
+                'total_guilds': guilds_count,
+                'total_users': users_count,
+                'total_usage_logs': logs_count,
+                'database_path': self.db_path
+            }
+    
+    async def ingest_journal(self, journal: EventJournal = None, batch_size: int = None) -> int:
+        """將事件日誌中尚未匯入的紀錄批次寫入 usage_logs，回傳匯入筆數
+
+        匯入的資料與進度在同一個交易中提交，因此當機後重播不會重複匯入。
+        """
+        async with self._journal_lock:
+            return await self._ingest_journal_locked(journal, batch_size)
+    
+    async def _ingest_journal_locked(self, journal: EventJournal = None, batch_size: int = None,
+                                     on_caught_up: Callable[[], None] = None) -> int:
+        """ingest_journal 的本體 (呼叫前需取得 _journal_lock)
+
+        先匯入同一目錄的用戶/伺服器資料日誌，轉換次數更新時用戶已存在。
+        on_caught_up 會在確認最新世代已讀到尾端的同一個事件迴圈步驟中呼叫：
+        紀錄也是在事件迴圈上附加，因此之後附加的紀錄都不在這次匯入中。
+        """
+        journal = journal or self.journal
+        batch_size = batch_size or settings.JOURNAL_BATCH_SIZE
+        if journal is self.journal:
+            profiles = self.profile_journal
+        else:
+            profiles = ProfileJournal(journal.directory, journal.max_file_size)
+        profiled = await self._ingest(profiles, batch_size, self._write_profile_batch)
+        ingested = await self._ingest(journal, batch_size, self._write_journal_batch, on_caught_up)
+        if ingested or profiled:
+            self.stats_cache.invalidate()
+        return ingested
+    
+    async def _ingest(self, journal: EventJournal, batch_size: int,
+                      write_batch: Callable, on_caught_up: Callable[[], None] = None) -> int:
+        """依匯入進度讀取日誌並以 write_batch 分批寫入，回傳匯入筆數"""
+        ingested = 0
+        try:
+            async with self.AsyncSessionLocal() as session:
+                state = await session.get(JournalState, journal.name)
+                if state is None:
+                    state = JournalState(journal=journal.name, generation=0, offset=0)
+                    session.add(state)
+                    await session.commit()
+            generation, offset = state.generation, state.offset
+            
+            generations = journal.generations()
+            newest = generations[-1] if generations else 0
+            for current in generations:
+                if current < generation:
+                    # 進度已超過此世代 (刪除前當機)，直接清除
+                    journal.remove(current)
+                    continue
+                if current > generation:
+                    generation, offset = current, 0
+                while True:
+                    records, new_offset = await asyncio.to_thread(journal.read, current, offset, batch_size)
+                    if not records and on_caught_up is not None and current == newest:
+                        # 讀取執行緒返回前可能又附加了紀錄，在事件迴圈上再確認一次
+                        records, new_offset = journal.read(current, offset, batch_size)
+                        if not records:
+                            on_caught_up()
+                    if not records:
+                        break
+                    await write_batch(journal.name, current, new_offset, records)
+                    offset = new_offset
+                    ingested += len(records)
+                if current < newest:
+                    # 寫入端已換到較新的世代，此世代已完整匯入，先記錄進度再刪除檔案
+                    await write_batch(journal.name, current + 1, 0, [])
+                    generation, offset = current + 1, 0
+                    journal.remove(current)
+        except Exception as e:
+            logging.error(f"匯入事件日誌失敗 ({journal.name}): {e}")
+        return ingested
+    
+    async def _write_journal_batch(self, journal_name: str, generation: int, offset: int, records: list):
+        """以 executemany 寫入一批紀錄並更新匯入進度 (同一交易)"""
+        usage_table = UsageLog.__table__
+        user_table = User.__table__
+        started = time.perf_counter()
+        async with self.engine.begin() as conn:
+            if records:
+                await conn.execute(insert(usage_table), [
+                    {
+                        'user_id': record.user_id,
+                        'guild_id': record.guild_id,
+                        'file_size': record.file_size,
+                        'conversion_type': record.conversion_type,
+                        'timestamp': datetime.datetime.fromtimestamp(
+                            record.timestamp, datetime.timezone.utc
+                        ).replace(tzinfo=None)
+                    }
+                    for record in records
+                ])
+                
+                # 合併同一用戶的次數後更新總轉換次數
+                totals = {}
+                for record in records:
+                    count, last_seen = totals.get(record.user_id, (0, 0))
+                    totals[record.user_id] = (count + 1, max(last_seen, record.timestamp))
+                # 用戶資料日誌可能稍晚才匯入，先建立佔位用戶，避免次數更新不到任何資料列
+                await conn.execute(
+                    sqlite_insert(user_table).on_conflict_do_nothing(index_elements=['user_id']),
+                    [{'user_id': user_id, 'username': str(user_id)} for user_id in totals]
+                )
+                await conn.execute(
+                    update(user_table)
+                    .where(user_table.c.user_id == bindparam('b_user_id'))
+                    .values(
+                        total_conversions=user_table.c.total_conversions + bindparam('b_count'),
+                        last_seen=bindparam('b_last_seen')
+                    ),
+                    [
+                        {
+                            'b_user_id': user_id,
+                            'b_count': count,
+                            'b_last_seen': datetime.datetime.fromtimestamp(
+                                last_seen, datetime.timezone.utc
+                            ).replace(tzinfo=None)
+                        }
+                        for user_id, (count, last_seen) in totals.items()
+                    ]
+                )
+            
+            await self._save_journal_progress(conn, journal_name, generation, offset)
+        DB_WRITE['journal_batch'].observe(time.perf_counter() - started)
+    
+    async def _write_profile_batch(self, journal_name: str, generation: int, offset: int, records: list):
+        """以 upsert 寫入一批用戶/伺服器/預設組合資料並更新匯入進度 (同一交易，同一 ID 只保留最新一筆)"""
+        def to_datetime(timestamp):
+            return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).replace(tzinfo=None)
+        
+        users, guilds, presets = {}, {}, {}
+        kinds = {'user': users, 'guild': guilds, 'preset': presets}
+        for record in records:
+            if record['kind'] in kinds:
+                kinds[record['kind']][record['id']] = record
+        started = time.perf_counter()
+        async with self.engine.begin() as conn:
+            if users:
+                stmt = sqlite_insert(User.__table__)
+                await conn.execute(
+                    stmt.on_conflict_do_update(
+                        index_elements=['user_id'],
+                        set_={
+                            'username': stmt.excluded.username,
+                            'display_name': stmt.excluded.display_name,
+                            'last_seen': stmt.excluded.last_seen
+                        }
+                    ),
+                    [
+                        {
+                            'user_id': user_id,
+                            'username': record['username'],
+                            'display_name': record.get('display_name'),
+                            'last_seen': to_datetime(record['ts'])
+                        }
+                        for user_id, record in users.items()
+                    ]
+                )
+            # 未取得成員數的伺服器資料不覆寫原值
+            for with_members in (True, False):
+                rows = [
+                    {
+                        'guild_id': guild_id,
+                        'guild_name': record['name'],
+                        'member_count': record.get('member_count') or 0,
+                        'last_seen': to_datetime(record['ts'])
+                    }
+                    for guild_id, record in guilds.items()
+                    if (record.get('member_count') is not None) == with_members
+                ]
+                if not rows:
+                    continue
+                stmt = sqlite_insert(Guild.__table__)
+                updates = {'guild_name': stmt.excluded.guild_name, 'last_seen': stmt.excluded.last_seen}
+                if with_members:
+                    updates['member_count'] = stmt.excluded.member_count
+                await conn.execute(stmt.on_conflict_do_update(index_elements=['guild_id'], set_=updates), rows)
+            saved = [
+                {
+                    'user_id': user_id,
+                    'preset': record['preset'],
+                    'max_size': record.get('max_size'),
+                    'max_frames': record.get('max_frames'),
+                    'fps': record.get('fps'),
+                    'output_format': record.get('output_format'),
+                    'updated_at': to_datetime(record['ts'])
+                }
+                for user_id, record in presets.items() if record['preset'] is not None
+            ]
+            if saved:
+                stmt = sqlite_insert(UserPreset.__table__)
+                await conn.execute(
+                    stmt.on_conflict_do_update(
+                        index_elements=['user_id'],
+                        set_={column: stmt.excluded[column] for column in saved[0] if column != 'user_id'}
+                    ),
+                    saved
+                )
+            reset = [user_id for user_id, record in presets.items() if record['preset'] is None]
+            if reset:
+                await conn.execute(delete(UserPreset.__table__).where(UserPreset.user_id.in_(reset)))
+            await self._save_journal_progress(conn, journal_name, generation, offset)
+        DB_WRITE['journal_batch'].observe(time.perf_counter() - started)
+    
+    @staticmethod
+    async def _save_journal_progress(conn, journal_name: str, generation: int, offset: int):
+        await conn.execute(
+            update(JournalState.__table__)
+            .where(JournalState.__table__.c.journal == journal_name)
+            .values(generation=generation, offset=offset)
+        )
+    
+    async def _run_ingester(self):
+        """背景定期匯入事件日誌"""
+        while True:
+            await asyncio.sleep(settings.JOURNAL_FLUSH_INTERVAL)
+            await self.ingest_journal()
+    
+    def _ensure_ingester(self):
+        """確保背景匯入任務正在執行"""
+        if not settings.JOURNAL_INGEST:
+            # 由其他程序 (叢集模式的寫入程序) 負責匯入
+            return
+        if self._ingest_task is None or self._ingest_task.done():
+            self._ingest_task = asyncio.get_running_loop().create_task(self._run_ingester())
+    
+    async def flush(self):
+        """立即匯入所有待寫入的事件"""
+        return await self.ingest_journal()
     
     async def close(self):
         """關閉資料庫連線"""
+        if self._ingest_task is not None:
+            self._ingest_task.cancel()
+            try:
+                await self._ingest_task
+            except asyncio.CancelledError:
+                pass
+            self._ingest_task = None
+        if self._initialized and settings.JOURNAL_INGEST:
+            await self.flush()
+        self.journal.close()
+        self.profile_journal.close()
         try:
             await self.engine.dispose()
+            await self.read_engine.dispose()
             logging.info("資料庫連線已關閉")
         except Exception as e:
             logging.error(f"關閉資料庫連線失敗: {e}")
     
     async def record_conversion(self, user, guild, file_size: int = None, conversion_type: str = "image_to_gif"):
         """記錄轉換使用（自動記錄用戶和伺服器資訊）"""
-        await self._ensure_initialized()
         try:
             # 記錄用戶資訊
             await self.add_user(
@@ -379,16 +904,24 @@ class Database:
             # 記錄伺服器資訊（如果在伺服器中使用）
             guild_id = None
             if guild:
-                await self.add_guild(guild.id, guild.name, guild.member_count)
+                await self.add_guild(guild.id, guild.name, getattr(guild, 'member_count', None))
                 guild_id = guild.id
             
             # 記錄使用記錄
-            log_id = await self.log_usage(
-                user_id=user.id,
-                guild_id=guild_id,
-                file_size=file_size,
-                conversion_type=conversion_type
-            )
+            if settings.USE_EVENT_JOURNAL:
+                # 附加到事件日誌，由背景任務批次寫入資料庫
+                started = time.perf_counter()
+                log_id = self.journal.append(user.id, guild_id, file_size, conversion_type)
+                DB_WRITE['journal_append'].observe(time.perf_counter() - started)
+                self.leaderboard.record(user.id)
+                self._ensure_ingester()
+            else:
+                log_id = await self.log_usage(
+                    user_id=user.id,
+                    guild_id=guild_id,
+                    file_size=file_size,
+                    conversion_type=conversion_type
+                )
             
             logging.info(f"記錄轉換使用: 用戶 {user.name} 在 {'伺服器 ' + guild.name if guild else 'DM'} 進行了 {conversion_type} 轉換")
             return log_id
@@ -0,0 +1,83 @@
+from typing import Optional
+
+# numpy 為選用套件，沒有安裝時不提供快速量化模式
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# 查找表每個色版使用的位元數 (5 位元 = 32x32x32 個格子)
+LUT_BITS = 5
+
+# 8x8 Bayer 矩陣，正規化到 -0.5 ~ 0.5
+_BAYER_8 = (
+    (0, 32, 8, 40, 2, 34, 10, 42),
+    (48, 16, 56, 24, 50, 18, 58, 26),
+    (12, 44, 4, 36, 14, 46, 6, 38),
+    (60, 28, 52, 20, 62, 30, 54, 22),
+    (3, 35, 11, 43, 1, 33, 9, 41),
+    (51, 19, 59, 27, 49, 17, 57, 25),
+    (15, 47, 7, 39, 13, 45, 5, 37),
+    (63, 31, 55, 23, 61, 29, 53, 21),
+)
+
+
+def available() -> bool:
+    return np is not None
+
+
+def bayer_matrix():
+    return (np.array(_BAYER_8, dtype=np.float32) + 0.5) / 64 - 0.5
+
+
+def palette_lut(palette) -> "np.ndarray":
+    """預先計算每個 5 位元 RGB 格子最接近的調色盤索引
+
+    palette 為 (N, 3) 的 uint8 陣列；以 |c|² - 2c·p + |p|² 的矩陣乘法分批計算距離，
+    之後每個像素只需查表一次。
+    """
+    size = 1 << LUT_BITS
+    step = 256 // size
+    centers = np.arange(size, dtype=np.float32) * step + step / 2
+    grid = np.stack(np.meshgrid(centers, centers, centers, indexing='ij'), axis=-1).reshape(-1, 3)
+    colors = palette.astype(np.float32)
+    colors_sq = (colors ** 2).sum(axis=1)
+    lut = np.empty(len(grid), dtype=np.uint8)
+    for start in range(0, len(grid), 4096):
+        chunk = grid[start:start + 4096]
+        distance = colors_sq[None, :] - 2 * chunk @ colors.T
+        lut[start:start + 4096] = distance.argmin(axis=1)
+    return lut
+
+
+def quantize(frame, palette, lut, strength: float, threshold: Optional["np.ndarray"] = None):
+    """以查找表將 RGB 畫格對應到調色盤 (strength > 0 時先加上 Bayer 有序抖色)"""
+    from PIL import Image
+
+    pixels = np.asarray(frame.convert('RGB'), dtype=np.int16)
+    if strength > 0:
+        if threshold is None:
+            threshold = bayer_matrix()
+        height, width = pixels.shape[:2]
+        reps = (height + 7) // 8, (width + 7) // 8
+        noise = (np.tile(threshold, reps)[:height, :width] * strength).astype(np.int16)
+        pixels = pixels + noise[:, :, None]
+        np.clip(pixels, 0, 255, out=pixels)
+    shift = 8 - LUT_BITS
+    index = ((pixels[:, :, 0] >> shift) << (2 * LUT_BITS)) | ((pixels[:, :, 1] >> shift) << LUT_BITS) | (pixels[:, :, 2] >> shift)
+    image = Image.fromarray(lut[index], mode='P')
+    image.putpalette(palette.reshape(-1).tolist())
+    return image
+
+
+def quantize_frames(frames: list, palette, strength: Optional[float] = None) -> list:
+    """以同一個調色盤 ((N, 3) uint8 陣列) 與查找表量化所有畫格
+
+    strength 為抖色幅度，預設為調色盤每個色版平均間距的四分之一 (較強的抖色會讓
+    LZW 較難壓縮)；0 表示不抖色。
+    """
+    lut = palette_lut(palette)
+    if strength is None:
+        strength = 64 / max(1, round(len(palette) ** (1 / 3)))
+    threshold = bayer_matrix()
+    return [quantize(frame, palette, lut, strength, threshold) for frame in frames]
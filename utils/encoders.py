@@ -0,0 +1,404 @@
+import io
+import json
+import logging
+import math
+import os
+import platform
+import statistics
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import settings
+from utils import dither
+
+# 輸出格式: (副檔名, MIME)
+FORMATS = {
+    'gif': ('gif', 'image/gif'),
+    'webp': ('webp', 'image/webp'),
+    'apng': ('png', 'image/apng'),
+}
+
+# 輸入類別 (依畫格數)：靜態圖片、短動畫與長動畫分別校準
+INPUT_CLASSES = ('static', 'short', 'long')
+SHORT_ANIMATION_FRAMES = 10
+
+# 校準檔案格式版本 (格式改變時舊檔案會被忽略並重新校準)
+CALIBRATION_VERSION = 1
+# 無損輸出的 PSNR (避免無限大無法寫入 JSON)
+MAX_PSNR = 100.0
+
+
+def classify(frame_count: int) -> str:
+    """依畫格數判斷輸入類別"""
+    if frame_count <= 1:
+        return 'static'
+    if frame_count <= SHORT_ANIMATION_FRAMES:
+        return 'short'
+    return 'long'
+
+
+class Encoder:
+    """輸出編碼器：把 PIL 畫格 (與每格毫秒數) 編碼為指定格式"""
+
+    def __init__(self, name: str, format: str, encode: Callable[[list, Optional[list], int], bytes],
+                 description: str, available: Callable[[], bool] = lambda: True):
+        self.name = name
+        self.format = format
+        self.description = description
+        self._encode = encode
+        self._available = available
+
+    @property
+    def extension(self) -> str:
+        return FORMATS[self.format][0]
+
+    def available(self) -> bool:
+        try:
+            return self._available()
+        except Exception:
+            return False
+
+    def encode(self, frames: list, durations: Optional[list] = None, quality: int = 80) -> bytes:
+        return self._encode(frames, durations, quality)
+
+    def __repr__(self):
+        return f"<Encoder {self.name} ({self.format})>"
+
+
+# 已註冊的編碼器 (同一格式中先註冊的為預設/參考編碼器)
+ENCODERS: Dict[str, Encoder] = {}
+
+
+def register(encoder: Encoder) -> Encoder:
+    ENCODERS[encoder.name] = encoder
+    return encoder
+
+
+def get(name: str) -> Optional[Encoder]:
+    encoder = ENCODERS.get(name)
+    if encoder is None or not encoder.available():
+        return None
+    return encoder
+
+
+def for_format(output_format: str) -> List[Encoder]:
+    """指定格式中可用的編碼器 (依註冊順序)"""
+    return [e for e in ENCODERS.values() if e.format == output_format and e.available()]
+
+
+def _save_animation(frames: list, durations: Optional[list], format: str, **options) -> bytes:
+    """以 Pillow 儲存單張或多張畫格"""
+    output = io.BytesIO()
+    if len(frames) == 1:
+        frames[0].save(output, format=format, **options)
+    else:
+        frames[0].save(
+            output,
+            format=format,
+            save_all=True,
+            append_images=frames[1:],
+            duration=durations or 100,
+            loop=0,
+            **options
+        )
+    return output.getvalue()
+
+
+def _encode_pillow_gif(frames: list, durations: Optional[list], quality: int) -> bytes:
+    """Pillow 預設的 GIF 編碼 (每格各自量化調色盤)"""
+    return _save_animation(frames, durations, 'GIF', optimize=True, quality=quality)
+
+
+def _palette_colors(quality: int) -> int:
+    """依品質決定調色盤顏色數 (品質越低顏色越少，檔案越小)"""
+    return max(32, min(256, quality * 3))
+
+
+def shared_palette(frames: list, colors: int):
+    """從最多 8 個畫格的縮圖拼接量化出所有畫格共用的調色盤圖片"""
+    from PIL import Image
+
+    step = max(1, len(frames) // 8)
+    samples = [frame.convert('RGB') for frame in frames[::step][:8]]
+    for sample in samples:
+        sample.thumbnail((128, 128), Image.Resampling.NEAREST)
+    mosaic = Image.new('RGB', (sum(s.width for s in samples), max(s.height for s in samples)))
+    x = 0
+    for sample in samples:
+        mosaic.paste(sample, (x, 0))
+        x += sample.width
+    return mosaic.quantize(colors, method=Image.Quantize.FASTOCTREE)
+
+
+def _encode_palette_gif(frames: list, durations: Optional[list], quality: int) -> bytes:
+    """共用調色盤的 GIF 編碼
+
+    每格直接對應到共用調色盤 (不抖色)，省去逐格量化，也讓各格不需要各自的區域調色盤。
+    """
+    from PIL import Image
+
+    if frames[0].mode == 'P' and len(frames) == 1:
+        # 已經是調色盤圖片 (可能包含透明)，直接儲存
+        return _save_animation(frames, durations, 'GIF')
+    palette = shared_palette(frames, _palette_colors(quality))
+    quantized = [
+        frame.convert('RGB').quantize(palette=palette, dither=Image.Dither.NONE)
+        for frame in frames
+    ]
+    return _save_animation(quantized, durations, 'GIF', optimize=False)
+
+
+def _encode_bayer_gif(frames: list, durations: Optional[list], quality: int) -> bytes:
+    """NumPy 快速量化的 GIF 編碼
+
+    共用調色盤與 palette_gif 相同，但以預先計算的 5 位元 RGB 查找表向量化對應最近的顏色，
+    並加上 Bayer 有序抖色 (不像 Floyd–Steinberg 需要逐像素傳遞誤差)。
+    """
+    import numpy as np
+
+    if frames[0].mode == 'P' and len(frames) == 1:
+        return _save_animation(frames, durations, 'GIF')
+    palette_image = shared_palette(frames, _palette_colors(quality))
+    used = sorted(index for _, index in palette_image.getcolors(256))
+    palette = np.array(palette_image.getpalette(), dtype=np.uint8).reshape(-1, 3)[used]
+    return _save_animation(dither.quantize_frames(frames, palette), durations, 'GIF', optimize=False)
+
+
+def _encode_webp(frames: list, durations: Optional[list], quality: int) -> bytes:
+    return _save_animation(frames, durations, 'WEBP', quality=quality, method=4)
+
+
+def _encode_apng(frames: list, durations: Optional[list], quality: int) -> bytes:
+    # PNG 為無損格式，品質只影響壓縮等級
+    return _save_animation(frames, durations, 'PNG', compress_level=6 if quality >= 50 else 9)
+
+
+def _webp_available() -> bool:
+    from PIL import features
+    return features.check('webp')
+
+
+register(Encoder('pillow_gif', 'gif', _encode_pillow_gif, "Pillow GIF (逐格量化)"))
+register(Encoder('palette_gif', 'gif', _encode_palette_gif, "共用調色盤 GIF (有損)"))
+register(Encoder('bayer_gif', 'gif', _encode_bayer_gif, "NumPy 查找表 + Bayer 抖色 GIF (有損)", dither.available))
+register(Encoder('webp', 'webp', _encode_webp, "動態 WebP", _webp_available))
+register(Encoder('apng', 'apng', _encode_apng, "APNG (無損)"))
+
+
+# 校準結果: {格式: {輸入類別: 編碼器名稱}} 與量測數據
+_selected: Dict[str, Dict[str, str]] = {}
+_results: Dict[str, Dict[str, Dict[str, dict]]] = {}
+
+# 沒有校準結果時，各格式相對於 GIF 的編碼成本
+FORMAT_COST = {'gif': 1.0, 'webp': 4.0, 'apng': 8.0}
+
+
+def select(output_format: str = 'gif', input_class: str = 'static') -> Encoder:
+    """選擇編碼器：設定指定 > 校準結果 > 該格式的預設編碼器"""
+    if settings.OUTPUT_ENCODER != 'auto':
+        encoder = get(settings.OUTPUT_ENCODER)
+        if encoder is not None and encoder.format == output_format:
+            return encoder
+    encoder = get(_selected.get(output_format, {}).get(input_class, ''))
+    if encoder is not None and encoder.format == output_format:
+        return encoder
+    candidates = for_format(output_format)
+    if not candidates:
+        raise ValueError(f"沒有可用的 {output_format} 編碼器")
+    return candidates[0]
+
+
+def resolve(output_format: str, frame_count: int, name: Optional[str] = None) -> Encoder:
+    """取得指定名稱的編碼器 (不存在或格式不符時改依畫格數自動選擇)"""
+    if name:
+        encoder = get(name)
+        if encoder is not None and encoder.format == output_format:
+            return encoder
+        logging.warning(f"編碼器 {name} 無法用於 {output_format}，改用自動選擇")
+    return select(output_format, classify(frame_count))
+
+
+def encode(frames: list, durations: Optional[list] = None, quality: int = 80,
+           output_format: str = 'gif', name: Optional[str] = None) -> bytes:
+    """以指定的編碼器 (或依畫格數自動選擇) 編碼"""
+    return resolve(output_format, len(frames), name).encode(frames, durations, quality)
+
+
+# ---- 校準 ----
+
+def sample_frames(input_class: str) -> list:
+    """產生校準用的畫格 (漸層、色塊與雜訊，接近照片與螢幕截圖的混合)"""
+    from PIL import Image, ImageDraw
+
+    if input_class == 'static':
+        count, size = 1, (1024, 768)
+    elif input_class == 'short':
+        count, size = 8, (512, 384)
+    else:
+        count, size = 30, (480, 270)
+    width, height = size
+    gradient = Image.merge('RGB', (
+        Image.linear_gradient('L').resize(size),
+        Image.radial_gradient('L').resize(size),
+        Image.linear_gradient('L').rotate(90).resize(size),
+    ))
+    noise = Image.effect_noise(size, 24).convert('RGB')
+    base = Image.blend(gradient, noise, 0.15)
+    frames = []
+    for index in range(count):
+        frame = base.copy()
+        draw = ImageDraw.Draw(frame)
+        x = (index * width // max(count, 8)) % width
+        draw.ellipse((x, height // 4, x + width // 4, height // 4 + width // 4), fill=(240, 200, 40))
+        draw.rectangle((0, height - 40, width, height), fill=(30, 30, 30))
+        draw.text((10, height - 30), f"frame {index}", fill=(255, 255, 255))
+        frames.append(frame)
+    return frames
+
+
+def psnr(reference: list, data: bytes) -> float:
+    """輸出與原始畫格的平均 PSNR (dB，完全相同時以 MAX_PSNR 計)"""
+    from PIL import Image, ImageChops, ImageSequence, ImageStat
+
+    values = []
+    with Image.open(io.BytesIO(data)) as decoded:
+        for original, frame in zip(reference, ImageSequence.Iterator(decoded)):
+            diff = ImageChops.difference(original.convert('RGB'), frame.convert('RGB'))
+            mse = sum(ImageStat.Stat(diff).sum2) / (diff.width * diff.height * 3)
+            values.append(MAX_PSNR if mse == 0 else min(MAX_PSNR, 10 * math.log10(255 ** 2 / mse)))
+    return statistics.fmean(values) if values else 0.0
+
+
+def measure(encoder: Encoder, frames: list, durations: list, quality: int, repeats: int,
+            budget: float = 1.0) -> dict:
+    """量測編碼器的耗時 (中位數)、輸出大小與 PSNR；累計超過 budget 秒後不再重複"""
+    timings = []
+    while len(timings) < repeats and sum(timings) < budget:
+        started = time.perf_counter()
+        data = encoder.encode(frames, durations, quality)
+        timings.append(time.perf_counter() - started)
+    return {'seconds': statistics.median(timings), 'bytes': len(data), 'psnr': psnr(frames, data)}
+
+
+def _encoder_names() -> list:
+    return sorted(name for name, encoder in ENCODERS.items() if encoder.available())
+
+
+def _targets() -> dict:
+    return {'min_psnr': settings.ENCODER_MIN_PSNR, 'max_size_ratio': settings.ENCODER_MAX_SIZE_RATIO}
+
+
+def _meets_targets(result: dict, reference: dict) -> bool:
+    return (result['psnr'] >= settings.ENCODER_MIN_PSNR
+            and result['bytes'] <= reference['bytes'] * settings.ENCODER_MAX_SIZE_RATIO)
+
+
+def calibrate(quality: int = 80, repeats: int = 3) -> dict:
+    """對各格式與輸入類別量測所有編碼器，選出符合畫質與大小目標中最快的編碼器
+
+    大小目標相對於該格式的預設編碼器 (ENCODER_MAX_SIZE_RATIO 倍以內)，
+    畫質目標為 PSNR 不低於 ENCODER_MIN_PSNR；沒有編碼器符合時使用預設編碼器。
+    """
+    import PIL
+
+    results: Dict[str, Dict[str, Dict[str, dict]]] = {}
+    selected: Dict[str, Dict[str, str]] = {}
+    for input_class in INPUT_CLASSES:
+        frames = sample_frames(input_class)
+        durations = [100] * len(frames)
+        for output_format in FORMATS:
+            candidates = for_format(output_format)
+            if not candidates:
+                continue
+            measured = {e.name: measure(e, frames, durations, quality, repeats) for e in candidates}
+            reference = measured[candidates[0].name]
+            passing = [name for name, result in measured.items() if _meets_targets(result, reference)]
+            best = min(passing, key=lambda name: measured[name]['seconds']) if passing else candidates[0].name
+            results.setdefault(output_format, {})[input_class] = measured
+            selected.setdefault(output_format, {})[input_class] = best
+    return {
+        'version': CALIBRATION_VERSION,
+        'pillow': PIL.__version__,
+        'host': platform.node(),
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'targets': _targets(),
+        'encoders': _encoder_names(),
+        'results': results,
+        'selected': selected,
+    }
+
+
+def apply(calibration: dict):
+    """套用校準結果"""
+    _selected.clear()
+    _selected.update(calibration.get('selected', {}))
+    _results.clear()
+    _results.update(calibration.get('results', {}))
+
+
+def relative_cost(output_format: str) -> float:
+    """輸出格式相對於 GIF 的編碼成本，介於 1 與 FORMAT_COST 之間
+
+    以校準時長動畫選出的編碼器耗時，比較 GIF 的預設編碼器 (pillow_gif)；
+    不與最快的 GIF 編碼器比較，否則其他格式的成本會遠高於成本上限的設計基準。
+    """
+    ceiling = FORMAT_COST.get(output_format, 1.0)
+    try:
+        results = _results[output_format]['long']
+        reference = _results['gif']['long'][for_format('gif')[0].name]['seconds']
+        return min(ceiling, max(1.0, results[_selected[output_format]['long']]['seconds'] / reference))
+    except (KeyError, IndexError, ZeroDivisionError):
+        return ceiling
+
+
+def load_calibration(path: str = None) -> Optional[dict]:
+    """讀取校準檔案 (不存在、版本不符，或主機、Pillow 版本、目標、可用的編碼器改變時回傳 None)"""
+    import PIL
+
+    path = path or settings.ENCODER_CALIBRATION_PATH
+    try:
+        with open(path, encoding='utf-8') as f:
+            calibration = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # 耗時只在量測的機器上有意義，換主機後重新校準
+    if (calibration.get('version') != CALIBRATION_VERSION or calibration.get('host') != platform.node()
+            or calibration.get('pillow') != PIL.__version__
+            or calibration.get('targets') != _targets() or calibration.get('encoders') != _encoder_names()):
+        return None
+    return calibration
+
+
+def save_calibration(calibration: dict, path: str = None):
+    path = path or settings.ENCODER_CALIBRATION_PATH
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # 以取代方式寫入，叢集中的其他程序不會讀到一半的內容
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(calibration, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def ensure_calibrated(run: bool = True, force: bool = False) -> Optional[dict]:
+    """載入校準結果；沒有可用的結果且 run 為 True 時執行校準並儲存
+
+    校準需要十幾秒，應在執行緒中呼叫；失敗時保留各格式的預設編碼器。
+    """
+    calibration = None if force else load_calibration()
+    try:
+        if calibration is None:
+            if not run:
+                return None
+            started = time.perf_counter()
+            calibration = calibrate()
+            save_calibration(calibration)
+            logging.info(f"編碼器校準完成，耗時 {time.perf_counter() - started:.1f} 秒")
+    except Exception as e:
+        logging.error(f"編碼器校準失敗: {e}")
+        if calibration is None:
+            return None
+    apply(calibration)
+    logging.info(f"使用的編碼器: {calibration['selected']}")
+    return calibration
@@ -0,0 +1,66 @@
+import asyncio
+import csv
+import datetime
+import gzip
+import io
+import json
+import os
+from typing import Optional
+
+from utils.database import db
+
+EXPORT_DIR = "exports"
+EXPORT_FORMATS = ("csv", "jsonl")
+USAGE_LOG_FIELDS = ["id", "user_id", "guild_id", "file_size", "conversion_type", "timestamp"]
+
+
+def _encode_rows(rows: list, fmt: str, write_header: bool) -> bytes:
+    """將一批資料列編碼為 CSV 或 JSON Lines"""
+    if fmt == "jsonl":
+        return "".join(
+            json.dumps(row, ensure_ascii=False, default=lambda v: v.isoformat()) + "\n"
+            for row in rows
+        ).encode("utf-8")
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=USAGE_LOG_FIELDS)
+    if write_header:
+        writer.writeheader()
+    for row in rows:
+        writer.writerow({
+            **row,
+            "timestamp": row["timestamp"].isoformat() if row["timestamp"] else None
+        })
+    return buffer.getvalue().encode("utf-8")
+
+
+def _write_rows(gz, rows: list, fmt: str, write_header: bool):
+    """編碼並寫入壓縮檔案"""
+    gz.write(_encode_rows(rows, fmt, write_header))
+
+
+async def export_usage_logs(fmt: str = "csv", since: Optional[datetime.datetime] = None,
+                            until: Optional[datetime.datetime] = None, guild_id: Optional[int] = None,
+                            user_id: Optional[int] = None, chunk_size: int = 5000) -> tuple[str, int]:
+    """將使用記錄串流匯出為 gzip 壓縮檔案，回傳 (檔案路徑, 筆數)"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"不支援的匯出格式: {fmt}")
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    timestamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(EXPORT_DIR, f"usage_logs-{timestamp}.{fmt}.gz")
+
+    count = 0
+    gz = await asyncio.to_thread(gzip.open, path, "wb")
+    try:
+        write_header = True
+        async for rows in db.stream_usage_logs(since, until, guild_id, user_id, chunk_size):
+            # 編碼與壓縮在執行緒中進行，避免阻塞事件迴圈
+            await asyncio.to_thread(_write_rows, gz, rows, fmt, write_header)
+            write_header = False
+            count += len(rows)
+        if write_header and fmt == "csv":
+            # 沒有任何資料時仍輸出標題列
+            await asyncio.to_thread(_write_rows, gz, [], fmt, True)
+    finally:
+        await asyncio.to_thread(gz.close)
+    return path, count
@@ -0,0 +1,44 @@
+import logging
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+# 重新載入 Cog 時交接的資源 (本模組不會被重新載入，因此可以跨越新舊 Cog 實例)
+_states: Dict[str, Tuple[dict, Optional[Callable[[dict], Awaitable[None]]]]] = {}
+
+
+def stash(name: str, state: dict, release: Optional[Callable[[dict], Awaitable[None]]] = None):
+    """暫存舊 Cog 交出的資源；release 用於新 Cog 沒有接手時釋放資源"""
+    _states[name] = (state, release)
+
+
+def claim(name: str) -> Optional[dict]:
+    """新 Cog 接手資源 (沒有可接手的資源時回傳 None)"""
+    entry = _states.pop(name, None)
+    return entry[0] if entry else None
+
+
+async def release_unclaimed():
+    """釋放沒有被接手的資源 (例如重新載入後 Cog 名稱改變或載入失敗)"""
+    while _states:
+        name, (state, release) = _states.popitem()
+        logging.warning(f"{name} 交接的資源沒有被接手，將直接釋放")
+        if release is not None:
+            try:
+                await release(state)
+            except Exception as e:
+                logging.error(f"釋放 {name} 的資源失敗: {e}")
+
+
+def export_cogs(bot, extension: str) -> int:
+    """讓擴充模組中支援交接的 Cog 交出資源，回傳交出資源的 Cog 數量
+
+    Cog 實作 `export_state()` 回傳要交接的資源 (之後的 cog_unload 不應再關閉這些資源)，
+    並在 cog_load 中以 `claim(self.qualified_name)` 接手；可選的 `release_state(state)`
+    用於沒有被接手時釋放資源。
+    """
+    exported = 0
+    for cog in list(bot.cogs.values()):
+        if type(cog).__module__ != extension or not hasattr(cog, 'export_state'):
+            continue
+        stash(cog.qualified_name, cog.export_state(), getattr(cog, 'release_state', None))
+        exported += 1
+    return exported
@@ -0,0 +1,181 @@
+import json
+import os
+import struct
+import time
+from typing import List, NamedTuple, Optional, Tuple
+
+# 固定寬度紀錄: user_id, guild_id (0 表示 DM), file_size (-1 表示未知), 類型代碼, UNIX 時間戳
+RECORD = struct.Struct('<qqqBd')
+
+# 轉換類型代碼 (只能新增，不可修改既有代碼)
+CONVERSION_TYPES = {
+    "unknown": 0,
+    "image_to_gif": 1,
+    "gif_passthrough": 2,
+    "video_to_gif": 3,
+}
+CONVERSION_TYPE_NAMES = {code: name for name, code in CONVERSION_TYPES.items()}
+
+
+class JournalRecord(NamedTuple):
+    user_id: int
+    guild_id: Optional[int]
+    file_size: Optional[int]
+    conversion_type: str
+    timestamp: float
+
+
+class EventJournal:
+    """只能附加的二進位事件日誌
+
+    每筆轉換以固定寬度寫入 `<generation>.journal` 檔案，由背景程序批次匯入資料庫。
+    每次啟動都會開啟新的世代檔案，因此當機時殘留的不完整尾端不會被後續寫入接上。
+    """
+
+    SUFFIX = ".journal"
+
+    def __init__(self, directory: str, max_file_size: int = 4 * 1024 * 1024):
+        self.directory = directory
+        self.name = os.path.basename(os.path.normpath(directory))
+        self.max_file_size = max_file_size
+        self._file = None
+        self._generation: Optional[int] = None
+        self._size = 0
+        # 本程序附加的紀錄總數
+        self.appended = 0
+
+    def _path(self, generation: int) -> str:
+        return os.path.join(self.directory, f"{generation:08d}{self.SUFFIX}")
+
+    def generations(self) -> List[int]:
+        """列出目前存在的世代 (由舊到新)"""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            int(filename[:-len(self.SUFFIX)])
+            for filename in os.listdir(self.directory)
+            if filename.endswith(self.SUFFIX) and filename[:-len(self.SUFFIX)].isdigit()
+        )
+
+    @property
+    def active_generation(self) -> Optional[int]:
+        """正在寫入的世代 (尚未寫入時為 None)"""
+        return self._generation
+
+    def _open_next(self):
+        """開啟下一個世代檔案"""
+        if self._file is not None:
+            self._file.close()
+        os.makedirs(self.directory, exist_ok=True)
+        existing = self.generations()
+        self._generation = (existing[-1] + 1) if existing else 1
+        # 不使用緩衝，每筆紀錄直接寫入作業系統，程序當機也不會遺失
+        self._file = open(self._path(self._generation), "ab", buffering=0)
+        self._size = 0
+
+    def append(self, user_id: int, guild_id: Optional[int], file_size: Optional[int],
+               conversion_type: str, timestamp: Optional[float] = None) -> int:
+        """附加一筆轉換紀錄，回傳本程序的紀錄序號"""
+        if self._file is None or self._size >= self.max_file_size:
+            self._open_next()
+        self._file.write(RECORD.pack(
+            user_id,
+            guild_id or 0,
+            -1 if file_size is None else file_size,
+            CONVERSION_TYPES.get(conversion_type, 0),
+            time.time() if timestamp is None else timestamp
+        ))
+        self._size += RECORD.size
+        self.appended += 1
+        return self.appended
+
+    def read(self, generation: int, offset: int, max_records: int) -> Tuple[List[JournalRecord], int]:
+        """從指定世代與位移讀取完整紀錄，回傳 (紀錄, 新位移)；忽略尾端不完整的紀錄"""
+        try:
+            with open(self._path(generation), "rb") as f:
+                f.seek(offset)
+                data = f.read(max_records * RECORD.size)
+        except FileNotFoundError:
+            return [], offset
+        usable = len(data) - len(data) % RECORD.size
+        records = []
+        for user_id, guild_id, file_size, type_code, timestamp in RECORD.iter_unpack(data[:usable]):
+            records.append(JournalRecord(
+                user_id,
+                guild_id or None,
+                None if file_size < 0 else file_size,
+                CONVERSION_TYPE_NAMES.get(type_code, "unknown"),
+                timestamp
+            ))
+        return records, offset + usable
+
+    def remove(self, generation: int):
+        """刪除已完整匯入的世代檔案
+
+        最新的世代檔案會被保留，讓下次啟動時的世代編號持續遞增，
+        不會與已記錄的匯入進度重複。
+        """
+        existing = self.generations()
+        if generation == self._generation or (existing and generation >= existing[-1]):
+            return
+        try:
+            os.remove(self._path(generation))
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        """關閉目前的寫入檔案"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class ProfileJournal(EventJournal):
+    """用戶與伺服器資料的附加日誌 (每行一筆 JSON)
+
+    叢集子程序不直接寫入資料庫，用戶與伺服器的新增/更新也附加到日誌中，
+    由寫入程序在匯入轉換紀錄前先匯入 (轉換次數的更新需要用戶已存在)。
+    用戶預設組合的儲存與重設同樣以 kind='preset' 附加 (preset 為 None 表示重設)。
+    """
+
+    SUFFIX = ".profiles"
+    # 每筆紀錄的估計位元組上限 (Discord 名稱最長 100 字元)，用來決定一次讀取的大小
+    MAX_LINE = 1024
+
+    def __init__(self, directory: str, max_file_size: int = 4 * 1024 * 1024):
+        super().__init__(directory, max_file_size)
+        # 與事件日誌使用不同的匯入進度
+        self.name = f"{self.name}{self.SUFFIX}"
+
+    def append(self, kind: str, key: int, timestamp: Optional[float] = None, **fields) -> int:
+        """附加一筆用戶 (kind='user')、伺服器 (kind='guild') 或預設組合 (kind='preset') 資料"""
+        if self._file is None or self._size >= self.max_file_size:
+            self._open_next()
+        line = json.dumps({
+            'kind': kind,
+            'id': key,
+            'ts': time.time() if timestamp is None else timestamp,
+            **fields
+        }, ensure_ascii=False).encode('utf-8')
+        self._file.write(line + b'\n')
+        self._size += len(line) + 1
+        self.appended += 1
+        return self.appended
+
+    def read(self, generation: int, offset: int, max_records: int) -> Tuple[List[dict], int]:
+        """從指定世代與位移讀取完整的行，回傳 (紀錄, 新位移)；忽略尾端不完整的行"""
+        try:
+            with open(self._path(generation), "rb") as f:
+                f.seek(offset)
+                data = f.read(max_records * self.MAX_LINE)
+        except FileNotFoundError:
+            return [], offset
+        usable = data.rfind(b'\n') + 1
+        records = []
+        for line in data[:usable].splitlines():
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # 當機時截斷的行
+                continue
+        return records, offset + usable
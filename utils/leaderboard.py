@@ -0,0 +1,117 @@
+import bisect
+import datetime
+from typing import Dict, List, Optional, Tuple
+
+
+def _utc_now_iso() -> str:
+    """與 SQLite CURRENT_TIMESTAMP 相同格式的 UTC 時間"""
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None).isoformat(timespec='seconds')
+
+
+class Leaderboard:
+    """記憶體內的增量排行榜
+
+    啟動時從資料庫載入前 2K 名 (第 K 名之後的部分作為門檻緩衝，接近門檻的用戶有準確次數)，
+    之後每次記錄轉換時以 O(log K) 更新，讀取前 N 名只需切片。定期與資料庫對帳以修正誤差。
+
+    未載入的用戶以載入後的次數計算 (低估，不會誤入排行榜)，直到下次對帳。
+    載入期間記錄的轉換會在載入後重新套用。
+    """
+
+    def __init__(self, capacity: int = 100):
+        self.capacity = capacity
+        self.loaded = False
+        # 前 K 名與載入後有轉換的用戶的轉換次數
+        self._counts: Dict[int, int] = {}
+        # 載入期間記錄的轉換 (None 表示不在載入中)
+        self._replay: Optional[List[int]] = None
+        # 用戶顯示資訊 (username, display_name, last_seen)
+        self._info: Dict[int, Tuple[str, Optional[str], str]] = {}
+        # 依 (-次數, user_id) 排序的前 K 名
+        self._top: List[Tuple[int, int]] = []
+
+    @property
+    def load_size(self) -> int:
+        """對帳時需要從資料庫載入的名次數"""
+        return self.capacity * 2
+
+    def begin_load(self):
+        """開始載入 (在讀取資料庫快照前呼叫)，之後記錄的轉換會在 load 時重新套用"""
+        if self._replay is None:
+            self._replay = []
+
+    def cancel_load(self):
+        self._replay = None
+
+    def load(self, top_rows: List[dict]):
+        """以資料庫快照的前 load_size 名重建排行榜，回傳與記憶體內次數不一致的用戶數"""
+        counts = {row['user_id']: row['total_conversions'] or 0 for row in top_rows}
+        drift = 0
+        if self.loaded:
+            # 排行榜外的用戶只有載入後的次數 (估計值)，不算誤差
+            previous = {user_id: -negative_count for negative_count, user_id in self._top}
+            drift = sum(1 for user_id, count in counts.items() if previous.get(user_id, count) != count)
+        replay, self._replay = self._replay or [], None
+        self._counts = counts
+        info = {row['user_id']: (row['username'], row['display_name'], row['last_seen']) for row in top_rows}
+        # 保留載入期間有轉換的用戶的顯示資訊
+        for user_id in replay:
+            if user_id not in info and user_id in self._info:
+                info[user_id] = self._info[user_id]
+        self._info = info
+        self._top = sorted((-count, user_id) for user_id, count in counts.items())[:self.capacity]
+        self.loaded = True
+        # 快照之後的轉換
+        for user_id in replay:
+            self.record(user_id)
+        return drift
+
+    def update_user(self, user_id: int, username: str, display_name: Optional[str] = None):
+        """更新用戶顯示資訊 (只保留可能進入排行榜的用戶)"""
+        next_count = self._counts.get(user_id, 0) + 1
+        if (user_id not in self._info and len(self._top) >= self.capacity
+                and next_count <= -self._top[-1][0]):
+            return
+        last_seen = self._info.get(user_id, (None, None, _utc_now_iso()))[2]
+        self._info[user_id] = (username, display_name, last_seen)
+
+    def record(self, user_id: int):
+        """記錄一次轉換 (載入中時暫存，尚未載入時略過)"""
+        if self._replay is not None:
+            self._replay.append(user_id)
+            return
+        if not self.loaded:
+            return
+        old = self._counts.get(user_id, 0)
+        new = old + 1
+        self._counts[user_id] = new
+        info = self._info.get(user_id)
+        if info is not None:
+            self._info[user_id] = (info[0], info[1], _utc_now_iso())
+
+        old_key = (-old, user_id)
+        index = bisect.bisect_left(self._top, old_key)
+        if index < len(self._top) and self._top[index] == old_key:
+            # 已在排行榜內，重新定位
+            del self._top[index]
+        elif len(self._top) >= self.capacity and (-new, user_id) >= self._top[-1]:
+            # 未能擠進前 K 名
+            return
+        bisect.insort(self._top, (-new, user_id))
+        if len(self._top) > self.capacity:
+            _, evicted = self._top.pop()
+            self._info.pop(evicted, None)
+
+    def top(self, limit: int) -> List[dict]:
+        """取得前 limit 名"""
+        result = []
+        for negative_count, user_id in self._top[:limit]:
+            username, display_name, last_seen = self._info.get(user_id, (str(user_id), None, None))
+            result.append({
+                'user_id': user_id,
+                'username': username,
+                'display_name': display_name,
+                'total_conversions': -negative_count,
+                'last_seen': last_seen
+            })
+        return result
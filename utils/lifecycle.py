@@ -0,0 +1,83 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+
+import discord
+from discord.ext import commands
+
+import settings
+
+# 排空中：不再接受新的轉換
+draining = False
+# 關閉後是否重新執行程式 (由 bot.py 在事件迴圈結束後處理)
+restart_requested = False
+_shutdown_task: Optional[asyncio.Task] = None
+
+
+def is_draining() -> bool:
+    return draining
+
+
+def _in_flight_tasks(bot: commands.Bot) -> set:
+    """收集各 Cog 進行中的工作 (Cog 以 in_flight 屬性提供)"""
+    tasks = set()
+    for cog in bot.cogs.values():
+        tasks.update(getattr(cog, 'in_flight', ()))
+    return {task for task in tasks if not task.done()}
+
+
+async def drain(bot: commands.Bot, timeout: float) -> int:
+    """停止接受新的轉換，等待進行中的工作完成 (最多 timeout 秒)，回傳被取消的工作數"""
+    global draining
+    draining = True
+    started = time.monotonic()
+    try:
+        await bot.change_presence(
+            status=discord.Status.idle,
+            activity=discord.CustomActivity(name="🔄 正在重新啟動，請稍候"),
+        )
+    except Exception as e:
+        logging.warning(f"更新狀態失敗: {e}")
+
+    tasks = _in_flight_tasks(bot)
+    logging.info(f"開始排空，等待 {len(tasks)} 個進行中的轉換 (最多 {timeout:.0f} 秒)")
+    pending = set()
+    if tasks:
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+    if pending:
+        # 超過期限的工作取消後，由 Cog 回覆用戶稍後再試
+        logging.warning(f"排空逾時，取消 {len(pending)} 個進行中的轉換")
+        for task in pending:
+            task.cancel()
+        await asyncio.wait(pending, timeout=5)
+
+    # 將事件日誌中尚未寫入的轉換記錄寫入資料庫 (叢集模式下由啟動器負責)
+    if settings.JOURNAL_INGEST:
+        from utils.database import db
+        try:
+            flushed = await db.flush()
+            logging.info(f"已寫入 {flushed} 筆待寫入的轉換記錄")
+        except Exception as e:
+            logging.error(f"排空時寫入資料庫失敗: {e}")
+    logging.info(f"排空完成，耗時 {time.monotonic() - started:.1f} 秒")
+    return len(pending)
+
+
+async def shutdown(bot: commands.Bot, restart: bool = False):
+    """排空後關閉機器人；restart 為 True 時於關閉後重新執行程式"""
+    global restart_requested
+    restart_requested = restart
+    logging.info(f"{'='*10} 系統{'重啟' if restart else '關閉'} {'='*10}")
+    try:
+        await drain(bot, settings.DRAIN_TIMEOUT)
+    finally:
+        await bot.close()
+
+
+def request_shutdown(bot: commands.Bot, restart: bool = False) -> asyncio.Task:
+    """排程關閉 (重複呼叫只會執行一次)"""
+    global _shutdown_task
+    if _shutdown_task is None:
+        _shutdown_task = asyncio.get_running_loop().create_task(shutdown(bot, restart))
+    return _shutdown_task
@@ -2,13 +2,26 @@ import traceback
 from rich.logging import RichHandler
 from rich.console import Console
 from rich.theme import Theme
+import atexit
+import copy
+import json
 import logging
+import logging.handlers
 import os
+import queue
+import re
+import shutil
+import gzip
+import sys
+import threading
+import time
 import datetime
 from typing import Optional
 from discord import Interaction, Message
 from discord.ext.commands import Context
 
+import settings
+
 # 設定Rich主題
 custom_theme = Theme({
     "info": "cyan",
@@ -22,8 +35,47 @@ log_dir = "logs"
 if not os.path.exists(log_dir):
     os.makedirs(log_dir)
 
-current_time = datetime.datetime.now().strftime("%Y-%m-%d")
-log_file = f"{log_dir}/{current_time}.log"
+
+class JsonFormatter(logging.Formatter):
+    """JSON Lines 格式 (每筆記錄一行)，方便正式環境以工具收集與查詢"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": datetime.datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "module": record.module,
+            "func": record.funcName,
+            "line": record.lineno,
+            "process": record.process,
+            "thread": record.threadName,
+        }
+        # log() 附加的結構化欄位
+        fields = getattr(record, "fields", None)
+        if fields:
+            data["fields"] = fields
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            data["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class LogQueueHandler(logging.handlers.QueueHandler):
+    """只在呼叫端合併訊息參數後放入佇列，格式化與寫入都交給背景執行緒
+
+    與標準 QueueHandler 不同，保留 exc_info 讓 Rich 仍能輸出完整的例外堆疊
+    (佇列只在同一程序內使用，不需要序列化)。
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        # 參數物件之後可能被修改，先合併成字串
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
 
 # 設定logger
 logger = logging.getLogger()
@@ -34,21 +86,175 @@ rich_handler = RichHandler(console=console, rich_tracebacks=True, tracebacks_sho
 rich_handler.setLevel(logging.INFO)
 
 
+class CompressingRotatingFileHandler(logging.handlers.BaseRotatingHandler):
+    """依日期與大小輪替的日誌檔案
+
+    目前寫入的檔案為 `<日期>[.<標籤>]<副檔名>`；跨日或超過 max_bytes 時改名為
+    `<日期>[.<標籤>].<序號><副檔名>` 並在背景執行緒以 gzip 壓縮，之後依保留天數與
+    封存數量刪除最舊的封存檔。
+    """
+
+    def __init__(self, directory: str, suffix: str, max_bytes: int = 0,
+                 backup_count: int = 0, retention_days: float = 0, tag: str = None):
+        self.directory = directory
+        self.suffix = suffix
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.retention_days = retention_days
+        self.tag = tag
+        self._set_day(time.time())
+        super().__init__(self._path(), 'a', encoding='utf-8', delay=True)
+        # 壓縮上次執行留下、尚未壓縮的舊檔案
+        self._compress_in_background(self._pending_archives())
+
+    def _set_day(self, now: float):
+        today = datetime.date.fromtimestamp(now)
+        self.day = today.strftime('%Y-%m-%d')
+        tomorrow = datetime.datetime.combine(today + datetime.timedelta(days=1), datetime.time())
+        self.next_rollover = tomorrow.timestamp()
+
+    def _stem(self, day: str) -> str:
+        return f"{day}.{self.tag}" if self.tag else day
+
+    def _path(self) -> str:
+        return os.path.abspath(os.path.join(self.directory, f"{self._stem(self.day)}{self.suffix}"))
+
+    def _archive_pattern(self):
+        tag = rf"\.{re.escape(self.tag)}" if self.tag else ""
+        return re.compile(rf"^\d{{4}}-\d{{2}}-\d{{2}}{tag}(\.\d+)?{re.escape(self.suffix)}(\.gz)?$")
+
+    def set_tag(self, tag: str):
+        """改用帶標籤的檔名 (叢集模式下每個程序寫入各自的檔案，避免互相輪替)"""
+        self.acquire()
+        try:
+            if self.stream:
+                self.stream.close()
+                self.stream = None
+            self.tag = tag
+            self.baseFilename = self._path()
+        finally:
+            self.release()
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if record.created >= self.next_rollover:
+            return True
+        if self.max_bytes > 0:
+            if self.stream is None:
+                self.stream = self._open()
+            if self.stream.tell() + len(self.format(record)) + 1 >= self.max_bytes:
+                return True
+        return False
+
+    def doRollover(self):
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        archive = None
+        if os.path.exists(self.baseFilename) and os.path.getsize(self.baseFilename) > 0:
+            stem = os.path.join(self.directory, self._stem(self.day))
+            index = 1
+            while os.path.exists(f"{stem}.{index}{self.suffix}") or os.path.exists(f"{stem}.{index}{self.suffix}.gz"):
+                index += 1
+            archive = f"{stem}.{index}{self.suffix}"
+            os.rename(self.baseFilename, archive)
+        self._set_day(time.time())
+        self.baseFilename = self._path()
+        self.stream = self._open()
+        self._compress_in_background([archive] if archive else [])
+
+    def _pending_archives(self) -> list:
+        """尚未壓縮的封存檔 (不含目前寫入的檔案)"""
+        if not os.path.isdir(self.directory):
+            return []
+        pattern = self._archive_pattern()
+        current = os.path.basename(self.baseFilename)
+        return [
+            os.path.join(self.directory, filename)
+            for filename in sorted(os.listdir(self.directory))
+            if filename != current and not filename.endswith('.gz') and pattern.match(filename)
+        ]
+
+    def _compress_in_background(self, paths: list):
+        threading.Thread(target=self._compress, args=(paths,), name='log-compress', daemon=True).start()
+
+    def _compress(self, paths: list):
+        for path in paths:
+            # 先寫入暫存檔再取代，叢集的多個程序同時壓縮同一個舊檔案時也不會損壞
+            temp = f"{path}.gz.{os.getpid()}.tmp"
+            try:
+                with open(path, 'rb') as source, gzip.open(temp, 'wb') as target:
+                    shutil.copyfileobj(source, target)
+                os.replace(temp, path + '.gz')
+                os.remove(path)
+            except FileNotFoundError:
+                # 已由其他程序壓縮
+                if os.path.exists(temp):
+                    os.remove(temp)
+            except OSError as e:
+                # 不能在這裡使用 logging (會回到同一個 handler)
+                print(f"壓縮日誌檔案失敗: {path} - {e}", file=sys.stderr)
+        self._prune()
+
+    def _prune(self):
+        """刪除超過保留天數或數量的封存檔"""
+        pattern = self._archive_pattern()
+        archives = []
+        for filename in os.listdir(self.directory):
+            if filename.endswith('.gz') and pattern.match(filename):
+                path = os.path.join(self.directory, filename)
+                try:
+                    archives.append((os.path.getmtime(path), path))
+                except OSError:
+                    continue
+        archives.sort(reverse=True)
+        cutoff = time.time() - self.retention_days * 86400 if self.retention_days > 0 else None
+        for index, (mtime, path) in enumerate(archives):
+            if (self.backup_count > 0 and index >= self.backup_count) or (cutoff is not None and mtime < cutoff):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
 # 設定File handler (檔案輸出)
-file_handler = logging.FileHandler(filename=log_file, encoding="utf-8", mode="a")
+if settings.LOG_FORMAT == "json":
+    log_suffix = ".jsonl"
+    file_format = JsonFormatter()
+else:
+    log_suffix = ".log"
+    file_format = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+file_handler = CompressingRotatingFileHandler(
+    log_dir, log_suffix,
+    max_bytes=settings.LOG_MAX_BYTES,
+    backup_count=settings.LOG_BACKUP_COUNT,
+    retention_days=settings.LOG_RETENTION_DAYS,
+)
 file_handler.setLevel(logging.DEBUG)
-file_format = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 file_handler.setFormatter(file_format)
 
+# 記錄只在呼叫端放入佇列，由背景執行緒的 listener 交給 Rich 與檔案 handler
+log_queue = queue.SimpleQueue()
+queue_handler = LogQueueHandler(log_queue)
+listener = logging.handlers.QueueListener(log_queue, rich_handler, file_handler, respect_handler_level=True)
+
 # 添加handlers
-logger.addHandler(rich_handler)
-logger.addHandler(file_handler)
+logger.addHandler(queue_handler)
+listener.start()
+
+
+def stop_logging():
+    """停止背景 listener 並寫出佇列中剩餘的記錄 (可重複呼叫)"""
+    if listener._thread is not None:
+        listener.stop()
+
+
+# 結束時寫出佇列中剩餘的記錄
+atexit.register(stop_logging)
 
 
 def log(to_log: (str|Interaction|Message|Context|None)=None, *args, **kwargs):
     """快速打個 log"""
     try:
-        msg = None
         user = None
         args_list = list(args)
         if isinstance(to_log, str):
@@ -60,12 +266,12 @@ def log(to_log: (str|Interaction|Message|Context|None)=None, *args, **kwargs):
         elif isinstance(to_log, Context):
             user = to_log.author.name
 
-        # 取得當前函數的堆疊資訊
-        caller = traceback.extract_stack()[-2]
-        # 倒數第二個是呼叫者 (倒數第一個是當前函數)
-        short_filename = os.path.basename(caller.filename)
-        
-        end_msg = f"函式: {caller.name} 檔案: {short_filename} 第 {caller.lineno} 行呼叫"
+        # 直接取得呼叫者的 frame (不建立整個堆疊)
+        caller = sys._getframe(1)
+        code = caller.f_code
+        short_filename = os.path.basename(code.co_filename)
+
+        end_msg = f"函式: {code.co_name} 檔案: {short_filename} 第 {caller.f_lineno} 行呼叫"
         if any([user, args_list, kwargs]):
             end_msg += "\n"
         if user:
@@ -75,7 +281,9 @@ def log(to_log: (str|Interaction|Message|Context|None)=None, *args, **kwargs):
                 end_msg += f" {key}: {value}"
         if args_list:
             end_msg += f" 詳細資訊: {args_list}"
-        logging.info(end_msg)
+        fields = {"discord_user": user, "details": args_list, **kwargs} if (user or args_list or kwargs) else None
+        # stacklevel=2 讓記錄的 funcName/lineno 指向呼叫者
+        logging.info(end_msg, stacklevel=2, extra={"fields": fields})
     except Exception as e:
         logging.error(f"Log 錯誤: {e}")
-        logging.error(traceback.format_exc())
\ No newline at end of file
+        logging.error(traceback.format_exc())
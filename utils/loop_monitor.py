@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+from utils import metrics
+
+loop_lag_seconds = metrics.registry.histogram(
+    'event_loop_lag_seconds', '事件迴圈排程延遲',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+loop_stalls_total = metrics.registry.counter('event_loop_stalls_total', '事件迴圈阻塞超過門檻的次數')
+
+
+class LoopMonitor:
+    """事件迴圈延遲監控
+
+    事件迴圈中的探測任務每隔 interval 秒醒來一次，記錄實際醒來時間與預期的差距 (延遲)
+    並更新心跳；輔助執行緒檢查心跳，若超過 threshold 秒沒有更新，代表事件迴圈正被同步
+    程式碼阻塞，此時從輔助執行緒擷取事件迴圈執行緒當下的呼叫堆疊寫入日誌。
+    """
+
+    def __init__(self, interval: float = 0.25, threshold: float = 0.5):
+        self.interval = interval
+        self.threshold = threshold
+        self.max_lag = 0.0
+        self.stalls = 0
+        self._last_beat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self):
+        """在事件迴圈中啟動監控 (必須在事件迴圈執行緒中呼叫)"""
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._probe())
+        self._thread = threading.Thread(target=self._watch, name='loop-monitor', daemon=True)
+        self._thread.start()
+        logging.info(f'事件迴圈監控已啟動 (門檻 {self.threshold * 1000:.0f} ms)')
+
+    async def stop(self):
+        """停止監控"""
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval * 2)
+            self._thread = None
+
+    async def _probe(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._last_beat = now
+            lag = max(0.0, now - expected)
+            loop_lag_seconds.observe(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if lag >= self.threshold:
+                logging.warning(f'事件迴圈延遲 {lag * 1000:.0f} ms')
+
+    def _watch(self):
+        """輔助執行緒：心跳停止時擷取事件迴圈執行緒的堆疊 (每次阻塞只擷取一次)"""
+        dumped_beat = None
+        while not self._stop.wait(self.interval / 2):
+            last_beat = self._last_beat
+            stalled = time.monotonic() - last_beat
+            # 心跳本身每 interval 秒才更新一次，扣除後才是實際的延遲
+            if stalled - self.interval < self.threshold or last_beat == dumped_beat:
+                continue
+            dumped_beat = last_beat
+            self.stalls += 1
+            loop_stalls_total.inc()
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = ''.join(traceback.format_stack(frame))
+            del frame
+            logging.warning(
+                f'事件迴圈已阻塞 {(stalled - self.interval) * 1000:.0f} ms，目前的呼叫堆疊:\n{stack}'
+            )
+
+
+# 全域監控實例
+monitor: Optional[LoopMonitor] = None
+
+
+def start_monitor(interval: float, threshold: float) -> Optional[LoopMonitor]:
+    """依設定啟動全域監控 (threshold 為 0 表示停用)"""
+    global monitor
+    if threshold <= 0:
+        return None
+    monitor = LoopMonitor(interval, threshold)
+    monitor.start()
+    return monitor
@@ -0,0 +1,114 @@
+from typing import NamedTuple, Optional, Tuple
+
+import settings
+from utils import encoders
+
+
+class Preset(NamedTuple):
+    """轉換預設組合"""
+    name: str
+    quality: int
+    max_size: int  # 靜態圖片最長邊 (動態圖片為一半)
+    max_frames: int  # 動態圖片最多幀數
+    fps: float  # 每秒最多幀數 (0 表示保留原始幀率)
+    output_format: Optional[str] = None  # None 表示使用 OUTPUT_FORMAT
+
+    @property
+    def animated_size(self) -> int:
+        return self.max_size // 2
+
+    @property
+    def format(self) -> str:
+        return self.output_format or settings.OUTPUT_FORMAT
+
+    @property
+    def encoder(self) -> Optional[str]:
+        """fast 輸出 GIF 時使用 Bayer 抖色快速模式 (沒有 numpy 時為 None，改為自動選擇)"""
+        if self.name == 'fast' and self.format == 'gif' and encoders.get('bayer_gif'):
+            return 'bayer_gif'
+        return None
+
+    def video_limits(self) -> Tuple[int, int, float]:
+        """影片的 (最多幀數, 最長邊, 取樣率)：以 balanced 為基準，依 VIDEO_* 設定等比例換算"""
+        base = PRESETS[DEFAULT_PRESET]
+        max_frames = max(1, round(settings.VIDEO_MAX_FRAMES * self.max_frames / base.max_frames))
+        max_size = max(64, round(settings.VIDEO_MAX_SIZE * self.max_size / base.max_size))
+        return max_frames, max_size, self.fps or settings.VIDEO_FPS
+
+
+# 內建預設組合 (balanced 與原本固定的設定相同)
+PRESETS = {
+    'fast': Preset('fast', quality=60, max_size=768, max_frames=20, fps=10),
+    'balanced': Preset('balanced', quality=80, max_size=1024, max_frames=30, fps=0),
+    'quality': Preset('quality', quality=95, max_size=1536, max_frames=60, fps=0),
+}
+DEFAULT_PRESET = 'balanced'
+
+# 自訂欄位的範圍
+MAX_SIZE_RANGE = (128, 2048)
+MAX_FRAMES_RANGE = (1, 100)
+FPS_RANGE = (0, 50)
+
+
+def default() -> Preset:
+    return PRESETS[DEFAULT_PRESET]
+
+
+def build(name: str = DEFAULT_PRESET, max_size: int = None, max_frames: int = None,
+          fps: float = None, output_format: str = None) -> Preset:
+    """以內建預設組合為基礎套用自訂欄位 (超出範圍時拋出 ValueError)"""
+    if name not in PRESETS:
+        raise ValueError(f"未知的預設組合: {name}")
+    preset = PRESETS[name]
+    for value, (low, high), label in (
+        (max_size, MAX_SIZE_RANGE, "最大尺寸"),
+        (max_frames, MAX_FRAMES_RANGE, "最多幀數"),
+        (fps, FPS_RANGE, "每秒幀數"),
+    ):
+        if value is not None and not low <= value <= high:
+            raise ValueError(f"{label}必須介於 {low} 與 {high} 之間")
+    if output_format is not None and output_format not in encoders.FORMATS:
+        raise ValueError(f"不支援的輸出格式: {output_format}")
+    return preset._replace(
+        max_size=preset.max_size if max_size is None else max_size,
+        max_frames=preset.max_frames if max_frames is None else max_frames,
+        fps=preset.fps if fps is None else fps,
+        output_format=output_format or preset.output_format,
+    )
+
+
+def cost(preset: Preset) -> float:
+    """預估每次轉換的 CPU 成本 (balanced 輸出 GIF 為 1)
+
+    以輸出像素數 (最長邊的平方) 乘上動畫幀數比例，再乘上輸出格式相對於 GIF 的編碼成本。
+    """
+    base = PRESETS[DEFAULT_PRESET]
+    pixels = (preset.max_size / base.max_size) ** 2
+    frames = max(1.0, preset.max_frames / base.max_frames)
+    return pixels * frames * encoders.relative_cost(preset.format)
+
+
+def within_budget(preset: Preset) -> bool:
+    return cost(preset) <= settings.PRESET_MAX_COST
+
+
+def fallback() -> Preset:
+    """預算內的預設值：預設組合超出預算時改用成本最低的內建組合，仍超出時改為輸出 GIF"""
+    preset = default()
+    if within_budget(preset):
+        return preset
+    preset = min(PRESETS.values(), key=cost)
+    return preset if within_budget(preset) else preset._replace(output_format='gif')
+
+
+def from_row(row: Optional[dict]) -> Preset:
+    """由資料庫記錄還原預設組合 (沒有記錄、資料無效或超過預算時使用預算內的預設值)"""
+    if not row:
+        return fallback()
+    try:
+        preset = build(row['preset'], row.get('max_size'), row.get('max_frames'), row.get('fps'),
+                       row.get('output_format'))
+    except (KeyError, ValueError):
+        return fallback()
+    # 預算設定調低後，原本儲存的組合可能已超出預算
+    return preset if within_budget(preset) else fallback()
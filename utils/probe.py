@@ -0,0 +1,202 @@
+import io
+import struct
+from typing import List, NamedTuple, Optional, Tuple
+
+import settings
+
+
+class ProbeError(ValueError):
+    """無法從標頭辨識圖片"""
+
+
+class BudgetExceeded(ValueError):
+    """圖片解碼後的像素數超過預算 (解壓縮炸彈或成本過高)"""
+
+
+class ImageInfo(NamedTuple):
+    format: str
+    width: int
+    height: int
+    mode: Optional[str]
+    # 只有部分資料 (例如下載中) 而無法得知時為 None
+    frame_count: Optional[int]
+    duration: Optional[int]  # 總毫秒數
+
+    @property
+    def pixels(self) -> int:
+        return self.width * self.height
+
+
+class Plan(NamedTuple):
+    size: Tuple[int, int]  # 輸出尺寸
+    decode_count: int  # 需要依序解碼的畫格數
+    indices: List[int]  # 保留的畫格 (在 decode_count 內平均取樣)
+
+
+def _skip_sub_blocks(data: bytes, pos: int) -> int:
+    """跳過 GIF 資料子區塊，回傳下一個區塊的位置 (資料不完整時回傳 -1)"""
+    while pos < len(data):
+        size = data[pos]
+        pos += 1 + size
+        if size == 0:
+            return pos
+    return -1
+
+
+def _walk_gif(data: bytes):
+    """走訪 GIF 區塊 (不解壓縮 LZW 資料)，回傳 (寬, 高, 畫格數, 總毫秒數, 是否完整)"""
+    width, height, flags = struct.unpack_from('<HHB', data, 6)
+    pos = 13
+    if flags & 0x80:
+        pos += 3 * (2 << (flags & 7))
+    frames = total = delay = 0
+    while pos < len(data):
+        block = data[pos]
+        if block == 0x3B:
+            return width, height, frames, total, True
+        if block == 0x21:
+            if pos + 2 >= len(data):
+                break
+            if data[pos + 1] == 0xF9 and pos + 6 <= len(data):
+                # 圖形控制延伸：延遲時間以 1/100 秒為單位
+                delay = struct.unpack_from('<H', data, pos + 4)[0] * 10
+            pos = _skip_sub_blocks(data, pos + 2)
+        elif block == 0x2C:
+            if pos + 10 > len(data):
+                break
+            flags = data[pos + 9]
+            pos += 10
+            if flags & 0x80:
+                pos += 3 * (2 << (flags & 7))
+            # LZW 最小編碼長度之後是影像資料子區塊
+            pos = _skip_sub_blocks(data, pos + 1)
+            if pos < 0:
+                break
+            frames += 1
+            total += delay
+            delay = 0
+        else:
+            break
+        if pos < 0:
+            break
+    return width, height, frames, total, False
+
+
+def _walk_png(data: bytes):
+    """走訪 PNG 區塊 (APNG 的 acTL/fcTL)，回傳 (寬, 高, 畫格數, 總毫秒數, 是否完整)"""
+    width, height = struct.unpack_from('>II', data, 16)
+    frames, total, animated = 1, 0, False
+    pos = 8
+    while pos + 8 <= len(data):
+        length, chunk = struct.unpack_from('>I4s', data, pos)
+        if chunk == b'acTL' and pos + 12 <= len(data):
+            frames = struct.unpack_from('>I', data, pos + 8)[0]
+            animated = True
+        elif chunk == b'fcTL' and pos + 34 <= len(data):
+            numerator, denominator = struct.unpack_from('>HH', data, pos + 28)
+            total += numerator * 1000 // (denominator or 100)
+        elif chunk == b'IEND':
+            return width, height, frames, total if animated else 0, True
+        pos += 12 + length
+    return width, height, frames, total if animated else 0, False
+
+
+def _walk_webp(data: bytes):
+    """走訪 WebP RIFF 區塊 (VP8X/ANMF)，回傳 (寬, 高, 畫格數, 總毫秒數, 是否完整)"""
+    width = height = None
+    frames = total = 0
+    pos = 12
+    end = min(len(data), 8 + struct.unpack_from('<I', data, 4)[0])
+    while pos + 8 <= end:
+        chunk, length = struct.unpack_from('<4sI', data, pos)
+        body = pos + 8
+        if chunk == b'VP8X' and body + 10 <= len(data):
+            width = int.from_bytes(data[body + 4:body + 7], 'little') + 1
+            height = int.from_bytes(data[body + 7:body + 10], 'little') + 1
+        elif chunk == b'ANMF' and body + 16 <= len(data):
+            frames += 1
+            total += int.from_bytes(data[body + 12:body + 15], 'little')
+        elif chunk == b'VP8 ' and width is None and body + 10 <= len(data):
+            width, height = (value & 0x3FFF for value in struct.unpack_from('<HH', data, body + 6))
+            frames = frames or 1
+        elif chunk == b'VP8L' and width is None and body + 5 <= len(data):
+            bits = int.from_bytes(data[body + 1:body + 5], 'little')
+            width, height = (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+            frames = frames or 1
+        pos = body + length + (length & 1)
+    if width is None:
+        raise ProbeError("WebP 標頭不完整")
+    complete = pos >= end and end == 8 + struct.unpack_from('<I', data, 4)[0]
+    return width, height, max(frames, 1), total, complete
+
+
+def _walk(data: bytes):
+    if data[:6] in (b'GIF87a', b'GIF89a') and len(data) >= 13:
+        return 'GIF', _walk_gif(data)
+    if data[:8] == b'\x89PNG\r\n\x1a\n' and len(data) >= 24:
+        return 'PNG', _walk_png(data)
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP' and len(data) >= 20:
+        return 'WEBP', _walk_webp(data)
+    return None, None
+
+
+def probe(data: bytes, partial: bool = False) -> ImageInfo:
+    """只讀取標頭取得尺寸、模式、畫格數與總時長 (不解碼像素資料)
+
+    GIF、PNG/APNG 與 WebP 直接走訪檔案區塊 (下載到一半的資料也能取得尺寸)；
+    其他格式使用 Pillow 的延遲載入 (Image.open 只讀取標頭)。
+    partial 表示資料可能只有開頭，區塊走訪不完整時畫格數為 None；
+    否則資料已完整 (例如 GIF 缺少結尾的 0x3B)，改由 Pillow 計算畫格數。
+    """
+    from PIL import Image
+
+    try:
+        format, walked = _walk(data)
+    except (struct.error, IndexError) as e:
+        raise ProbeError(f"無法讀取圖片標頭: {e}")
+    mode = frame_count = duration = None
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            mode = img.mode
+            if walked is None or not (partial or walked[4]):
+                frame_count = getattr(img, 'n_frames', 1)
+                duration = img.info.get('duration', 0) * frame_count if frame_count > 1 else 0
+            if walked is None:
+                format, walked = img.format, (img.width, img.height, frame_count, duration, True)
+    except Image.DecompressionBombError as e:
+        raise BudgetExceeded(str(e))
+    except Exception as e:
+        if walked is None:
+            raise ProbeError(f"無法辨識的圖片格式: {e}")
+    width, height, frames, total, complete = walked
+    if not width or not height:
+        raise ProbeError(f"圖片尺寸無效: {width}x{height}")
+    if complete:
+        frame_count, duration = frames, total if frames > 1 else 0
+    return ImageInfo(format, width, height, mode, frame_count, duration)
+
+
+def check_pixels(info: ImageInfo):
+    """單一畫格的像素預算 (尺寸在標頭中，下載到一半時就能檢查)"""
+    if info.pixels > settings.MAX_IMAGE_PIXELS:
+        raise BudgetExceeded(f"圖片尺寸 {info.width}x{info.height} 超過 {settings.MAX_IMAGE_PIXELS:,} 像素上限")
+
+
+def plan(info: ImageInfo, max_frames: int, max_size: int) -> Plan:
+    """依預算規劃縮放尺寸與畫格取樣
+
+    需要解碼的像素數 (像素 x 畫格) 不超過 MAX_TOTAL_PIXELS：連前 max_frames 格都超過時拒絕，
+    否則在預算內盡量涵蓋整段動畫，再平均取樣 max_frames 格 (動畫畫格需要依序解碼)。
+    """
+    check_pixels(info)
+    frames = info.frame_count or 1
+    if info.pixels * min(frames, max_frames) > settings.MAX_TOTAL_PIXELS:
+        raise BudgetExceeded(
+            f"圖片 {info.width}x{info.height} x {frames} 格超過 {settings.MAX_TOTAL_PIXELS:,} 像素的解碼預算"
+        )
+    decode_count = min(frames, settings.MAX_TOTAL_PIXELS // info.pixels)
+    keep = min(max_frames, decode_count)
+    indices = [index * decode_count // keep for index in range(keep)]
+    scale = min(1.0, max_size / max(info.width, info.height))
+    size = max(1, round(info.width * scale)), max(1, round(info.height * scale))
+    return Plan(size, decode_count, indices)
@@ -0,0 +1,135 @@
+import time
+from typing import Dict, Optional, Tuple
+
+from utils import metrics
+
+throttled_total = metrics.registry.counter(
+    'gif_conversion_throttled_total', '因速率限制被拒絕的轉換次數 (依範圍)', ('scope',)
+)
+
+
+class TokenBucket:
+    """令牌桶：以 rate (每秒) 補充，最多累積 capacity 個令牌"""
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def retry_after(self, cost: float, now: float) -> float:
+        """取得 cost 個令牌前需要等待的秒數 (0 表示可以立即取得)"""
+        self._refill(now)
+        if self.tokens >= cost:
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+    def consume(self, cost: float):
+        self.tokens -= cost
+
+    def adjust(self, cost: float, now: float):
+        """不檢查額度直接扣除 cost (負值表示退還，不超過容量)"""
+        self._refill(now)
+        self.tokens = min(self.capacity, self.tokens - cost)
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class _Scope:
+    """同一範圍 (用戶/伺服器) 的令牌桶集合"""
+
+    def __init__(self, name: str, rate: float, capacity: float, max_entries: int):
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+        self.max_entries = max_entries
+        self.buckets: Dict[int, TokenBucket] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0 and self.capacity > 0
+
+    def bucket(self, key: int, now: float) -> TokenBucket:
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) >= self.max_entries:
+                self._sweep(now)
+            bucket = self.buckets[key] = TokenBucket(self.rate, self.capacity, now)
+        return bucket
+
+    def _sweep(self, now: float):
+        """移除已補滿的令牌桶 (與新建立的令牌桶狀態相同，刪除不影響限制)"""
+        for key in [key for key, bucket in self.buckets.items() if bucket.is_full(now)]:
+            del self.buckets[key]
+
+
+class RateLimiter:
+    """依用戶、伺服器與全域三層令牌桶限制轉換
+
+    每次轉換的成本依預估的工作量計算 (見 estimate_cost)，三層都有足夠令牌時才一起扣除，
+    因此被拒絕的請求不會消耗任何一層的額度。
+    """
+
+    def __init__(self, user: Tuple[float, float], guild: Tuple[float, float], global_: Tuple[float, float],
+                 max_entries: int = 10000):
+        self.user = _Scope('user', *user, max_entries)
+        self.guild = _Scope('guild', *guild, max_entries)
+        self.global_ = _Scope('global', *global_, 1)
+
+    def acquire(self, user_id: int, guild_id: Optional[int], cost: float) -> Tuple[float, Optional[str]]:
+        """嘗試取得額度，回傳 (需等待秒數, 受限的範圍)；允許時回傳 (0, None)"""
+        now = time.monotonic()
+        checks = []
+        for scope, key in ((self.user, user_id), (self.guild, guild_id), (self.global_, 0)):
+            if not scope.enabled or key is None:
+                continue
+            # 成本不超過容量，避免大型檔案永遠無法取得額度
+            checks.append((scope, scope.bucket(key, now), min(cost, scope.capacity)))
+
+        retry_after, limited_scope = 0.0, None
+        for scope, bucket, scoped_cost in checks:
+            wait = bucket.retry_after(scoped_cost, now)
+            if wait > retry_after:
+                retry_after, limited_scope = wait, scope.name
+        if limited_scope is not None:
+            throttled_total.labels(limited_scope).inc()
+            return retry_after, limited_scope
+
+        for scope, bucket, scoped_cost in checks:
+            bucket.consume(scoped_cost)
+        return 0.0, None
+
+    def adjust(self, user_id: int, guild_id: Optional[int], charged: float, cost: float):
+        """實際成本確定後，補扣 (或退還) 與 acquire 時已扣除成本的差額
+
+        補扣不檢查額度，額度不足時之後的請求需要等待更久。
+        """
+        now = time.monotonic()
+        for scope, key in ((self.user, user_id), (self.guild, guild_id), (self.global_, 0)):
+            if not scope.enabled or key is None:
+                continue
+            delta = min(cost, scope.capacity) - min(charged, scope.capacity)
+            if delta:
+                scope.bucket(key, now).adjust(delta, now)
+
+
+def estimate_cost(size: Optional[int], width: Optional[int], height: Optional[int],
+                  default: float = 2.0) -> float:
+    """預估轉換的工作量 (約以百萬像素計)
+
+    有尺寸資訊時以像素數計算；只有檔案大小時以每 MB 一單位估算；
+    都沒有 (例如 URL) 時使用預設成本。
+    """
+    if width and height:
+        return max(1.0, width * height / 1_000_000)
+    if size:
+        return max(1.0, size / (1024 * 1024))
+    return default
@@ -0,0 +1,47 @@
+import logging
+import time
+from contextlib import contextmanager
+from typing import List, Tuple
+
+
+class StartupTimer:
+    """記錄啟動各階段耗時，用來追蹤冷啟動時間"""
+
+    def __init__(self, started: float | None = None):
+        self.started = time.perf_counter() if started is None else started
+        self.stages: List[Tuple[str, float]] = []
+        self.reported = False
+
+    @contextmanager
+    def stage(self, name: str):
+        """量測一個階段的耗時"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append((name, time.perf_counter() - start))
+
+    async def measure(self, name: str, awaitable):
+        """量測一個非同步階段的耗時 (可與其他階段並行)"""
+        start = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.stages.append((name, time.perf_counter() - start))
+
+    def add(self, name: str, seconds: float):
+        """加入已量測好的階段"""
+        self.stages.append((name, seconds))
+
+    def report(self):
+        """輸出各階段耗時 (只輸出一次)"""
+        if self.reported:
+            return
+        self.reported = True
+        total = time.perf_counter() - self.started
+        lines = [f"{name:<24}{seconds * 1000:>9.1f} ms" for name, seconds in self.stages]
+        lines.append(f"{'總計 (至就緒)':<24}{total * 1000:>9.1f} ms")
+        logging.info("啟動耗時分析:\n" + "\n".join(lines))
+
+
+timer = StartupTimer()
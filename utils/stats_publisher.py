@@ -0,0 +1,171 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional
+
+import discord
+from discord.ext import commands
+
+
+def _embed_fingerprint(embed: discord.Embed) -> dict:
+    """比較用的嵌入內容 (忽略每次都會變動的時間戳)"""
+    data = embed.to_dict()
+    data.pop('timestamp', None)
+    return data
+
+
+class StatsPublisher:
+    """將統計資料發佈到頻道名稱與訊息的發佈器
+
+    - 快取已解析的頻道與訊息物件，不會每次重新 fetch
+    - 只有內容與上次發佈的不同時才送出編輯
+    - 短時間內的多次更新會合併為一次
+    - 頻道改名受 Discord 限制 (每 10 分鐘 2 次)，依設定的間隔與 429 的 Retry-After 退避
+    """
+
+    def __init__(self, bot: commands.Bot, channel_ids: Dict[str, int], data_channel_id: int, message_id: int,
+                 coalesce_delay: float = 5.0, rename_interval: float = 300.0):
+        self.bot = bot
+        self.channel_ids = {key: channel_id for key, channel_id in channel_ids.items() if channel_id}
+        self.data_channel_id = data_channel_id
+        self.message_id = message_id
+        self.coalesce_delay = coalesce_delay
+        self.rename_interval = rename_interval
+
+        self._channels: Dict[str, discord.abc.GuildChannel] = {}
+        self._message: Optional[discord.PartialMessage] = None
+        # 上次成功發佈的內容與各目標下次允許編輯的時間
+        self._published: Dict[str, object] = {}
+        self._next_allowed: Dict[str, float] = {}
+        # 等待發佈的最新內容
+        self._pending: Dict[str, object] = {}
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.edits_sent = 0
+        self.edits_skipped = 0
+
+    def start(self):
+        """啟動背景發佈任務"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        """停止背景發佈任務"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def submit(self, channel_names: Dict[str, str], embeds: Optional[List[discord.Embed]] = None):
+        """提交最新的統計內容，實際發佈由背景任務合併處理"""
+        for key, name in channel_names.items():
+            if key in self.channel_ids:
+                self._pending[key] = name
+        if embeds is not None and self.data_channel_id and self.message_id:
+            self._pending['message'] = embeds
+        self._wake.set()
+
+    async def _resolve_channel(self, key: str):
+        """取得 (並快取) 頻道物件，同時以目前名稱作為已發佈內容"""
+        channel = self._channels.get(key)
+        if channel is None:
+            channel_id = self.channel_ids[key]
+            channel = self.bot.get_channel(channel_id) or await self.bot.fetch_channel(channel_id)
+            self._channels[key] = channel
+            self._published.setdefault(key, channel.name)
+        return channel
+
+    async def _resolve_message(self) -> discord.PartialMessage:
+        """取得 (並快取) 統計訊息，使用 PartialMessage 以避免 fetch_message"""
+        if self._message is None:
+            channel = self.bot.get_channel(self.data_channel_id) or await self.bot.fetch_channel(self.data_channel_id)
+            self._message = channel.get_partial_message(self.message_id)
+        return self._message
+
+    def _is_changed(self, key: str, value) -> bool:
+        published = self._published.get(key)
+        if key == 'message':
+            if published is None:
+                return True
+            return [_embed_fingerprint(e) for e in value] != published
+        return published != value
+
+    async def _publish(self, key: str, value):
+        """送出單一目標的編輯"""
+        if key == 'message':
+            message = await self._resolve_message()
+            await message.edit(embeds=value)
+            self._published[key] = [_embed_fingerprint(e) for e in value]
+        else:
+            channel = await self._resolve_channel(key)
+            if channel.name == value:
+                self._published[key] = value
+                return
+            await channel.edit(name=value)
+            self._published[key] = value
+            self._next_allowed[key] = time.monotonic() + self.rename_interval
+        self.edits_sent += 1
+
+    def _discard(self, key: str, value):
+        """移除已處理的待發佈值 (await 期間若已提交新的值則保留)"""
+        if self._pending.get(key) is value:
+            del self._pending[key]
+
+    async def _flush(self) -> Optional[float]:
+        """發佈所有待處理的變更，回傳下次需要重試的等待秒數 (無則為 None)"""
+        retry_in = None
+        now = time.monotonic()
+        for key, value in list(self._pending.items()):
+            if key != 'message':
+                # 先解析頻道，讓第一次比較使用頻道目前的名稱
+                try:
+                    await self._resolve_channel(key)
+                except discord.HTTPException as e:
+                    logging.error(f"取得統計頻道失敗 ({key}): {e}")
+                    self._discard(key, value)
+                    continue
+            if not self._is_changed(key, value):
+                self.edits_skipped += 1
+                self._discard(key, value)
+                continue
+            wait = self._next_allowed.get(key, 0) - now
+            if wait > 0:
+                retry_in = wait if retry_in is None else min(retry_in, wait)
+                continue
+            try:
+                await self._publish(key, value)
+                self._discard(key, value)
+            except discord.RateLimited as e:
+                # bot_options 設定了 max_ratelimit_timeout，等待過久時 discord.py 拋出此例外而不是在請求中等待
+                self._next_allowed[key] = time.monotonic() + e.retry_after
+                retry_in = e.retry_after if retry_in is None else min(retry_in, e.retry_after)
+                logging.warning(f"統計更新遭到速率限制 ({key})，{e.retry_after:.0f} 秒後重試")
+            except discord.HTTPException as e:
+                if e.status == 429:
+                    headers = getattr(e.response, 'headers', {}) or {}
+                    backoff = float(headers.get('Retry-After') or headers.get('X-RateLimit-Reset-After') or self.rename_interval)
+                    self._next_allowed[key] = time.monotonic() + backoff
+                    retry_in = backoff if retry_in is None else min(retry_in, backoff)
+                    logging.warning(f"統計更新遭到速率限制 ({key})，{backoff:.0f} 秒後重試")
+                else:
+                    logging.error(f"發佈統計失敗 ({key}): {e}")
+                    self._discard(key, value)
+        return retry_in
+
+    async def _run(self):
+        """背景任務：等待更新、合併、發佈"""
+        retry_in = None
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=retry_in)
+            except asyncio.TimeoutError:
+                pass
+            # 合併短時間內的多次更新
+            await asyncio.sleep(self.coalesce_delay)
+            self._wake.clear()
+            try:
+                retry_in = await self._flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"統計發佈任務發生錯誤: {e}")
+                retry_in = self.coalesce_delay
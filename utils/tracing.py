@@ -0,0 +1,162 @@
+import asyncio
+import contextvars
+import datetime
+import itertools
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import List, Optional
+
+import settings
+
+
+class Trace:
+    """一次被取樣的互動所收集的 span"""
+
+    def __init__(self, trace_id: int):
+        self.trace_id = trace_id
+        self.events: List[dict] = []
+        self._lock = threading.Lock()
+
+    def add(self, event: dict):
+        # span 可能在轉換執行緒池中結束，因此需要加鎖
+        with self._lock:
+            self.events.append(event)
+
+
+class _Span:
+    __slots__ = ("trace", "span_id", "parent_id", "attrs")
+
+    def __init__(self, trace: Trace, span_id: int, parent_id: Optional[int], attrs: dict):
+        self.trace = trace
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.attrs = attrs
+
+
+_current: contextvars.ContextVar[Optional[_Span]] = contextvars.ContextVar("trace_span", default=None)
+_ids = itertools.count(1)
+
+
+def _now_us() -> float:
+    return time.time_ns() / 1000
+
+
+@contextmanager
+def _null_span():
+    yield None
+
+
+@contextmanager
+def _record(trace: Trace, parent_id: Optional[int], name: str, attrs: dict):
+    span = _Span(trace, next(_ids), parent_id, dict(attrs))
+    token = _current.set(span)
+    start = _now_us()
+    error = None
+    try:
+        yield span
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        end = _now_us()
+        _current.reset(token)
+        args = {"trace_id": trace.trace_id, "span_id": span.span_id, "parent_id": parent_id, **span.attrs}
+        if error:
+            args["error"] = error
+        trace.add({
+            "name": name,
+            "ph": "X",
+            "ts": start,
+            "dur": end - start,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": args,
+        })
+
+
+def span(name: str, **attrs):
+    """在目前的追蹤中建立子 span (目前沒有被取樣的追蹤時不做任何事)"""
+    parent = _current.get()
+    if parent is None:
+        return _null_span()
+    return _record(parent.trace, parent.span_id, name, attrs)
+
+
+def annotate(**attrs):
+    """為目前的 span 加上屬性 (沒有追蹤時不做任何事)"""
+    current = _current.get()
+    if current is not None:
+        current.attrs.update(attrs)
+
+
+class Tracer:
+    """取樣追蹤並寫入 Chrome trace 格式的檔案
+
+    每個 span 以一行 Chrome trace 的完整事件 (ph="X") 寫入，檔案以 "[" 開頭且不需要結尾的 "]"，
+    可直接以 chrome://tracing 或 Perfetto 開啟；去掉行尾逗號後每一行也是獨立的 JSON。
+    """
+
+    def __init__(self, directory: str, sample_rate: float, retention_days: float = 0):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.retention_days = retention_days
+        self.written = 0
+        self._lock = threading.Lock()
+
+    def path(self) -> str:
+        return os.path.join(self.directory, f"trace-{datetime.datetime.now().strftime('%Y-%m-%d')}.json")
+
+    @asynccontextmanager
+    async def trace(self, name: str, **attrs):
+        """依取樣率追蹤一次互動，結束後在背景執行緒寫入檔案"""
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate or _current.get() is not None:
+            yield None
+            return
+        trace = Trace(next(_ids))
+        try:
+            with _record(trace, None, name, attrs) as root:
+                yield root
+        finally:
+            try:
+                await asyncio.to_thread(self._write, trace.events)
+            except Exception as e:
+                logging.error(f"寫入追蹤失敗: {e}")
+
+    def _write(self, events: List[dict]):
+        path = self.path()
+        lines = "".join(json.dumps(event, ensure_ascii=False) + ",\n" for event in sorted(events, key=lambda e: e["ts"]))
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            new_file = not os.path.exists(path)
+            with open(path, "a", encoding="utf-8") as f:
+                if new_file:
+                    f.write("[\n")
+                f.write(lines)
+            self.written += 1
+            if new_file:
+                # 每天第一次寫入時清除超過保留天數的追蹤檔案
+                self.prune()
+
+    def prune(self):
+        """刪除超過保留天數的追蹤檔案 (與日誌檔案相同的 LOG_RETENTION_DAYS)"""
+        if self.retention_days <= 0:
+            return
+        cutoff = time.time() - self.retention_days * 86400
+        for filename in os.listdir(self.directory):
+            if not (filename.startswith("trace-") and filename.endswith(".json")):
+                continue
+            path = os.path.join(self.directory, filename)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                continue
+
+
+# 全域追蹤器
+tracer = Tracer(settings.TRACE_DIR, settings.TRACE_SAMPLE_RATE, settings.LOG_RETENTION_DAYS)
@@ -0,0 +1,118 @@
+import io
+import logging
+import time
+from typing import List, Optional, Tuple
+
+# PyAV 為選用套件，沒有安裝時不支援影片轉換
+try:
+    import av
+except ImportError:
+    av = None
+
+VIDEO_EXTENSIONS = ('.mp4', '.webm', '.mov')
+
+# 目標時間點距離目前解碼位置超過此秒數時才跳轉 (較近的時間點繼續往後解碼比較快)
+SEEK_THRESHOLD = 1.0
+
+
+def available() -> bool:
+    return av is not None
+
+
+def sample_timestamps(duration: float, fps: float, max_frames: int) -> List[float]:
+    """在影片長度內平均取樣的時間點 (秒)"""
+    if duration <= 0:
+        return [0.0]
+    count = max(1, min(max_frames, int(duration * fps)))
+    step = duration / count
+    return [index * step for index in range(count)]
+
+
+def fit_size(width: int, height: int, max_size: int) -> Tuple[int, int]:
+    """等比例縮放到不超過 max_size (編碼器需要偶數尺寸)"""
+    scale = min(1.0, max_size / max(width, height))
+    return max(2, int(width * scale) // 2 * 2), max(2, int(height * scale) // 2 * 2)
+
+
+def decode_frames(data: bytes, fps: float = 10, max_frames: int = 50, max_size: int = 480,
+                  max_duration: float = 10.0, time_budget: Optional[float] = None):
+    """從影片取樣畫格，回傳 (PIL 畫格列表, 每格毫秒數)
+
+    只解碼取樣時間點附近的畫格：目標較遠時跳轉到前一個關鍵畫格再往後解碼，
+    畫格在解碼時直接由 swscale 縮放並轉為 RGB，記憶體只保留縮放後的取樣畫格。
+    超過 time_budget 秒時停止取樣，回傳已取得的畫格。
+    """
+    if av is None:
+        raise RuntimeError("未安裝 PyAV，無法轉換影片")
+    deadline = None if time_budget is None else time.monotonic() + time_budget
+    with av.open(io.BytesIO(data), mode='r') as container:
+        if not container.streams.video:
+            return [], []
+        stream = container.streams.video[0]
+        stream.thread_type = 'AUTO'
+        time_base = float(stream.time_base)
+        if stream.duration:
+            duration = stream.duration * time_base
+        elif container.duration:
+            duration = container.duration / av.time_base
+        else:
+            duration = max_duration
+        start = stream.start_time * time_base if stream.start_time else 0.0
+        clip = min(duration, max_duration)
+        timestamps = sample_timestamps(clip, fps, max_frames)
+        width, height = fit_size(stream.codec_context.width, stream.codec_context.height, max_size)
+
+        # 每個取樣時間點顯示「時間不晚於它的最後一格」；來源幀率低於取樣率時重複使用同一格，
+        # 連續相同的畫格合併為一格並加長顯示時間，播放速度與原影片一致
+        step = clip / len(timestamps)
+        step_ms = max(20, int(step * 1000))
+        rate = float(stream.average_rate) if stream.average_rate else 0.0
+        frame_interval = 1 / rate if rate else step
+        frames, durations = [], []
+        decoder = None
+        current = None  # 最後一個時間不晚於目標的畫格
+        upcoming = None  # 已解碼但晚於目標的下一格
+        exhausted = False
+        shown = None
+        for target in timestamps:
+            if deadline is not None and time.monotonic() > deadline:
+                logging.warning(f"影片解碼超過時間上限，只取得 {len(frames)} 格")
+                break
+            target += start
+            # 容許浮點誤差 (取樣時間點由累加計算)
+            if upcoming is None or upcoming.time <= target + 1e-6:
+                if decoder is None or current is None or target - current.time > SEEK_THRESHOLD:
+                    container.seek(int(target / time_base), stream=stream, backward=True)
+                    decoder = container.decode(stream)
+                    upcoming = None
+                    exhausted = False
+                if upcoming is not None:
+                    current, upcoming = upcoming, None
+                if not exhausted:
+                    for frame in decoder:
+                        if frame.time is None:
+                            continue
+                        if frame.time <= target + 1e-6:
+                            current = frame
+                        else:
+                            upcoming = frame
+                            break
+                    else:
+                        exhausted = True
+            if current is None:
+                # 第一格晚於第一個取樣時間點
+                current, upcoming = upcoming, None
+            if current is None:
+                # 已經沒有更多畫格
+                break
+            if exhausted and target > current.time + max(step, frame_interval) + 1e-6:
+                # 影片在目標時間點前就結束了
+                break
+            if current is shown:
+                durations[-1] += step_ms
+                continue
+            frames.append(current.to_image(width=width, height=height))
+            durations.append(step_ms)
+            shown = current
+
+        return frames, durations
@@ -0,0 +1,64 @@
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import metrics
+
+
+class WorkerPool:
+    """有上限的轉換工作執行緒池
+
+    Pillow 在解碼、縮放與編碼時會釋放 GIL，放到執行緒池中執行可以避免阻塞事件迴圈，
+    同時限制同時進行的轉換數量。
+    """
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.active = 0
+
+        queue_depth = metrics.registry.gauge("worker_pool_queue_depth", "等待執行的工作數", ("pool",))
+        busy = metrics.registry.gauge("worker_pool_busy_workers", "執行中的工作數", ("pool",))
+        size = metrics.registry.gauge("worker_pool_size", "執行緒池大小", ("pool",))
+        queue_depth.labels(name).set_function(lambda: self.queued)
+        busy.labels(name).set_function(lambda: self.active)
+        size.labels(name).set(max_workers)
+        self._wait = metrics.registry.histogram(
+            "worker_pool_wait_seconds", "工作在佇列中等待的時間", ("pool",)
+        ).labels(name)
+
+    def _run(self, queued_at: float, context: contextvars.Context, func, args, kwargs):
+        with self._lock:
+            self.queued -= 1
+            self.active += 1
+        self._wait.observe(time.perf_counter() - queued_at)
+        try:
+            return context.run(func, *args, **kwargs)
+        finally:
+            with self._lock:
+                self.active -= 1
+
+    async def run(self, func, *args, **kwargs):
+        """在執行緒池中執行 func (保留呼叫端的 contextvars)"""
+        with self._lock:
+            self.queued += 1
+        call = functools.partial(self._run, time.perf_counter(), contextvars.copy_context(), func, args, kwargs)
+        future = self._executor.submit(call)
+        future.add_done_callback(self._on_done)
+        return await asyncio.wrap_future(future)
+
+    def _on_done(self, future):
+        # 開始執行前就被取消 (關閉時的 cancel_futures 或呼叫端取消) 的工作不會經過 _run
+        if future.cancelled():
+            with self._lock:
+                self.queued -= 1
+
+    def shutdown(self, wait: bool = False):
+        """關閉執行緒池"""
+        self._executor.shutdown(wait=wait, cancel_futures=True)